@@ -1,12 +1,23 @@
 import sys
 import os
-from PyQt6.QtWidgets import QApplication
-from .ui.main_window import MainWindow
+
 
 def main():
+    # 引数があればコマンドラインツールとして動作
+    if len(sys.argv) > 1:
+        from .cli import main as cli_main
+        cli_main()
+        return
+
+    from PyQt6.QtWidgets import QApplication
+    from . import timing
+    from .ui.main_window import MainWindow
+
     # プラットフォームプラグインの問題を回避
     os.environ['QT_QPA_PLATFORM'] = 'xcb'
     
+    # TWITCH_DL_TIMING_LOG を設定して起動すると、ダウンロードの処理段階ごとの所要時間を記録する
+    timing.configure_from_env()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -0,0 +1,242 @@
+import glob
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from . import timing
+from .compression import SUFFIXES, open_text, strip_suffix
+from .ingest import DEFAULT_BATCH_SIZE, iter_comment_batches
+
+DEFAULT_IMPORT_DIR = os.path.join(os.path.expanduser('~'), 'Downloads', 'TwitchComment')
+VIDEO_URL_FORMAT = 'https://www.twitch.tv/videos/{}'
+# --force で取り込み直すとき、解析が終わるまで新しいコメントを保存しておく仮の動画ID
+STAGING_ID_FORMAT = 'import:{}'
+
+# ファイル名に含まれる動画ID（7桁以上の数字）
+_VIDEO_ID_PATTERN = re.compile(r'(?<!\d)(\d{7,})(?!\d)')
+# VideoListDialog の出力名 "<login>-<YYYY-MM-DD>_<HH>:<MM>.csv"（サニタイズ後は ':' が '_'）
+_LOGIN_START_PATTERN = re.compile(
+    r'^(?P<login>[A-Za-z0-9_]+)-(?P<date>\d{4}-\d{2}-\d{2})_(?P<hour>\d{2})[:_](?P<minute>\d{2})'
+)
+
+
+def collect_files(paths: Iterable[str]) -> List[str]:
+    """ファイルとディレクトリの指定から取り込み対象のCSV（圧縮済みを含む）を列挙"""
+    files = []
+    patterns = ['*.csv'] + [f'*.csv{suffix}' for suffix in SUFFIXES.values()]
+    for path in paths:
+        path = os.path.expanduser(path)
+        if os.path.isdir(path):
+            files.extend(sorted(
+                file for pattern in patterns for file in glob.glob(os.path.join(path, pattern))
+            ))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            print(f"ファイルが見つかりません: {path}")
+    return list(dict.fromkeys(files))
+
+
+def video_id_from_filename(path: str) -> Optional[str]:
+    """ファイル名に含まれる動画ID（7桁以上の数字。複数あれば最初のもの）"""
+    match = _VIDEO_ID_PATTERN.search(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def resolve_file_metadata(db, path: str, archive=None) -> Optional[Dict]:
+    """ファイルの動画・配信者・開始時刻を推定する
+
+    優先順位: 隣の '<ファイル名>.json' メタデータ → 保管庫の索引 → ファイル名中の動画ID → '<login>-<開始日時>' 形式の名前
+    圧縮済みファイルは圧縮前の名前（'x.csv.gz' なら 'x.csv.json'）のメタデータも参照する。
+    保管庫（ChatArchive）の索引は、保管前のファイル名か保管庫内の '<VOD ID>/<ハッシュ>' の配置から探す。
+    """
+    sidecars = [path + '.json', strip_suffix(path) + '.json']
+    sidecar = next((candidate for candidate in sidecars if os.path.exists(candidate)), None)
+    if sidecar:
+        with open(sidecar, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return {
+            'video_id': meta.get('url') or VIDEO_URL_FORMAT.format(meta['video_id']),
+            'streamer_id': meta['streamer_id'],
+            'start_time': meta['start_time']
+        }
+
+    if archive is not None:
+        entry = archive.find_by_source(path) or archive.get(os.path.basename(os.path.dirname(path)))
+        if entry is not None and entry.get('streamer_id') and entry.get('start_time'):
+            return {
+                'video_id': entry.get('url') or VIDEO_URL_FORMAT.format(entry['video_id']),
+                'streamer_id': entry['streamer_id'],
+                'start_time': entry['start_time']
+            }
+
+    name = os.path.basename(path)
+    for candidate in _VIDEO_ID_PATTERN.findall(name):
+        video = db.get_video(candidate)
+        if video:
+            return {'video_id': video['url'], 'streamer_id': video['user_id'], 'start_time': video['created_at']}
+
+    match = _LOGIN_START_PATTERN.match(name)
+    if match:
+        user = db.get_user_by_login(match['login'])
+        if user:
+            # ファイル名の開始時刻はローカルタイムの分単位
+            start = datetime.strptime(
+                f"{match['date']} {match['hour']}:{match['minute']}", '%Y-%m-%d %H:%M'
+            ).timestamp()
+            video = db.find_video_by_start(user['id'], int(start), int(start) + 60)
+            if video:
+                return {'video_id': video['url'], 'streamer_id': user['id'], 'start_time': video['created_at']}
+    return None
+
+
+_queue = None
+
+
+def _init_worker(queue, timing_log: Optional[str] = None):
+    global _queue
+    _queue = queue
+    # 計測イベントは書き込み側と同じファイルへ追記する
+    timing.configure(timing_log)
+
+
+def _parse_file(index: int, path: str, meta: Dict, batch_size: int):
+    """ワーカープロセスでCSVを解析し、バッチを書き込み側へ送る"""
+    try:
+        # queue_wait は書き込み側の遅れでキューが空くのを待った秒数
+        with timing.stage('import_parse', bytes=os.path.getsize(path), video_id=meta['video_id'],
+                          rows=0, queue_wait=0.0) as record, open_text(path) as f:
+            for batch in iter_comment_batches(
+                f, meta['video_id'], meta['streamer_id'], meta['start_time'], batch_size
+            ):
+                record['rows'] += len(batch)
+                waited = time.perf_counter()
+                _queue.put(('batch', index, batch))
+                record['queue_wait'] += time.perf_counter() - waited
+        _queue.put(('done', index, None))
+    except Exception as e:
+        _queue.put(('error', index, str(e)))
+
+
+def _abort_workers(queue, futures):
+    """未着手のジョブを取り消し、実行中のワーカーが終わるまでキューを読み捨てる
+
+    書き込み側が読まなくなると、ワーカーはキューが空くのを待ち続けてプールの終了が止まってしまう。
+    """
+    for future in futures:
+        future.cancel()
+    while True:
+        running = not all(future.done() for future in futures)
+        try:
+            queue.get(timeout=0.1 if running else 0.5)
+        except queue_module.Empty:
+            if not running:
+                return
+
+
+def import_files(db, paths: Iterable[str], workers: Optional[int] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, force: bool = False, archive=None) -> Dict:
+    """複数のコメントCSVをプロセスプールで並列に解析し、単一の書き込み側でDBへ保存する
+
+    archive（ChatArchive）を渡すと、名前から動画を特定できないファイルも保管庫の索引で特定する。
+    force で取り込み済みの動画を取り込み直すときは、新しいコメントを仮の動画IDで保存し、
+    ファイル全体を解析できてから既存のコメント（圧縮アーカイブを含む）と置き換える。
+    配信中に一部だけ取得したチャットしかない動画は、force なしでも同じ方法で置き換える。
+    """
+    started = time.perf_counter()
+    stats = {'files': 0, 'rows': 0, 'bytes': 0, 'skipped': 0, 'failed': 0}
+
+    jobs = []
+    # 動画ID → 書き込み先の動画ID（置き換える場合は仮の動画ID）
+    targets = {}
+    for path in collect_files(paths):
+        meta = resolve_file_metadata(db, path, archive)
+        if meta is None:
+            print(f"動画を特定できないためスキップ: {path}")
+            stats['skipped'] += 1
+        elif meta['video_id'] in targets:
+            print(f"同じ動画のファイルを取り込み中のためスキップ: {path}")
+            stats['skipped'] += 1
+        elif db.has_complete_video_comments(meta['video_id']) and not force:
+            print(f"取り込み済みのためスキップ: {path}")
+            stats['skipped'] += 1
+        else:
+            target = meta['video_id']
+            if db.has_video_comments(meta['video_id']):
+                target = STAGING_ID_FORMAT.format(meta['video_id'])
+                # 前回の中断で残った仮のコメントを消しておく
+                db.delete_video_comments(target)
+            targets[meta['video_id']] = target
+            jobs.append((path, meta))
+
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        # 解析済みバッチの滞留を抑えるため、キューの長さを制限する
+        queue = multiprocessing.Queue(maxsize=workers * 4)
+        rows_per_file = [0] * len(jobs)
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                                 initializer=_init_worker, initargs=(queue, timing.log_path())) as executor:
+            # ワーカーには書き込み先の動画IDを渡す（行に動画IDが入るため）
+            futures = [
+                executor.submit(_parse_file, index, path, dict(meta, video_id=targets[meta['video_id']]),
+                                batch_size)
+                for index, (path, meta) in enumerate(jobs)
+            ]
+
+            finished = set()
+            try:
+                while len(finished) < len(jobs):
+                    try:
+                        kind, index, payload = queue.get(timeout=1)
+                    except queue_module.Empty:
+                        # ワーカープロセスが異常終了した場合はキューに終了通知が届かない
+                        broken = [
+                            index for index, future in enumerate(futures)
+                            if index not in finished and future.done() and future.exception()
+                        ]
+                        if not broken:
+                            continue
+                        kind, index, payload = 'error', broken[0], str(futures[broken[0]].exception())
+                    if index in finished:
+                        continue
+                    path, meta = jobs[index]
+                    target = targets[meta['video_id']]
+                    if kind == 'batch':
+                        with timing.stage('import_write', rows=len(payload), video_id=meta['video_id']):
+                            db.save_comments(target, meta['streamer_id'], payload)
+                        rows_per_file[index] += len(payload)
+                        continue
+                    finished.add(index)
+                    if kind == 'done':
+                        if target != meta['video_id']:
+                            with timing.stage('import_replace', rows=rows_per_file[index],
+                                              video_id=meta['video_id']):
+                                db.replace_video_comments(target, meta['video_id'])
+                        stats['files'] += 1
+                        stats['rows'] += rows_per_file[index]
+                        stats['bytes'] += os.path.getsize(path)
+                        print(f"取り込み完了: {path} ({rows_per_file[index]}件)")
+                    else:
+                        # 途中まで書き込んだ行を取り消す（取り込み直しなら既存のコメントはそのまま残る）
+                        db.delete_video_comments(target)
+                        stats['failed'] += 1
+                        print(f"取り込みに失敗しました: {path}: {payload}")
+            except BaseException:
+                # DBエラーや Ctrl+C で中断した場合も、ワーカーを止めてから未完了の動画の書きかけを消す
+                _abort_workers(queue, futures)
+                for index, (path, meta) in enumerate(jobs):
+                    if index in finished:
+                        continue
+                    try:
+                        db.delete_video_comments(targets[meta['video_id']])
+                    except Exception as e:
+                        print(f"書きかけのコメントを削除できませんでした: {path}: {e}")
+                raise
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,180 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Iterator, Optional
+from .compression import SUFFIXES, codec_from_path, open_text, strip_suffix
+
+# チャットファイルの保管庫（VOD IDと内容のハッシュで配置する）
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.expanduser('~'), '.twitch_dl_com', 'archive')
+# 1行1件のJSONで追記する索引ファイル（同じVODは後の行が優先）
+MANIFEST_NAME = 'manifest.jsonl'
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def _parse_offset(offset: str) -> int:
+    """'H:MM:SS' 形式の経過時間を秒数に変換"""
+    hours, minutes, seconds = offset.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def scan_chat_file(path: str) -> Dict:
+    """チャットファイルのハッシュ・サイズ・行数・コメントの時間範囲（配信開始からの秒数）を調べる"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b''):
+            digest.update(chunk)
+
+    rows = 0
+    first_offset = last_offset = None
+    with open_text(path) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        time_col = header.index('time') if header and 'time' in header else None
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            if time_col is not None:
+                offset = _parse_offset(row[time_col])
+                if first_offset is None:
+                    first_offset = offset
+                last_offset = offset
+    return {
+        'sha256': digest.hexdigest(),
+        'bytes': os.path.getsize(path),
+        'rows': rows,
+        'first_offset': first_offset,
+        'last_offset': last_offset
+    }
+
+
+class ChatArchive:
+    """VOD IDと内容のハッシュで管理するチャットファイルの保管庫
+
+    ファイルは '<root>/<VOD ID>/<SHA-256>.csv[.gz|.zst]' に置き、索引 manifest.jsonl に
+    VOD ID → パス・ハッシュ・行数・サイズ・時間範囲を1行ずつ追記する。
+    索引は作成時にメモリへ読み込むので、保管済みかどうかの確認はファイルを探さずに済む。
+    追記は1行ずつ行うため、同じ保管庫を複数のプロセスで使える（他のプロセスの追加は refresh で読み込む）。
+    """
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self._index = {}
+        # 保管前のファイル名（圧縮拡張子なし）→ VOD ID
+        self._by_source = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.refresh()
+
+    def refresh(self) -> int:
+        """索引ファイルのうち、まだ読み込んでいない行を読み込み、その件数を返す"""
+        count = 0
+        with self._lock:
+            try:
+                with open(self.manifest_path, 'rb') as f:
+                    f.seek(self._offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # 他のプロセスが書き込み途中の行は次回読む
+                            break
+                        self._offset += len(line)
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        self._remember(entry)
+                        count += 1
+            except FileNotFoundError:
+                pass
+        return count
+
+    def _remember(self, entry: Dict):
+        self._index[entry['video_id']] = entry
+        if entry.get('source_name'):
+            self._by_source[entry['source_name']] = entry['video_id']
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        """VODの索引（なければ None）。'path' は保管庫内の絶対パス"""
+        entry = self._index.get(video_id)
+        if entry is None:
+            return None
+        return dict(entry, path=os.path.join(self.root, entry['path']))
+
+    def find_by_source(self, path: str) -> Optional[Dict]:
+        """保管前のファイル名（'x.csv' と 'x.csv.gz' は同じ扱い）から索引を探す"""
+        video_id = self._by_source.get(os.path.basename(strip_suffix(path)))
+        return self.get(video_id) if video_id else None
+
+    def entries(self) -> Iterator[Dict]:
+        for video_id in list(self._index):
+            yield self.get(video_id)
+
+    def add(self, src_path: str, video_id: str, **metadata) -> Dict:
+        """ファイルを保管庫に入れて索引に追記し、その索引を返す
+
+        同じファイルシステムならハードリンクで、そうでなければコピーで入れる（元のファイルは残る）。
+        同じ内容がすでに保管されていれば何もしない。metadata（配信者・開始時刻など）は索引に一緒に記録する。
+        """
+        info = scan_chat_file(src_path)
+        current = self._index.get(video_id)
+        if current is not None and current['sha256'] == info['sha256']:
+            return self.get(video_id)
+
+        codec = codec_from_path(src_path)
+        suffix = '.csv' + (SUFFIXES[codec] if codec else '')
+        relative_path = os.path.join(video_id, info['sha256'] + suffix)
+        dst_path = os.path.join(self.root, relative_path)
+        if not os.path.exists(dst_path):
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            tmp_path = dst_path + '.part'
+            try:
+                os.link(src_path, tmp_path)
+            except OSError:
+                shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, dst_path)
+
+        entry = dict(metadata, video_id=video_id, path=relative_path,
+                     source_name=os.path.basename(strip_suffix(src_path)), **info)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._remember(entry)
+        return self.get(video_id)
+
+    def compact(self) -> int:
+        """索引ファイルをVODごとに最新の1行へまとめ、古い内容のファイルを削除する。削除したファイル数を返す
+
+        索引にないファイルは消すので、他のプロセスが保管庫へ追加している間は実行しない。
+        """
+        self.refresh()
+        with self._lock:
+            tmp_path = self.manifest_path + '.part'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._index.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.manifest_path)
+            self._offset = os.path.getsize(self.manifest_path)
+            live_paths = {entry['path'] for entry in self._index.values()}
+
+        removed = 0
+        for video_id in os.listdir(self.root):
+            directory = os.path.join(self.root, video_id)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if os.path.join(video_id, name) not in live_paths:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        return removed
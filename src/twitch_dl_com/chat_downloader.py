@@ -0,0 +1,454 @@
+import glob
+import os
+import queue
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import (TimeoutException, ElementClickInterceptedException,
+                                        StaleElementReferenceException, WebDriverException)
+from .chat_http import GQL_URL, ChatDownloadError, DownloadCancelled, HttpChatDownloader, extract_video_id
+from .compression import SUFFIXES, compress_file
+from .download_paths import chat_output_path, finalize_output, job_directory
+from .download_watch import DownloadWatcher
+from . import timing
+
+SITE_URL = "https://www.twitchchatdownloader.com"
+DEFAULT_DOWNLOAD_PATH = os.path.join(os.path.expanduser('~'), 'Downloads', 'TwitchComment')
+# 解決済みのChromeDriverのパス（次回以降はネットワークに出ずに再利用する）
+DRIVER_PATH_CACHE = os.path.join(os.path.expanduser('~'), '.twitch_dl_com', 'chromedriver_path')
+# ブラウザプールで読み込まないリソース（画像・CSS・フォント）
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf',
+]
+
+def is_button_truly_clickable(button_element):
+    """ボタンが本当にクリック可能かどうかをさらに厳密に確認する関数"""
+    try:
+        # disabledかどうかチェック
+        if button_element.get_attribute("disabled"):
+            return False
+            
+        # aria-disabledの確認
+        if button_element.get_attribute("aria-disabled") == "true":
+            return False
+            
+        # classにdisabledが含まれているか確認
+        class_value = button_element.get_attribute("class") or ""
+        if "disabled" in class_value:
+            return False
+            
+        # スタイルで無効化されているか確認
+        style = button_element.get_attribute("style") or ""
+        if "pointer-events: none" in style or "opacity: 0.5" in style:
+            return False
+            
+        # 表示されているか確認
+        if not button_element.is_displayed():
+            return False
+            
+        return True
+    except StaleElementReferenceException:
+        # 要素が更新された場合
+        return False
+
+def sanitize_filename(filename):
+    """ファイル名から不正な文字を除去"""
+    # Windowsで使用できない文字を置換
+    filename = re.sub(r'[<>"/\\|?*:]', '_', filename)  # コロンも含めて置換
+    # 文字数制限（255文字以内）
+    if len(filename) > 255:
+        base, ext = os.path.splitext(filename)
+        filename = base[:255-len(ext)] + ext
+    return filename
+
+def compress_chat_file(path, codec):
+    """ダウンロードしたCSVを圧縮し、圧縮後のパスを返す（失敗時は元のパス）"""
+    try:
+        with timing.stage('compress') as record:
+            compressed = compress_file(path, codec)
+            record['bytes'] = os.path.getsize(compressed)
+        print(f"ファイルを圧縮しました: {compressed}")
+        return compressed
+    except Exception as e:
+        print(f"ファイルの圧縮に失敗しました: {e}")
+        return path
+
+def resolve_driver_path(refresh=False):
+    """ChromeDriverのパスを解決（キャッシュ済みならオフラインで返す）"""
+    if not refresh:
+        try:
+            with open(DRIVER_PATH_CACHE, 'r', encoding='utf-8') as f:
+                cached_path = f.read().strip()
+            if cached_path and os.access(cached_path, os.X_OK):
+                return cached_path
+        except FileNotFoundError:
+            pass
+
+    driver_path = ChromeDriverManager().install()
+    os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+    with open(DRIVER_PATH_CACHE, 'w', encoding='utf-8') as f:
+        f.write(driver_path)
+    return driver_path
+
+def create_driver(download_path, block_resources=False):
+    """ヘッドレスChromeを起動する"""
+    # ブラウザオプションの設定
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # ヘッドレスモードを有効化
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    prefs = {
+        'download.default_directory': download_path,
+        'download.prompt_for_download': False,
+        'download.directory_upgrade': True,
+        'safebrowsing.enabled': True,
+        'download.default_directory.conflict_policy': 'overwrite'
+    }
+    if block_resources:
+        prefs['profile.managed_default_content_settings.images'] = 2
+    chrome_options.add_experimental_option('prefs', prefs)
+
+    with timing.stage('driver_start'):
+        try:
+            driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=chrome_options)
+        except WebDriverException:
+            # Chromeの更新でキャッシュしたドライバが合わなくなった場合は解決し直す
+            driver = webdriver.Chrome(service=Service(resolve_driver_path(refresh=True)), options=chrome_options)
+
+        if block_resources:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    return driver
+
+def set_download_path(driver, download_path):
+    """起動済みのブラウザのダウンロード先を切り替える"""
+    driver.execute_cdp_cmd('Page.setDownloadBehavior', {
+        'behavior': 'allow',
+        'downloadPath': download_path
+    })
+
+def clear_directory(path):
+    """ダウンロード先の既存ファイルを削除"""
+    for file in glob.glob(os.path.join(path, "*.*")):
+        try:
+            os.remove(file)
+            print(f"既存のファイルを削除しました: {file}")
+        except Exception as e:
+            print(f"ファイルの削除に失敗しました: {e}")
+
+# 進捗100%とエクスポートボタンの有効化をページ内で監視するスクリプト
+EXPORT_READY_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const isReady = () => {
+    const progress = Array.from(document.querySelectorAll('small.d-block'))
+        .find(el => el.textContent.includes('Progress:'));
+    const button = document.querySelector("button.btn-primary[title='Export chat']");
+    return !!(progress && progress.textContent.includes('Progress: 100 % | Remaining: 0 sec')
+        && button && !button.disabled && button.getAttribute('aria-disabled') !== 'true'
+        && !button.classList.contains('disabled') && button.offsetParent !== null);
+};
+if (isReady()) {
+    done(true);
+} else {
+    const observer = new MutationObserver(() => {
+        if (isReady()) {
+            observer.disconnect();
+            done(true);
+        }
+    });
+    observer.observe(document.body, {subtree: true, childList: true, characterData: true, attributes: true});
+}
+"""
+
+def wait_until_export_ready(driver, next_button_locator, max_wait_time=35):
+    """進捗とボタンの変化をMutationObserverで待ち、押せるようになったボタンを返す"""
+    driver.set_script_timeout(max_wait_time)
+    try:
+        driver.execute_async_script(EXPORT_READY_SCRIPT)
+        print("ダウンロード処理が完了しました")
+        return driver.find_element(*next_button_locator)
+    except TimeoutException:  # 非同期スクリプトのタイムアウト
+        # 進捗は待ち終えたので、ボタンの状態だけをポーリングで確認する
+        print("進捗の確認がタイムアウトしました")
+        return poll_until_export_ready(driver, next_button_locator, wait_progress=False)
+    except WebDriverException as e:
+        print(f"イベントでの待機に失敗したためポーリングに切り替えます: {e}")
+        return poll_until_export_ready(driver, next_button_locator)
+
+def poll_until_export_ready(driver, next_button_locator, wait_progress=True):
+    """進捗テキストとエクスポートボタンの状態をポーリングで待つ（フォールバック用）"""
+    if wait_progress:
+        # Progressが100%になるまで待機
+        progress_locator = (By.XPATH, "//small[contains(@class, 'd-block') and contains(text(), 'Progress:')]")
+        max_wait_time = 30  # 最大待機時間（秒）
+        wait_interval = 0.5  # 確認間隔（秒）
+        start_time = time.time()
+
+        while time.time() - start_time < max_wait_time:
+            try:
+                progress_element = driver.find_element(*progress_locator)
+                progress_text = progress_element.text.strip()
+                if 'Progress: 100 % | Remaining: 0 sec' in progress_text:
+                    print("ダウンロード処理が完了しました")
+                    break
+                print(f"ダウンロード進捗: {progress_text}")
+                time.sleep(wait_interval)
+            except Exception as e:
+                print(f"進捗の確認中にエラー: {e}")
+                time.sleep(wait_interval)
+        else:
+            print("進捗の確認がタイムアウトしました")
+
+    # 3. カスタム待機: ボタンが本当にクリック可能になるまで待機
+    max_wait_time = 5  # 最大待機時間（秒）
+    wait_interval = 0.5  # 確認間隔（秒）
+    start_time = time.time()
+    
+    while time.time() - start_time < max_wait_time:
+        try:
+            # 要素を再取得
+            next_button = driver.find_element(*next_button_locator)
+            print("next_button")
+
+            # ボタンの状態をより詳細にチェック
+            if (next_button.is_displayed() and 
+                next_button.is_enabled() and 
+                "disabled" not in next_button.get_attribute("class") and 
+                not next_button.get_attribute("disabled")):
+
+                # 少し待機を入れて安定させる
+                time.sleep(2)
+                break
+                
+        except StaleElementReferenceException:
+            print("要素が更新されました。再取得を試みます...")
+            continue
+            
+        # 待機
+        time.sleep(wait_interval)
+    else:
+        # whileループが正常終了しなかった場合（タイムアウト）
+        raise TimeoutException("対象ビデオのダウンロード操作がタイムアウトになりました")
+    return next_button
+
+def _print_progress(count, offset_seconds):
+    print(f"ダウンロード進捗: {count}件")
+
+def download_chat_http(video_url, download_path, compress=None, gql_url=GQL_URL,
+                       progress_callback=_print_progress, is_cancelled=None):
+    """ブラウザを使わずにGQLからチャットを download_path に取得し、保存したファイルのパスを返す"""
+    output_path = os.path.join(download_path, f"{extract_video_id(video_url)}.csv")
+    if compress:
+        # 書き出しながら圧縮する（後から圧縮し直す必要がない）
+        output_path += SUFFIXES[compress]
+
+    with timing.stage('http_download') as record:
+        count = HttpChatDownloader(gql_url).download(video_url, output_path, progress_callback, is_cancelled)
+        record['rows'] = count
+        record['bytes'] = os.path.getsize(output_path)
+    print(f"ダウンロード完了: {output_path} ({count}件)")
+    return output_path
+
+def _finalize(path, final_path):
+    with timing.stage('finalize') as record:
+        record['bytes'] = os.path.getsize(path)
+        return finalize_output(path, final_path)
+
+def fetch_chat_file(video_url, output_dir=DEFAULT_DOWNLOAD_PATH, output_filename=None, compress=None,
+                    backend='auto', gql_url=GQL_URL, get_pool=None,
+                    progress_callback=_print_progress, is_cancelled=None, site_url=SITE_URL):
+    """ジョブ専用の作業ディレクトリでチャットを取得し、動画IDで決まる保存先へ移したパスを返す
+
+    作業ディレクトリは実行ごとに別なので、同じ保存先で複数のダウンロードを同時に実行できる。
+    get_pool を渡すとブラウザでの取得にそのプールを使う（site_url はプールを使わない場合の取得元サイト）。
+    キャンセルはHTTPでの取得中と、ブラウザでの取得を始める前に確認する（DownloadCancelled を送出）。
+    """
+    video_id = extract_video_id(video_url)
+    final_path = chat_output_path(output_dir, video_id, output_filename and sanitize_filename(output_filename))
+
+    # HTTPで取得できればブラウザを起動しない（auto は失敗時にブラウザへフォールバック）
+    if backend in ('auto', 'http'):
+        with job_directory(output_dir, video_id) as job_path:
+            try:
+                path = download_chat_http(video_url, job_path, compress, gql_url, progress_callback, is_cancelled)
+                return _finalize(path, final_path)
+            except ChatDownloadError as e:
+                if backend == 'http':
+                    raise
+                print(f"HTTPでの取得に失敗したためブラウザで取得します: {e}")
+
+    if is_cancelled and is_cancelled():
+        raise DownloadCancelled(f"ダウンロードをキャンセルしました: {video_id}")
+    if get_pool is not None:
+        return get_pool().download(video_url, output_filename, compress)
+
+    with job_directory(output_dir, video_id) as job_path:
+        driver = create_driver(job_path)
+        try:
+            path = download_chat(driver, video_url, job_path, compress, site_url)
+        finally:
+            # ブラウザを閉じる
+            driver.quit()
+        return _finalize(path, final_path) if path else None
+
+def download_chat(driver, video_url, download_path, compress=None, site_url=SITE_URL):
+    """起動済みのブラウザでチャットを download_path（ジョブ専用のディレクトリ）にダウンロードし、そのパスを返す
+
+    site_url には動作確認用の代替サイト（devtools.fake_chat_site）を指定できる。
+    """
+    result_path = None
+    with timing.stage('page_load'):
+        driver.get(site_url)
+
+    try:
+        # サイト側でチャットの準備が終わるまで
+        with timing.stage('chat_prepare'):
+            url_input = WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.ID, "video-url"))
+            )
+            url_input.clear()  # 既存の入力をクリア
+            url_input.send_keys(video_url)
+            print(f"URL: {video_url}")
+
+            # 1. 最初のボタンをクリック
+            first_button = WebDriverWait(driver, 10).until(
+                EC.element_to_be_clickable((By.XPATH, "//*[contains(@title, 'Download chat')]"))
+            )
+            first_button.click()
+            print("ダウンロード")
+        
+            # 2. 次のボタンが表示されるのを待つ
+            next_button_locator = (By.XPATH, "//button[contains(@class, 'btn-primary') and @title='Export chat']")
+        
+            next_button = WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located(next_button_locator)
+            )        
+        
+            # Progressが100%になり、エクスポートボタンが押せるようになるまで待機
+            next_button = wait_until_export_ready(driver, next_button_locator)
+        
+        # 4. 安全なクリック試行
+        # クリック前に監視を始め、Chromeが書き込みを終えた時点で検出する
+        with timing.stage('export') as record:
+            with DownloadWatcher(download_path) as watcher:
+                print("エクスポート")
+                try:
+                    next_button.click()
+                except ElementClickInterceptedException:
+                    print("通常のクリックが失敗しました。JavaScriptでクリックを試みます...")
+                    driver.execute_script("arguments[0].click();", next_button)
+                    print("次のボタンをJavaScriptで押下しました")
+                # ダウンロードの完了を待機
+                timeout = 60  # タイムアウト時間（秒）
+                newest_file = watcher.wait(timeout)
+            if newest_file:
+                record['bytes'] = os.path.getsize(newest_file)
+            else:
+                record['ok'] = False
+
+        if newest_file:
+            print(f"ダウンロード完了: {newest_file}")
+
+            if compress:
+                newest_file = compress_chat_file(newest_file, compress)
+            result_path = newest_file
+        else:
+            print("ダウンロードがタイムアウトしました")
+    except TimeoutException as e:
+        print(f"タイムアウトエラー: {e}")
+        driver.save_screenshot("timeout_error.png")
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        driver.save_screenshot("error.png")
+    return result_path
+
+class BrowserPool:
+    """起動済みのヘッドレスChromeを使い回すプール
+
+    ドライバの解決は1回だけ行い、各セッションは専用のダウンロード先を持つ。
+    ジョブの間でCookieとストレージを消去してセッションを初期化する。
+    """
+
+    def __init__(self, size, download_path=DEFAULT_DOWNLOAD_PATH, block_resources=True, site_url=SITE_URL):
+        self.download_path = download_path
+        self.block_resources = block_resources
+        self.site_url = site_url
+        self._idle = queue.Queue()
+        self._sessions = []
+        resolve_driver_path()  # 全セッションで使うドライバを先に解決しておく
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            for session in executor.map(self._create_session, range(size)):
+                self._sessions.append(session)
+                self._idle.put(session)
+
+    def _create_session(self, index):
+        session_path = os.path.join(self.download_path, f'.session-{index}')
+        os.makedirs(session_path, exist_ok=True)
+        clear_directory(session_path)
+        driver = create_driver(session_path, self.block_resources)
+        set_download_path(driver, session_path)
+        return {'index': index, 'driver': driver, 'download_path': session_path}
+
+    def acquire(self):
+        return self._idle.get()
+
+    def release(self, session):
+        try:
+            self._reset(session)
+        except WebDriverException as e:
+            # ブラウザが落ちていたら作り直す
+            print(f"ブラウザセッションを再起動します: {e}")
+            try:
+                session['driver'].quit()
+            except WebDriverException:
+                pass
+            session.update(self._create_session(session['index']))
+        self._idle.put(session)
+
+    def _reset(self, session):
+        driver = session['driver']
+        with timing.stage('session_reset'):
+            driver.delete_all_cookies()
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                'origin': self.site_url,
+                'storageTypes': 'all'
+            })
+            driver.get('about:blank')
+            set_download_path(driver, session['download_path'])
+
+    def download(self, video_url, output_filename=None, compress=None):
+        """空いているセッションでジョブ専用のディレクトリにダウンロードし、保存先へ移したパスを返す"""
+        video_id = extract_video_id(video_url)
+        final_path = chat_output_path(self.download_path, video_id,
+                                      output_filename and sanitize_filename(output_filename))
+        session = self.acquire()
+        try:
+            with job_directory(self.download_path, video_id) as job_path:
+                set_download_path(session['driver'], job_path)
+                path = download_chat(session['driver'], video_url, job_path, compress, self.site_url)
+                return _finalize(path, final_path) if path else None
+        finally:
+            self.release(session)
+
+    def close(self):
+        for session in self._sessions:
+            try:
+                session['driver'].quit()
+            except WebDriverException:
+                pass
+            shutil.rmtree(session['download_path'], ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
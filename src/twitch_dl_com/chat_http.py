@@ -0,0 +1,154 @@
+import csv
+import os
+import re
+import time
+from typing import Callable, Dict, Iterator, Optional
+import requests
+from .compression import codec_from_path, open_text
+
+# Twitchのウェブサイトが使う公開GQLエンドポイントとクライアントID
+GQL_URL = 'https://gql.twitch.tv/gql'
+GQL_CLIENT_ID = 'kimne78kx3ncx6brgo4mv6wki5h1ko'
+VIDEO_COMMENTS_OPERATION = 'VideoCommentsByOffsetOrCursor'
+VIDEO_COMMENTS_QUERY_HASH = 'b70a3591ff0f4e0313d126c6a1502d79a1c02baebb288227c582044aa76adf6a'
+
+# process_comments_file / ingest が読むCSVの列
+CSV_HEADER = ['time', 'user_name', 'user_color', 'message']
+
+_VIDEO_ID_PATTERN = re.compile(r'(?:/videos/|^)(\d+)')
+
+
+class ChatDownloadError(Exception):
+    """HTTP経由でチャットを取得できなかった（ブラウザ版へのフォールバック対象）"""
+
+
+class DownloadCancelled(Exception):
+    """ダウンロードが途中でキャンセルされた"""
+
+
+def extract_video_id(video_url: str) -> str:
+    """'https://www.twitch.tv/videos/123456789' または '123456789' から動画IDを取り出す"""
+    match = _VIDEO_ID_PATTERN.search(video_url.strip())
+    if not match:
+        raise ValueError(f"URLから動画IDを抽出できませんでした: {video_url}")
+    return match.group(1)
+
+
+def format_offset(seconds: int) -> str:
+    """経過秒数を 'H:MM:SS' 形式に変換"""
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+def comment_to_row(node: Dict) -> list:
+    """GQLのコメントノードをCSVの1行に変換"""
+    commenter = node.get('commenter') or {}
+    login = commenter.get('login') or ''
+    display_name = commenter.get('displayName') or login
+    message = node.get('message') or {}
+    text = ''.join(fragment.get('text', '') for fragment in message.get('fragments') or [])
+    return [
+        format_offset(node.get('contentOffsetSeconds', 0)),
+        f"{display_name}({login})",
+        message.get('userColor') or '',
+        text
+    ]
+
+
+class HttpChatDownloader:
+    """ブラウザを使わず、Twitch GQLからVODのチャットをページ送りで取得する"""
+
+    def __init__(self, gql_url: str = GQL_URL, client_id: str = GQL_CLIENT_ID,
+                 session: Optional[requests.Session] = None, timeout: float = 30, max_retries: int = 3):
+        self.gql_url = gql_url
+        self.client_id = client_id
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def _post(self, variables: Dict) -> Dict:
+        payload = {
+            'operationName': VIDEO_COMMENTS_OPERATION,
+            'variables': variables,
+            'extensions': {
+                'persistedQuery': {'version': 1, 'sha256Hash': VIDEO_COMMENTS_QUERY_HASH}
+            }
+        }
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(
+                    self.gql_url,
+                    json=payload,
+                    headers={'Client-Id': self.client_id},
+                    timeout=self.timeout
+                )
+                if response.status_code < 500 and response.status_code != 429:
+                    break
+                error = ChatDownloadError(f"GQLリクエストが失敗しました: {response.status_code}")
+            except requests.exceptions.RequestException as e:
+                error = ChatDownloadError(f"GQLリクエストが失敗しました: {e}")
+            if attempt == self.max_retries:
+                raise error
+            time.sleep(2 ** attempt)
+
+        if response.status_code != 200:
+            raise ChatDownloadError(f"GQLリクエストが失敗しました: {response.status_code}")
+        try:
+            data = response.json()
+        except ValueError as e:
+            # ブロックページなど、200でもJSONでない応答が返ることがある
+            raise ChatDownloadError(f"GQLの応答がJSONではありません: {e}")
+        if isinstance(data, list):
+            data = data[0] if data else None
+        if not isinstance(data, dict) or not isinstance(data.get('data') or {}, dict):
+            raise ChatDownloadError(f"GQLの応答の形式が想定と異なります: {str(data)[:200]}")
+        if data.get('errors'):
+            raise ChatDownloadError(f"GQLエラー: {data['errors'][0].get('message')}")
+        return data.get('data') or {}
+
+    def iter_comment_nodes(self, video_id: str) -> Iterator[Dict]:
+        """動画のコメントを先頭から順に返す"""
+        variables = {'videoID': video_id, 'contentOffsetSeconds': 0}
+        while True:
+            video = self._post(variables).get('video')
+            if video is None:
+                raise ChatDownloadError(f"動画が見つかりません: {video_id}")
+            comments = video.get('comments') or {}
+            edges = comments.get('edges') or []
+            for edge in edges:
+                yield edge['node']
+            if not edges or not (comments.get('pageInfo') or {}).get('hasNextPage'):
+                return
+            variables = {'videoID': video_id, 'cursor': edges[-1]['cursor']}
+
+    def download(self, video_url: str, output_path: str,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None) -> int:
+        """チャットをCSV（拡張子 .gz / .zst なら圧縮）に書き出し、件数を返す
+
+        progress_callback には1000件ごとに (件数, 最後のコメントの経過秒数) を渡す。
+        is_cancelled が True を返すと DownloadCancelled を送出し、書きかけのファイルを削除する。
+        """
+        video_id = extract_video_id(video_url)
+        tmp_path = output_path + '.part'
+        count = 0
+        try:
+            with open_text(tmp_path, 'w', codec_from_path(output_path)) as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_HEADER)
+                for node in self.iter_comment_nodes(video_id):
+                    writer.writerow(comment_to_row(node))
+                    count += 1
+                    if count % 1000 == 0:
+                        if is_cancelled and is_cancelled():
+                            raise DownloadCancelled(f"ダウンロードをキャンセルしました: {video_id}")
+                        if progress_callback:
+                            progress_callback(count, node.get('contentOffsetSeconds', 0))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, output_path)
+        return count
+
@@ -0,0 +1,230 @@
+import argparse
+import time
+from .time_utils import parse_iso_datetime
+from .database.db_manager import DatabaseManager
+from .database.export import export_comments
+from .bulk_import import (DEFAULT_IMPORT_DIR, collect_files, import_files, resolve_file_metadata,
+                          video_id_from_filename)
+from .chat_archive import DEFAULT_ARCHIVE_DIR, ChatArchive
+from .chat_http import extract_video_id
+from .live_capture import (DEFAULT_BATCH_SIZE, DEFAULT_MAX_PENDING, DEFAULT_POLL_INTERVAL, IRC_HOST, IRC_PORT,
+                           LiveCaptureService)
+from .sync import DEFAULT_SYNC_DESTINATIONS, sync_directory
+from . import timing
+from .timing import format_summary, read_events, summarize
+
+
+def cmd_compact(args):
+    db = DatabaseManager(args.db)
+    result = db.compact_comments(args.older_than_days, args.codec, args.vacuum_pages)
+    ratio = result['stored_bytes'] / result['raw_bytes'] if result['raw_bytes'] else 0
+    print(f"{result['videos']}件の動画 / {result['rows']}件のコメントを圧縮しました "
+          f"(圧縮前 {result['raw_bytes']:,} bytes → {result['stored_bytes']:,} bytes, {ratio:.1%})")
+    print(f"解放したページ数: {result['freed_pages']}")
+
+
+def cmd_merge(args):
+    db = DatabaseManager(args.db)
+    start = parse_iso_datetime(args.start) if args.start else None
+    end = parse_iso_datetime(args.end) if args.end else None
+    started = time.perf_counter()
+    rows = db.iter_merged_comments(args.video_ids, args.batch_size, start, end, args.user)
+    count = export_comments(rows, args.output, args.compress)
+    print(f"{len(args.video_ids)}本の動画から{count}件のコメントを {args.output} に書き出しました "
+          f"({time.perf_counter() - started:.1f}秒)")
+
+
+def cmd_import(args):
+    db = DatabaseManager(args.db)
+    if args.timing_log:
+        timing.configure(args.timing_log)
+    run_started = time.time()
+    try:
+        stats = import_files(db, args.paths or [DEFAULT_IMPORT_DIR], args.workers, args.batch_size, args.force,
+                             ChatArchive(args.archive_dir))
+    finally:
+        if args.timing_log:
+            timing.configure(None)
+    seconds = max(stats['seconds'], 1e-6)
+    print(f"取り込み: {stats['files']}ファイル / {stats['rows']:,}件 "
+          f"(スキップ {stats['skipped']}、失敗 {stats['failed']})")
+    print(f"処理時間: {seconds:.1f}秒 ({stats['rows'] / seconds:,.0f}件/秒, "
+          f"{stats['bytes'] / seconds / 1024 / 1024:.1f} MB/秒)")
+    if args.timing_log:
+        # 今回の実行分だけを集計して表示
+        events = [event for event in read_events([args.timing_log]) if event['start'] >= run_started]
+        print(format_summary(summarize(events)))
+
+
+def cmd_sync(args):
+    stats = sync_directory(args.source, args.dest, args.workers, not args.no_verify)
+    print(f"同期: {stats['copied']}件 / {stats['bytes']:,} bytes をコピー "
+          f"(変更なし {stats['skipped']}、失敗 {stats['failed']}、{stats['seconds']:.1f}秒)")
+
+
+def cmd_archive_add(args):
+    db = DatabaseManager(args.db)
+    archive = ChatArchive(args.archive_dir)
+    added = skipped = 0
+    for path in collect_files(args.paths or [DEFAULT_IMPORT_DIR]):
+        meta = resolve_file_metadata(db, path, archive)
+        if meta is not None:
+            entry = archive.add(path, extract_video_id(meta['video_id']), url=meta['video_id'],
+                                streamer_id=meta['streamer_id'], start_time=meta['start_time'])
+        elif video_id_from_filename(path):
+            # 配信者と開始時刻は不明のまま、動画IDだけで保管する
+            entry = archive.add(path, video_id_from_filename(path))
+        else:
+            print(f"動画を特定できないためスキップ: {path}")
+            skipped += 1
+            continue
+        print(f"保管しました: {path} → {entry['path']} ({entry['rows']}件)")
+        added += 1
+    print(f"保管: {added}ファイル (スキップ {skipped}) / 保管庫の動画数 {len(archive)}")
+
+
+def cmd_archive_check(args):
+    archive = ChatArchive(args.archive_dir)
+    for video in args.videos:
+        entry = archive.get(extract_video_id(video))
+        if entry is None:
+            print(f"{video}: 未保管")
+        else:
+            print(f"{video}: {entry['path']} ({entry['rows']:,}件, {entry['bytes']:,} bytes, "
+                  f"{entry['first_offset']}〜{entry['last_offset']}秒)")
+
+
+def cmd_archive_stats(args):
+    archive = ChatArchive(args.archive_dir)
+    entries = list(archive.entries())
+    print(f"動画 {len(entries)}本 / {sum(entry['rows'] for entry in entries):,}件 / "
+          f"{sum(entry['bytes'] for entry in entries):,} bytes")
+
+
+def cmd_archive_compact(args):
+    removed = ChatArchive(args.archive_dir).compact()
+    print(f"索引をまとめ、古い内容のファイルを {removed} 件削除しました")
+
+
+def cmd_live(args):
+    if args.status:
+        db = DatabaseManager(args.db)
+        for capture in db.get_live_captures(args.limit):
+            if capture['ended_at'] is None:
+                state = '取得中'
+            elif capture['replaced_at'] is not None:
+                state = 'VODで取得し直し済み'
+            else:
+                state = '全体' if capture['complete'] else f"一部（切断 {capture['gaps']}回）"
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(capture['stream_started_at']))
+            print(f"{capture['channel']:<20} {started} {capture['comment_count']:>10,}件 {state:<12} "
+                  f"{capture['video_id'] or 'live:' + capture['stream_id']}")
+        return
+
+    service = LiveCaptureService(args.db, poll_interval=args.poll_interval, irc_host=args.irc_host,
+                                 irc_port=args.irc_port, use_tls=not args.no_tls, batch_size=args.batch_size,
+                                 max_pending=args.max_pending)
+    print("配信中のチャットの取得を開始します（Ctrl+Cで終了）")
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+def cmd_timing(args):
+    events = read_events(args.logs)
+    if args.since:
+        since = parse_iso_datetime(args.since).timestamp()
+        events = (event for event in events if event['start'] >= since)
+    if args.stage:
+        events = (event for event in events if event['stage'] in args.stage)
+    print(format_summary(summarize(events)))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m twitch_dl_com',
+                                     description='Twitch配信チェッカーとコメントダウンローダー')
+    parser.add_argument('--db', default='twitch_users.db', help='データベースファイルのパス')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compact = subparsers.add_parser('compact', help='古い動画のコメントを圧縮アーカイブへ移す')
+    compact.add_argument('--older-than-days', type=int, default=90,
+                         help='最後のコメントからこの日数を過ぎた動画を対象にする')
+    compact.add_argument('--codec', choices=['zstd', 'zlib'],
+                         help='圧縮形式（省略時はzstandardがあればzstd、無ければzlib）')
+    compact.add_argument('--vacuum-pages', type=int, default=1000,
+                         help='増分VACUUMで解放する最大ページ数')
+    compact.set_defaults(func=cmd_compact)
+
+    merge = subparsers.add_parser('merge', help='複数動画のコメントを実時刻順にマージして書き出す')
+    merge.add_argument('video_ids', nargs='+', help='マージする動画ID（comments.video_id）')
+    merge.add_argument('-o', '--output', required=True,
+                       help='出力ファイル（.csv / .jsonl、末尾 .gz / .zst で圧縮）')
+    merge.add_argument('--start', help='この時刻以降のコメントのみ（ISO8601、UTC）')
+    merge.add_argument('--end', help='この時刻より前のコメントのみ（ISO8601、UTC）')
+    merge.add_argument('--user', action='append', help='対象のチャット参加者ID（複数指定可）')
+    merge.add_argument('--compress', choices=['gzip', 'zstd'],
+                       help='圧縮形式（省略時は出力ファイルの拡張子で判定）')
+    merge.add_argument('--batch-size', type=int, default=1000, help='動画ごとの読み出し件数')
+    merge.set_defaults(func=cmd_merge)
+
+    import_parser = subparsers.add_parser('import', help='ダウンロード済みのコメントCSVを並列に取り込む')
+    import_parser.add_argument('paths', nargs='*',
+                               help=f'CSVファイルまたはディレクトリ（省略時は {DEFAULT_IMPORT_DIR}）')
+    import_parser.add_argument('-j', '--workers', type=int,
+                               help='解析に使うプロセス数（省略時はCPUコア数）')
+    import_parser.add_argument('--batch-size', type=int, default=5000, help='1トランザクションの行数')
+    import_parser.add_argument('--force', action='store_true', help='取り込み済みの動画も取り込み直す')
+    import_parser.add_argument('--archive-dir', default=DEFAULT_ARCHIVE_DIR,
+                               help='動画の特定に索引を使う保管庫')
+    import_parser.add_argument('--timing-log',
+                               help='解析・書き込みの所要時間をJSON Lines形式で追記するファイル')
+    import_parser.set_defaults(func=cmd_import)
+
+    sync = subparsers.add_parser('sync', help='ダウンロード済みのチャットファイルを同期先へ差分コピーする')
+    sync.add_argument('source', nargs='?', default=DEFAULT_IMPORT_DIR,
+                      help=f'同期元のディレクトリ（省略時は {DEFAULT_IMPORT_DIR}）')
+    sync.add_argument('-d', '--dest', action='append',
+                      help=f'同期先（複数指定可。省略時は {", ".join(DEFAULT_SYNC_DESTINATIONS)}）')
+    sync.add_argument('-j', '--workers', type=int, default=4, help='並行してコピーするファイル数')
+    sync.add_argument('--no-verify', action='store_true', help='コピー後のチェックサム照合を省く')
+    sync.set_defaults(func=cmd_sync)
+
+    archive = subparsers.add_parser('archive', help='VOD IDと内容のハッシュで管理するチャットファイルの保管庫')
+    archive.add_argument('--archive-dir', default=DEFAULT_ARCHIVE_DIR, help='保管庫のディレクトリ')
+    archive_commands = archive.add_subparsers(dest='archive_command', required=True)
+    archive_add = archive_commands.add_parser('add', help='ダウンロード済みのチャットファイルを保管庫に入れる')
+    archive_add.add_argument('paths', nargs='*',
+                             help=f'CSVファイルまたはディレクトリ（省略時は {DEFAULT_IMPORT_DIR}）')
+    archive_add.set_defaults(func=cmd_archive_add)
+    archive_check = archive_commands.add_parser('check', help='動画が保管済みか確認する')
+    archive_check.add_argument('videos', nargs='+', help='動画IDまたはURL')
+    archive_check.set_defaults(func=cmd_archive_check)
+    archive_commands.add_parser('stats', help='保管済みの動画数・件数・サイズ').set_defaults(func=cmd_archive_stats)
+    archive_commands.add_parser('compact', help='索引をまとめ、置き換えられた古いファイルを削除する').set_defaults(
+        func=cmd_archive_compact)
+
+    live = subparsers.add_parser('live', help='登録済みの配信者の配信中チャットをIRCで取得してDBへ保存する')
+    live.add_argument('--status', action='store_true', help='取得を始めずに、これまでの取得の記録を表示する')
+    live.add_argument('--limit', type=int, default=50, help='--status で表示する件数')
+    live.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                      help='配信状態を確認する間隔（秒）')
+    live.add_argument('--irc-host', default=IRC_HOST, help='IRCサーバー')
+    live.add_argument('--irc-port', type=int, default=IRC_PORT, help='IRCサーバーのポート')
+    live.add_argument('--no-tls', action='store_true', help='TLSを使わずに接続する（ローカルの模擬サーバー用）')
+    live.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='1トランザクションの行数')
+    live.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                      help='保存待ちにできるコメントの最大数（超えると受信を待たせる）')
+    live.set_defaults(func=cmd_live)
+
+    timing_parser = subparsers.add_parser('timing', help='処理段階ごとの所要時間ログを集計する（p50/p95）')
+    timing_parser.add_argument('logs', nargs='+', help='--timing-log で出力したJSON Linesファイル')
+    timing_parser.add_argument('--since', help='この時刻以降のイベントのみ（ISO8601）')
+    timing_parser.add_argument('--stage', action='append', help='集計する段階（複数指定可）')
+    timing_parser.set_defaults(func=cmd_timing)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
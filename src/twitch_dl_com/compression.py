@@ -0,0 +1,84 @@
+import gzip
+import io
+import os
+import shutil
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard は任意依存（zstd形式を使う場合のみ必要）
+    zstandard = None
+
+# 圧縮形式と拡張子の対応
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def codec_from_path(path: str) -> Optional[str]:
+    """拡張子から圧縮形式を判定（非圧縮なら None）"""
+    for codec, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+
+def strip_suffix(path: str) -> str:
+    """圧縮形式の拡張子を取り除いたパス（'a.csv.gz' → 'a.csv'）"""
+    codec = codec_from_path(path)
+    return path[:-len(SUFFIXES[codec])] if codec else path
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zstd形式には zstandard パッケージが必要です（pip install zstandard）")
+
+
+def wrap_reader(raw, codec: Optional[str]):
+    """バイナリファイルを展開しながら読むストリームで包む"""
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if codec == 'zstd':
+        _require_zstd()
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    if codec is None:
+        return raw
+    raise ValueError(f"未対応の圧縮形式です: {codec}")
+
+
+def open_text(path: str, mode: str = 'r', codec: Optional[str] = None):
+    """圧縮の有無を拡張子で判定してテキストとして開く（mode は 'r' または 'w'）"""
+    codec = codec or codec_from_path(path)
+    if mode == 'r':
+        raw = open(path, 'rb')
+        return io.TextIOWrapper(wrap_reader(raw, codec), encoding='utf-8', newline='')
+    if mode != 'w':
+        raise ValueError(f"未対応のモードです: {mode}")
+    if codec == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    if codec == 'zstd':
+        _require_zstd()
+        raw = open(path, 'wb')
+        writer = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding='utf-8', newline='')
+    if codec is None:
+        return open(path, 'w', encoding='utf-8', newline='')
+    raise ValueError(f"未対応の圧縮形式です: {codec}")
+
+
+def compress_file(src_path: str, codec: str, remove_source: bool = True) -> str:
+    """ファイルをストリーム圧縮して '<src>.gz' / '<src>.zst' を作り、そのパスを返す"""
+    if codec not in SUFFIXES:
+        raise ValueError(f"未対応の圧縮形式です: {codec}")
+    dst_path = src_path + SUFFIXES[codec]
+    tmp_path = dst_path + '.part'
+    with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        if codec == 'gzip':
+            with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6) as writer:
+                shutil.copyfileobj(src, writer, COPY_BUFFER_SIZE)
+        else:
+            _require_zstd()
+            zstandard.ZstdCompressor(level=10).copy_stream(src, dst, read_size=COPY_BUFFER_SIZE)
+    os.replace(tmp_path, dst_path)
+    if remove_source:
+        os.remove(src_path)
+    return dst_path
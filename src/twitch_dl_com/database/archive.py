@@ -0,0 +1,77 @@
+import json
+import zlib
+from typing import Iterable, Iterator, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard は任意依存（無ければzlibを使う）
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024
+
+
+def default_codec() -> str:
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def _compressor(codec: str):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd圧縮には zstandard パッケージが必要です")
+        return zstandard.ZstdCompressor(level=9).compressobj()
+    if codec == 'zlib':
+        return zlib.compressobj(9)
+    raise ValueError(f"未対応の圧縮形式です: {codec}")
+
+
+def _decompressor(codec: str):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd圧縮のアーカイブを読むには zstandard パッケージが必要です")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == 'zlib':
+        return zlib.decompressobj()
+    raise ValueError(f"未対応の圧縮形式です: {codec}")
+
+
+def pack_comments(rows: Iterable[tuple], codec: str) -> Tuple[bytes, int]:
+    """コメント行 (id, user_id, user_color, comment_time, message, created_at) を1行1JSONで圧縮
+
+    圧縮したデータと、圧縮前のバイト数（行全体）を返す。
+    """
+    compressor = _compressor(codec)
+    chunks = []
+    buffer = []
+    buffered = 0
+    raw_bytes = 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= CHUNK_SIZE:
+            data = ''.join(buffer).encode('utf-8')
+            raw_bytes += len(data)
+            chunks.append(compressor.compress(data))
+            buffer, buffered = [], 0
+    if buffer:
+        data = ''.join(buffer).encode('utf-8')
+        raw_bytes += len(data)
+        chunks.append(compressor.compress(data))
+    chunks.append(compressor.flush())
+    return b''.join(chunks), raw_bytes
+
+
+def unpack_comments(payload: bytes, codec: str) -> Iterator[list]:
+    """pack_comments で圧縮したデータを少しずつ展開して行を返す"""
+    decompressor = _decompressor(codec)
+    pending = b''
+    for offset in range(0, len(payload), CHUNK_SIZE):
+        pending += decompressor.decompress(payload[offset:offset + CHUNK_SIZE])
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield json.loads(line)
+    if codec == 'zlib':
+        pending += decompressor.flush()
+    for line in pending.split(b'\n'):
+        if line.strip():
+            yield json.loads(line)
@@ -1,13 +1,45 @@
+import heapq
 import sqlite3
-from typing import List, Dict
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+from ..time_utils import parse_duration_seconds, parse_iso_datetime
+from .archive import default_codec, pack_comments, unpack_comments
+
+
+def _to_comment_time(value) -> str:
+    """フィルタ用の時刻（datetime またはISO8601文字列）を comments.comment_time と同じISO8601(UTC)文字列に変換"""
+    if isinstance(value, str):
+        # '2024-01-01T00:00:00Z' やオフセット付きの文字列も文字列比較できる形に揃える
+        value = parse_iso_datetime(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat()
+    return value
+
+
+def _comment_sort_key(row: tuple):
+    """異なる動画のコメントを実時刻で比較するためのキー"""
+    comment_time = row[5]
+    if not comment_time.endswith('+00:00'):
+        # UTC以外のオフセットで保存された行のみ解析する
+        comment_time = _to_comment_time(datetime.fromisoformat(comment_time))
+    return comment_time
+
 
 class DatabaseManager:
-    def __init__(self):
-        self.conn = sqlite3.connect('twitch_users.db')
+    def __init__(self, db_path: str = 'twitch_users.db'):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
         self.create_tables()
 
     def create_tables(self):
         cursor = self.conn.cursor()
+        # 新規DBは増分VACUUMを有効にする（既存DBは compact_comments で切り替える）
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id TEXT PRIMARY KEY,
@@ -32,6 +64,119 @@ class DatabaseManager:
                 FOREIGN KEY (streamer_id) REFERENCES users (id)
             )
         ''')
+        # 動画単位の時系列読み出し（キーセットページング）用インデックス
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_comments_video_time
+            ON comments (video_id, comment_time)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_comments_streamer_video
+            ON comments (streamer_id, video_id)
+        ''')
+        self.conn.commit()
+
+        # 動画メタデータテーブルの作成（開始・終了時刻と配信時間は保存時に変換済み）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS videos (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                game_name TEXT,
+                created_at TEXT NOT NULL,
+                duration TEXT NOT NULL,
+                duration_seconds INTEGER NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                is_available INTEGER NOT NULL DEFAULT 1,
+                synced_at INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_videos_user_start
+            ON videos (user_id, start_ts DESC)
+        ''')
+        self.conn.commit()
+
+        # 古い動画のコメントを動画ごとに圧縮して保存するテーブル（集計値は列として保持）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS comment_archives (
+                video_id TEXT PRIMARY KEY,
+                streamer_id TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                chatter_count INTEGER NOT NULL,
+                first_comment_time TIMESTAMP,
+                last_comment_time TIMESTAMP,
+                raw_bytes INTEGER NOT NULL,
+                stored_bytes INTEGER NOT NULL,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                payload BLOB NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_comment_archives_streamer
+            ON comment_archives (streamer_id)
+        ''')
+
+        # チャットダウンロードのジョブキュー（queued → running → done / failed）
+        # running のジョブは期限付きのリースを持ち、期限が切れたら他のワーカーが引き継ぐ
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS download_jobs (
+                video_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                output_path TEXT,
+                error TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                streamer_id TEXT,
+                channel TEXT,
+                title TEXT,
+                start_time TEXT,
+                duration_seconds INTEGER,
+                lease_owner TEXT,
+                lease_token TEXT,
+                lease_expires REAL
+            )
+        ''')
+        # 動画情報・リースの列がない旧形式のテーブルに追加する
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(download_jobs)')}
+        for column, column_type in (('streamer_id', 'TEXT'), ('channel', 'TEXT'), ('title', 'TEXT'),
+                                    ('start_time', 'TEXT'), ('duration_seconds', 'INTEGER'),
+                                    ('lease_owner', 'TEXT'), ('lease_token', 'TEXT'), ('lease_expires', 'REAL')):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE download_jobs ADD COLUMN {column} {column_type}')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_download_jobs_status
+            ON download_jobs (status, created_at)
+        ''')
+
+        # 配信中にIRCから取得したチャットの記録（配信IDごと）
+        # VODが確定するまで、コメントは video_id = 'live:<配信ID>' で保存する
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS live_captures (
+                stream_id TEXT PRIMARY KEY,
+                streamer_id TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                video_id TEXT,
+                stream_started_at INTEGER NOT NULL,
+                capture_started_at INTEGER NOT NULL,
+                ended_at INTEGER,
+                comment_count INTEGER NOT NULL DEFAULT 0,
+                gaps INTEGER NOT NULL DEFAULT 0,
+                complete INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_live_captures_video
+            ON live_captures (video_id)
+        ''')
+        # 一部だけ取得したチャットをVODのダウンロードで置き換えた時刻（旧形式のテーブルには列を追加する）
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(live_captures)')}
+        if 'replaced_at' not in columns:
+            cursor.execute('ALTER TABLE live_captures ADD COLUMN replaced_at INTEGER')
         self.conn.commit()
 
     def add_user(self, user_data: Dict) -> bool:
@@ -60,6 +205,18 @@ class DatabaseManager:
             })
         return users
 
+    def get_user_by_login(self, login: str) -> Optional[Dict]:
+        cursor = self.conn.execute('SELECT * FROM users WHERE login = ?', (login.lower(),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'login': row[1],
+            'display_name': row[2],
+            'profile_image_url': row[3]
+        }
+
     def remove_user(self, user_id: str) -> bool:
         try:
             cursor = self.conn.cursor()
@@ -81,10 +238,693 @@ class DatabaseManager:
         )
         self.conn.commit()
 
-    def get_video_comments(self, video_id: str):
-        cursor = self.conn.cursor()
-        cursor.execute(
-            'SELECT * FROM comments WHERE video_id = ? ORDER BY comment_time',
-            (video_id,)
+    def has_video_comments(self, video_id: str) -> bool:
+        """動画のコメントが保存済み（未圧縮または圧縮アーカイブ）かどうか"""
+        row = self.conn.execute(
+            '''
+            SELECT EXISTS (SELECT 1 FROM comments WHERE video_id = ?)
+                OR EXISTS (SELECT 1 FROM comment_archives WHERE video_id = ?)
+            ''',
+            (video_id, video_id)
+        ).fetchone()
+        return bool(row[0])
+
+    def has_complete_video_comments(self, video_id: str) -> bool:
+        """動画のコメントが保存済みで、配信中に一部だけ取得したもの（開始の遅れ・切断あり）ではないかどうか
+
+        一部だけのチャットは、VODからダウンロードし直すまで未取得として扱う。
+        """
+        if not self.has_video_comments(video_id):
+            return False
+        capture = self.get_live_capture_by_video(video_id)
+        # 取得中・前回の中断で閉じていない記録（complete が NULL）も一部だけとして扱う
+        return capture is None or capture['complete'] is True or capture['replaced_at'] is not None
+
+    def discard_partial_live_comments(self, video_id: str):
+        """配信中に一部だけ取得したチャットを削除し、置き換え済みとして記録する（VODのダウンロード後、取り込み前に呼ぶ）
+
+        圧縮アーカイブへ移した分も同じトランザクションで削除する。
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                'UPDATE live_captures SET replaced_at = ? '
+                'WHERE video_id = ? AND complete IS NOT 1 AND replaced_at IS NULL',
+                (int(time.time()), video_id)
+            )
+            if cursor.rowcount:
+                self.conn.execute('DELETE FROM comments WHERE video_id = ?', (video_id,))
+                self.conn.execute('DELETE FROM comment_archives WHERE video_id = ?', (video_id,))
+
+    def delete_video_comments(self, video_id: str):
+        """動画の未圧縮コメントを削除（取り込み失敗時の巻き戻し用）"""
+        with self.conn:
+            self.conn.execute('DELETE FROM comments WHERE video_id = ?', (video_id,))
+
+    def replace_video_comments(self, staging_id: str, video_id: str):
+        """仮のIDで保存したコメントで動画のコメントを置き換える
+
+        既存の未圧縮コメントと圧縮アーカイブを削除し、仮のIDのコメントを動画IDに付け替えるまでを1つのトランザクションで行う。
+        """
+        with self.conn:
+            self.conn.execute('DELETE FROM comments WHERE video_id = ?', (video_id,))
+            self.conn.execute('DELETE FROM comment_archives WHERE video_id = ?', (video_id,))
+            self.conn.execute('UPDATE comments SET video_id = ? WHERE video_id = ?', (video_id, staging_id))
+            self.conn.execute(
+                'UPDATE live_captures SET replaced_at = ? '
+                'WHERE video_id = ? AND complete IS NOT 1 AND replaced_at IS NULL',
+                (int(time.time()), video_id)
+            )
+
+    def get_video_comments(self, video_id: str, **filters) -> list:
+        """動画のコメントを全件取得（大きな動画には iter_video_comments を使うこと）"""
+        return list(self.iter_video_comments(video_id, **filters))
+
+    def _comment_filters(self, start_time=None, end_time=None, user_ids=None):
+        clauses, params = [], []
+        if start_time is not None:
+            clauses.append('comment_time >= ?')
+            params.append(_to_comment_time(start_time))
+        if end_time is not None:
+            clauses.append('comment_time < ?')
+            params.append(_to_comment_time(end_time))
+        if user_ids:
+            user_ids = list(user_ids)
+            clauses.append(f"user_id IN ({', '.join('?' * len(user_ids))})")
+            params.extend(user_ids)
+        return ''.join(f' AND {clause}' for clause in clauses), params
+
+    def _get_hot_comments_page(self, video_id: str, after, limit: int, start_time, end_time, user_ids):
+        where, params = self._comment_filters(start_time, end_time, user_ids)
+        if after is not None:
+            where += ' AND (comment_time, id) > (?, ?)'
+            params.extend(after)
+        cursor = self.conn.execute(
+            f'''
+            SELECT * FROM comments
+            WHERE video_id = ?{where}
+            ORDER BY comment_time, id
+            LIMIT ?
+            ''',
+            [video_id, *params, limit]
         )
         return cursor.fetchall()
+
+    def get_comments_page(self, video_id: str, after: Optional[Tuple[str, int]] = None,
+                          limit: int = 1000, start_time=None, end_time=None,
+                          user_ids: Optional[Iterable[str]] = None) -> Tuple[list, Optional[Tuple[str, int]]]:
+        """コメントを1ページ取得し、(行リスト, 次ページのキー) を返す
+
+        after には前ページで返されたキー (comment_time, id) を渡す。
+        次ページが無い場合、キーは None になる。
+        """
+        if self._get_archive(video_id) is None:
+            rows = self._get_hot_comments_page(video_id, after, limit, start_time, end_time, user_ids)
+        else:
+            # 圧縮済みの動画は展開しながら読み飛ばす
+            rows = self.iter_video_comments(video_id, limit, start_time, end_time, user_ids)
+            if after is not None:
+                rows = (row for row in rows if (row[5], row[0]) > tuple(after))
+            rows = list(islice(rows, limit))
+        next_key = (rows[-1][5], rows[-1][0]) if len(rows) == limit else None
+        return rows, next_key
+
+    def _iter_hot_comments(self, video_id: str, batch_size: int, start_time, end_time, user_ids) -> Iterator[tuple]:
+        after = None
+        while True:
+            rows = self._get_hot_comments_page(
+                video_id, after, batch_size, start_time, end_time, user_ids
+            )
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][5], rows[-1][0])
+
+    def iter_video_comments(self, video_id: str, batch_size: int = 1000, start_time=None,
+                            end_time=None, user_ids: Optional[Iterable[str]] = None) -> Iterator[tuple]:
+        """動画のコメントを時系列順に batch_size 件ずつ読み出すイテレータ
+
+        圧縮アーカイブ済みの動画は透過的に展開して返す。
+        """
+        user_ids = list(user_ids) if user_ids else None
+        hot = self._iter_hot_comments(video_id, batch_size, start_time, end_time, user_ids)
+        archive = self._get_archive(video_id)
+        if archive is None:
+            yield from hot
+            return
+        cold = self._iter_archived_comments(video_id, *archive, start_time, end_time, user_ids)
+        yield from heapq.merge(cold, hot, key=lambda row: (row[5], row[0]))
+
+    def _get_archive(self, video_id: str) -> Optional[Tuple[str, str, bytes]]:
+        return self.conn.execute(
+            'SELECT streamer_id, codec, payload FROM comment_archives WHERE video_id = ?',
+            (video_id,)
+        ).fetchone()
+
+    def _iter_archived_comments(self, video_id: str, streamer_id: str, codec: str, payload: bytes,
+                                start_time=None, end_time=None, user_ids=None) -> Iterator[tuple]:
+        start_time = _to_comment_time(start_time) if start_time is not None else None
+        end_time = _to_comment_time(end_time) if end_time is not None else None
+        user_ids = set(user_ids) if user_ids else None
+        for comment_id, user_id, user_color, comment_time, message, created_at in unpack_comments(payload, codec):
+            if start_time is not None and comment_time < start_time:
+                continue
+            if end_time is not None and comment_time >= end_time:
+                break
+            if user_ids is not None and user_id not in user_ids:
+                continue
+            yield (comment_id, video_id, streamer_id, user_id, user_color, comment_time, message, created_at)
+
+    def get_streamer_video_ids(self, streamer_id: str) -> List[str]:
+        """コメントが保存されている配信者の動画ID一覧を取得"""
+        cursor = self.conn.execute(
+            '''
+            SELECT video_id FROM comments WHERE streamer_id = ?
+            UNION
+            SELECT video_id FROM comment_archives WHERE streamer_id = ?
+            ORDER BY video_id
+            ''',
+            (streamer_id, streamer_id)
+        )
+        return [row[0] for row in cursor]
+
+    def iter_streamer_comments(self, streamer_id: str, batch_size: int = 1000, start_time=None,
+                               end_time=None, user_ids: Optional[Iterable[str]] = None) -> Iterator[tuple]:
+        """配信者の全動画のコメントを動画ごとに時系列順で読み出すイテレータ"""
+        user_ids = list(user_ids) if user_ids else None
+        for video_id in self.get_streamer_video_ids(streamer_id):
+            yield from self.iter_video_comments(
+                video_id, batch_size, start_time, end_time, user_ids
+            )
+
+    def iter_merged_comments(self, video_ids: Iterable[str], batch_size: int = 1000, start_time=None,
+                             end_time=None, user_ids: Optional[Iterable[str]] = None) -> Iterator[tuple]:
+        """複数動画のコメントを実時刻順に1本のストリームへマージするイテレータ
+
+        動画ごとの時系列カーソルをヒープでk-wayマージするため、
+        メモリ使用量は動画数 × batch_size 件に収まる。
+        """
+        user_ids = list(user_ids) if user_ids else None
+        cursors = [
+            self.iter_video_comments(video_id, batch_size, start_time, end_time, user_ids)
+            for video_id in dict.fromkeys(video_ids)
+        ]
+        yield from heapq.merge(*cursors, key=_comment_sort_key)
+
+    def get_video_comment_stats(self, video_id: str) -> Optional[Dict]:
+        """動画のコメント集計（件数・チャット参加者数・最初/最後のコメント時刻）を取得"""
+        has_hot = self.conn.execute(
+            'SELECT 1 FROM comments WHERE video_id = ? LIMIT 1', (video_id,)
+        ).fetchone()
+        if not has_hot:
+            row = self.conn.execute(
+                '''
+                SELECT row_count, chatter_count, first_comment_time, last_comment_time
+                FROM comment_archives WHERE video_id = ?
+                ''',
+                (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return {
+                'video_id': video_id,
+                'row_count': row[0],
+                'chatter_count': row[1],
+                'first_comment_time': row[2],
+                'last_comment_time': row[3],
+                'archived': True
+            }
+
+        if self._get_archive(video_id) is None:
+            row = self.conn.execute(
+                '''
+                SELECT COUNT(*), COUNT(DISTINCT user_id), MIN(comment_time), MAX(comment_time)
+                FROM comments WHERE video_id = ?
+                ''',
+                (video_id,)
+            ).fetchone()
+            archived = False
+        else:
+            row = self._aggregate_rows(self.iter_video_comments(video_id))
+            archived = True
+        return {
+            'video_id': video_id,
+            'row_count': row[0],
+            'chatter_count': row[1],
+            'first_comment_time': row[2],
+            'last_comment_time': row[3],
+            'archived': archived
+        }
+
+    def get_archived_video_stats(self, streamer_id: str) -> List[Dict]:
+        """配信者の圧縮済み動画の集計値一覧を取得"""
+        cursor = self.conn.execute(
+            '''
+            SELECT video_id, row_count, chatter_count, first_comment_time, last_comment_time,
+                   raw_bytes, stored_bytes, codec, archived_at
+            FROM comment_archives WHERE streamer_id = ? ORDER BY first_comment_time
+            ''',
+            (streamer_id,)
+        )
+        return [{
+            'video_id': row[0],
+            'row_count': row[1],
+            'chatter_count': row[2],
+            'first_comment_time': row[3],
+            'last_comment_time': row[4],
+            'raw_bytes': row[5],
+            'stored_bytes': row[6],
+            'codec': row[7],
+            'archived_at': row[8]
+        } for row in cursor]
+
+    @staticmethod
+    def _aggregate_rows(rows: Iterable[tuple]) -> tuple:
+        count = 0
+        chatters = set()
+        first = last = None
+        for row in rows:
+            count += 1
+            chatters.add(row[3])
+            if first is None:
+                first = row[5]
+            last = row[5]
+        return count, len(chatters), first, last
+
+    def compact_comments(self, older_than_days: int = 90, codec: Optional[str] = None,
+                         vacuum_pages: int = 1000) -> Dict:
+        """最後のコメントが older_than_days 日より前の動画を圧縮アーカイブへ移す"""
+        codec = codec or default_codec()
+        cutoff = _to_comment_time(datetime.now(timezone.utc) - timedelta(days=older_than_days))
+        video_ids = [row[0] for row in self.conn.execute(
+            'SELECT video_id FROM comments GROUP BY video_id HAVING MAX(comment_time) < ?',
+            (cutoff,)
+        )]
+
+        result = {'videos': 0, 'rows': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+        for video_id in video_ids:
+            stats = self._archive_video(video_id, codec)
+            result['videos'] += 1
+            result['rows'] += stats['row_count']
+            result['raw_bytes'] += stats['raw_bytes']
+            result['stored_bytes'] += stats['stored_bytes']
+
+        result['freed_pages'] = self.incremental_vacuum(vacuum_pages)
+        return result
+
+    def _archive_video(self, video_id: str, codec: str) -> Dict:
+        stats = {'row_count': 0, 'streamer_id': None, 'first': None, 'last': None}
+        chatters = set()
+
+        def packed_rows():
+            # 既存アーカイブと未圧縮の行を時系列順に合わせて詰め直す
+            for row in self.iter_video_comments(video_id):
+                stats['row_count'] += 1
+                stats['streamer_id'] = row[2]
+                if stats['first'] is None:
+                    stats['first'] = row[5]
+                stats['last'] = row[5]
+                chatters.add(row[3])
+                yield (row[0], row[3], row[4], row[5], row[6], row[7])
+
+        payload, stats['raw_bytes'] = pack_comments(packed_rows(), codec)
+        stats['stored_bytes'] = len(payload)
+        with self.conn:
+            self.conn.execute(
+                '''
+                INSERT OR REPLACE INTO comment_archives (
+                    video_id, streamer_id, codec, row_count, chatter_count,
+                    first_comment_time, last_comment_time, raw_bytes, stored_bytes, payload
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                (video_id, stats['streamer_id'], codec, stats['row_count'], len(chatters),
+                 stats['first'], stats['last'], stats['raw_bytes'], stats['stored_bytes'], payload)
+            )
+            self.conn.execute('DELETE FROM comments WHERE video_id = ?', (video_id,))
+        return stats
+
+    def incremental_vacuum(self, pages: int = 1000) -> int:
+        """空きページを最大 pages ページ解放し、解放したページ数を返す"""
+        if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # 既存DBは一度だけ通常のVACUUMで増分モードへ切り替える
+            before = self.conn.execute('PRAGMA page_count').fetchone()[0]
+            self.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.conn.execute('VACUUM')
+            return before - self.conn.execute('PRAGMA page_count').fetchone()[0]
+        before = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # execute() では1ページずつしか進まないため executescript で最後まで実行する
+        self.conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+        return before - self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def _video_row(self, user_id: str, video: Dict, synced_at: int) -> tuple:
+        start = parse_iso_datetime(video['created_at'])
+        duration_seconds = parse_duration_seconds(video['duration'])
+        start_ts = int(start.timestamp())
+        return (
+            video['id'], user_id, video['url'], video['title'], video.get('game_name', ''),
+            video['created_at'], video['duration'], duration_seconds,
+            start_ts, start_ts + duration_seconds, synced_at
+        )
+
+    def upsert_videos(self, user_id: str, videos: List[Dict], mark_missing_unavailable: bool = True):
+        """APIから取得した動画情報を保存し、取得できなかった動画を利用不可にする"""
+        synced_at = int(time.time())
+        rows = [self._video_row(user_id, video, synced_at) for video in videos]
+        with self.conn:
+            if mark_missing_unavailable:
+                self.conn.execute(
+                    'UPDATE videos SET is_available = 0 WHERE user_id = ? AND is_available = 1',
+                    (user_id,)
+                )
+            self.conn.executemany(
+                '''
+                INSERT INTO videos (id, user_id, url, title, game_name, created_at, duration,
+                                    duration_seconds, start_ts, end_ts, is_available, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    url = excluded.url,
+                    title = excluded.title,
+                    -- ID指定の取得（先読みなど）はゲーム名を持たないため、取得済みのゲーム名を空で上書きしない
+                    game_name = COALESCE(NULLIF(excluded.game_name, ''), videos.game_name),
+                    created_at = excluded.created_at,
+                    duration = excluded.duration,
+                    duration_seconds = excluded.duration_seconds,
+                    start_ts = excluded.start_ts,
+                    end_ts = excluded.end_ts,
+                    is_available = 1,
+                    synced_at = excluded.synced_at
+                ''',
+                rows
+            )
+
+    def import_legacy_videos(self, user_id: str, videos: List[Dict]):
+        """旧JSONキャッシュの動画を、既存の行を上書きせずに利用不可として取り込む"""
+        synced_at = int(time.time())
+        rows = []
+        for video in videos:
+            try:
+                rows.append(self._video_row(user_id, video, synced_at))
+            except (KeyError, ValueError) as e:
+                print(f"旧キャッシュの動画をスキップ: {e}")
+        with self.conn:
+            self.conn.executemany(
+                '''
+                INSERT OR IGNORE INTO videos (id, user_id, url, title, game_name, created_at, duration,
+                                              duration_seconds, start_ts, end_ts, is_available, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+                ''',
+                rows
+            )
+
+    def get_user_videos(self, user_id: str) -> List[Dict]:
+        """チャンネルの動画一覧を新しい順に取得"""
+        cursor = self.conn.execute(
+            '''
+            SELECT id, url, title, game_name, created_at, duration_seconds,
+                   start_ts, end_ts, is_available
+            FROM videos WHERE user_id = ? ORDER BY start_ts DESC
+            ''',
+            (user_id,)
+        )
+        return [{
+            'id': row[0],
+            'url': row[1],
+            'title': row[2],
+            'game_name': row[3],
+            'created_at': row[4],
+            'duration_seconds': row[5],
+            'start_ts': row[6],
+            'end_ts': row[7],
+            'is_available': bool(row[8])
+        } for row in cursor]
+
+    def _video_dict(self, row) -> Dict:
+        return {
+            'id': row[0],
+            'user_id': row[1],
+            'url': row[2],
+            'title': row[3],
+            'game_name': row[4],
+            'created_at': row[5],
+            'duration_seconds': row[6],
+            'start_ts': row[7],
+            'end_ts': row[8],
+            'is_available': bool(row[9])
+        }
+
+    def get_video(self, video_id: str) -> Optional[Dict]:
+        """動画IDから保存済みの動画情報を取得"""
+        row = self.conn.execute(
+            '''
+            SELECT id, user_id, url, title, game_name, created_at, duration_seconds,
+                   start_ts, end_ts, is_available
+            FROM videos WHERE id = ?
+            ''',
+            (video_id,)
+        ).fetchone()
+        return self._video_dict(row) if row else None
+
+    def find_video_by_start(self, user_id: str, start_from: int, start_to: int) -> Optional[Dict]:
+        """チャンネルの動画のうち開始時刻が [start_from, start_to) のものを取得"""
+        row = self.conn.execute(
+            '''
+            SELECT id, user_id, url, title, game_name, created_at, duration_seconds,
+                   start_ts, end_ts, is_available
+            FROM videos WHERE user_id = ? AND start_ts >= ? AND start_ts < ?
+            ORDER BY start_ts LIMIT 1
+            ''',
+            (user_id, start_from, start_to)
+        ).fetchone()
+        return self._video_dict(row) if row else None
+
+    def enqueue_download_jobs(self, jobs: Iterable[Tuple[str, str]]) -> int:
+        """(動画ID, URL) をキューに追加し、新たに待ち状態になった件数を返す
+
+        完了済みのジョブはそのまま残し、失敗したジョブは試行回数を戻して再投入する。
+        """
+        now = int(time.time())
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                '''
+                INSERT INTO download_jobs (video_id, url, status, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?)
+                ON CONFLICT (video_id) DO UPDATE SET
+                    status = 'queued',
+                    attempts = 0,
+                    error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE status = 'failed'
+                ''',
+                [(video_id, url, now, now) for video_id, url in jobs]
+            )
+        return self.conn.total_changes - before
+
+    def set_download_job_metadata(self, videos: Iterable[Dict]):
+        """APIで取得した動画情報（配信者・タイトル・開始時刻・長さ）をジョブに記録する"""
+        with self.conn:
+            self.conn.executemany(
+                '''
+                UPDATE download_jobs SET streamer_id = ?, channel = ?, title = ?, start_time = ?,
+                                         duration_seconds = ?
+                WHERE video_id = ?
+                ''',
+                [(video['user_id'], video['user_login'], video['title'], video['created_at'],
+                  parse_duration_seconds(video['duration']), video['id']) for video in videos]
+            )
+
+    def claim_download_job(self, owner: str, lease_seconds: float) -> Optional[Dict]:
+        """待ち状態か、リースの期限が切れたジョブを running にしてリースを取得し、返す（なければ None）
+
+        書き込みロック（BEGIN IMMEDIATE）を取ってから選ぶので、同じDBを使う複数のプロセスが同じジョブを取ることはない。
+        再試行のジョブは未着手のジョブの後に回す。動画情報を取得していないジョブは streamer_id などが None。
+        結果の報告や延長には返り値の lease_token を使い、リースを引き継がれた後の報告は無視される。
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute(
+                '''
+                SELECT video_id, url, attempts, streamer_id, channel, title, start_time, duration_seconds,
+                       status, lease_owner
+                FROM download_jobs
+                WHERE status = 'queued' OR (status = 'running' AND COALESCE(lease_expires, 0) < ?)
+                ORDER BY attempts, created_at, rowid LIMIT 1
+                ''',
+                (now,)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    '''
+                    UPDATE download_jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,
+                                             lease_token = ?, lease_expires = ?, updated_at = ?
+                    WHERE video_id = ?
+                    ''',
+                    (owner, token, now + lease_seconds, int(now), row[0])
+                )
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        if row is None:
+            return None
+        return {
+            'video_id': row[0],
+            'url': row[1],
+            'attempts': row[2] + 1,
+            'streamer_id': row[3],
+            'channel': row[4],
+            'title': row[5],
+            'start_time': row[6],
+            'duration_seconds': row[7],
+            'lease_token': token,
+            # 期限切れのリースを引き継いだ場合は前の持ち主
+            'reclaimed_from': (row[9] or '不明') if row[8] == 'running' else None
+        }
+
+    def renew_download_job_lease(self, video_id: str, lease_token: str, lease_seconds: float) -> bool:
+        """リースの期限を延ばす（ハートビート）。リースを失っていれば False"""
+        with self.conn:
+            cursor = self.conn.execute(
+                '''
+                UPDATE download_jobs SET lease_expires = ?
+                WHERE video_id = ? AND status = 'running' AND lease_token = ?
+                ''',
+                (time.time() + lease_seconds, video_id, lease_token)
+            )
+        return cursor.rowcount == 1
+
+    def complete_download_job(self, video_id: str, lease_token: str, output_path: Optional[str]) -> bool:
+        """ジョブを完了にする（アーカイブ済みでスキップした場合は output_path が None）
+
+        リースを持っている場合だけ記録し、記録したかどうかを返す。
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                '''
+                UPDATE download_jobs SET status = 'done', output_path = ?, error = NULL, updated_at = ?,
+                                         lease_owner = NULL, lease_token = NULL, lease_expires = NULL
+                WHERE video_id = ? AND status = 'running' AND lease_token = ?
+                ''',
+                (output_path, int(time.time()), video_id, lease_token)
+            )
+        return cursor.rowcount == 1
+
+    def fail_download_job(self, video_id: str, lease_token: str, error: str, retry: bool) -> bool:
+        """ジョブの失敗を記録する（retry なら待ち状態に戻して再試行）。リースを失っていれば記録せず False"""
+        with self.conn:
+            cursor = self.conn.execute(
+                '''
+                UPDATE download_jobs SET status = ?, error = ?, updated_at = ?,
+                                         lease_owner = NULL, lease_token = NULL, lease_expires = NULL
+                WHERE video_id = ? AND status = 'running' AND lease_token = ?
+                ''',
+                ('queued' if retry else 'failed', error, int(time.time()), video_id, lease_token)
+            )
+        return cursor.rowcount == 1
+
+    def get_download_job_counts(self) -> Dict[str, int]:
+        """状態ごとのジョブ件数"""
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for status, count in self.conn.execute(
+            'SELECT status, COUNT(*) FROM download_jobs GROUP BY status'
+        ):
+            counts[status] = count
+        return counts
+
+    def start_live_capture(self, stream_id: str, streamer_id: str, channel: str, stream_started_at: int) -> Dict:
+        """配信のチャット取得を記録し、その記録を返す
+
+        同じ配信の記録が終了前のまま残っていれば（取得側の再起動）、取得できなかった区間として gaps を1増やす。
+        """
+        now = int(time.time())
+        with self.conn:
+            self.conn.execute(
+                '''
+                INSERT INTO live_captures (stream_id, streamer_id, channel, stream_started_at, capture_started_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (stream_id) DO UPDATE SET gaps = gaps + 1, ended_at = NULL, complete = NULL
+                ''',
+                (stream_id, streamer_id, channel, stream_started_at, now)
+            )
+        return self.get_live_capture(stream_id)
+
+    def resolve_live_capture(self, stream_id: str, video_id: str):
+        """配信のVODが確定したら、仮のIDで保存したコメントをVODのURLに付け替える"""
+        with self.conn:
+            self.conn.execute('UPDATE comments SET video_id = ? WHERE video_id = ?',
+                              (video_id, f'live:{stream_id}'))
+            self.conn.execute('UPDATE live_captures SET video_id = ? WHERE stream_id = ?',
+                              (video_id, stream_id))
+
+    def save_live_comments(self, rows: List[tuple], counts: Dict[str, int]):
+        """複数の配信のコメントと、配信ごとの取得件数を1つのトランザクションで保存する"""
+        with self.conn:
+            self.conn.executemany(
+                '''
+                INSERT INTO comments (video_id, streamer_id, user_id, user_color, comment_time, message)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''',
+                rows
+            )
+            self.conn.executemany(
+                'UPDATE live_captures SET comment_count = comment_count + ? WHERE stream_id = ?',
+                [(count, stream_id) for stream_id, count in counts.items()]
+            )
+
+    def finish_live_capture(self, stream_id: str, gaps: int, start_grace_seconds: int) -> Optional[Dict]:
+        """配信終了時に記録を閉じ、その記録を返す
+
+        配信開始から start_grace_seconds 以内に取得を始め、途中で切断されなかった場合だけ complete = 1 にする。
+        """
+        with self.conn:
+            self.conn.execute(
+                '''
+                UPDATE live_captures SET
+                    ended_at = ?,
+                    gaps = gaps + ?,
+                    complete = (capture_started_at - stream_started_at <= ? AND gaps + ? = 0)
+                WHERE stream_id = ?
+                ''',
+                (int(time.time()), gaps, start_grace_seconds, gaps, stream_id)
+            )
+        return self.get_live_capture(stream_id)
+
+    def _live_capture_dict(self, row) -> Dict:
+        return {
+            'stream_id': row[0],
+            'streamer_id': row[1],
+            'channel': row[2],
+            'video_id': row[3],
+            'stream_started_at': row[4],
+            'capture_started_at': row[5],
+            'ended_at': row[6],
+            'comment_count': row[7],
+            'gaps': row[8],
+            'complete': None if row[9] is None else bool(row[9]),
+            'replaced_at': row[10]
+        }
+
+    def get_live_capture(self, stream_id: str) -> Optional[Dict]:
+        row = self.conn.execute('SELECT * FROM live_captures WHERE stream_id = ?', (stream_id,)).fetchone()
+        return self._live_capture_dict(row) if row else None
+
+    def get_live_capture_by_video(self, video_id: str) -> Optional[Dict]:
+        """VODのURLから、そのVODのチャット取得の記録を探す"""
+        row = self.conn.execute(
+            'SELECT * FROM live_captures WHERE video_id = ? ORDER BY stream_started_at DESC LIMIT 1',
+            (video_id,)
+        ).fetchone()
+        return self._live_capture_dict(row) if row else None
+
+    def get_open_live_captures(self) -> List[Dict]:
+        """終了を記録していない（取得中または前回の中断で閉じていない）チャット取得の記録を返す"""
+        cursor = self.conn.execute('SELECT * FROM live_captures WHERE ended_at IS NULL ORDER BY capture_started_at')
+        return [self._live_capture_dict(row) for row in cursor]
+
+    def get_live_captures(self, limit: int = 50) -> List[Dict]:
+        """新しい順にチャット取得の記録を返す"""
+        cursor = self.conn.execute(
+            'SELECT * FROM live_captures ORDER BY capture_started_at DESC LIMIT ?', (limit,)
+        )
+        return [self._live_capture_dict(row) for row in cursor]
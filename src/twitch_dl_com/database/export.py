@@ -0,0 +1,50 @@
+import csv
+import json
+from typing import Iterable, Optional
+from ..compression import codec_from_path, open_text, strip_suffix
+
+# comments テーブルの列のうちエクスポート対象とするもの（列番号, 出力名）
+EXPORT_COLUMNS = [
+    (1, 'video_id'),
+    (2, 'streamer_id'),
+    (3, 'user_id'),
+    (4, 'user_color'),
+    (5, 'comment_time'),
+    (6, 'message'),
+]
+
+
+def _open_output(path: str, compress: Optional[str] = None):
+    """出力ファイルを開く（compress='gzip'/'zstd' または拡張子 .gz/.zst で圧縮）"""
+    return open_text(path, 'w', compress or codec_from_path(path))
+
+
+def export_comments_csv(rows: Iterable[tuple], path: str, compress: Optional[str] = None) -> int:
+    """コメント行をCSVへ逐次書き出し、書き出した件数を返す"""
+    count = 0
+    with _open_output(path, compress) as f:
+        writer = csv.writer(f)
+        writer.writerow([name for _, name in EXPORT_COLUMNS])
+        for row in rows:
+            writer.writerow([row[index] for index, _ in EXPORT_COLUMNS])
+            count += 1
+    return count
+
+
+def export_comments_jsonl(rows: Iterable[tuple], path: str, compress: Optional[str] = None) -> int:
+    """コメント行をJSON Linesへ逐次書き出し、書き出した件数を返す"""
+    count = 0
+    with _open_output(path, compress) as f:
+        for row in rows:
+            record = {name: row[index] for index, name in EXPORT_COLUMNS}
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def export_comments(rows: Iterable[tuple], path: str, compress: Optional[str] = None) -> int:
+    """拡張子（.jsonl / .csv、末尾の .gz / .zst は圧縮）に応じた形式で書き出す"""
+    if strip_suffix(path).endswith('.jsonl'):
+        return export_comments_jsonl(rows, path, compress)
+    return export_comments_csv(rows, path, compress)
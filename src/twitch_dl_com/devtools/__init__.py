@@ -0,0 +1 @@
+# ローカル検証・ベンチマーク用のスタンドインサーバー群
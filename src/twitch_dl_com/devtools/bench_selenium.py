@@ -0,0 +1,181 @@
+"""Seleniumでのチャットダウンロードをオフラインで計測するベンチマーク
+
+fake_chat_site を起動し、同じVODの組を次の方法でダウンロードして比べる。
+  serial      VODごとにChromeを起動して1件ずつ（BrowserPool導入前の動作）
+  pooled      起動済みのChrome 1つを使い回して1件ずつ
+  concurrent  --pool 個のChromeで並行に
+
+方法ごとに子プロセスで実行し、VODごとの所要時間（p50/p95/最大）と、
+子プロセスとその配下（chromedriver・Chrome）のCPU時間・最大RSSを表示する。
+
+    python -m twitch_dl_com.devtools.bench_selenium --vods 12 --pool 3 --comments 50000 --prepare-seconds 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from .. import timing
+from ..bulk_import import VIDEO_URL_FORMAT
+from ..chat_downloader import BrowserPool, extract_video_id, fetch_chat_file
+from .fake_chat_site import start_fake_chat_site
+
+MODES = ('serial', 'pooled', 'concurrent')
+FIRST_VIDEO_ID = 900000001
+
+
+def _download(url: str, output_dir: str, mode: str, site_url: str, pool=None, compress=None):
+    """1件のVODをダウンロードし、'job' 段階として計測する"""
+    video_id = extract_video_id(url)
+    with timing.job_context(f"{mode}-{video_id}", video_id):
+        with timing.stage('job') as record:
+            try:
+                path = fetch_chat_file(url, output_dir, None, compress, 'selenium',
+                                       get_pool=pool and (lambda: pool), site_url=site_url)
+            except Exception as e:
+                # 失敗も1件として数え、残りのVODの計測を続ける
+                print(f"ダウンロードに失敗しました: {url}: {e}", file=sys.stderr)
+                path = None
+            record['ok'] = bool(path)
+            return path
+
+
+def run_mode(mode: str, urls: List[str], output_dir: str, site_url: str, pool_size: int = 3,
+             compress=None, block_resources: bool = True) -> int:
+    """（子プロセスで）指定の方法ですべてのVODをダウンロードし、成功した件数を返す"""
+    if mode == 'serial':
+        return sum(1 for url in urls if _download(url, output_dir, mode, site_url, compress=compress))
+    size = 1 if mode == 'pooled' else pool_size
+    with BrowserPool(size, output_dir, block_resources, site_url) as pool:
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            paths = executor.map(lambda url: _download(url, output_dir, mode, site_url, pool, compress), urls)
+            return sum(1 for path in paths if path)
+
+
+def measure_mode(mode: str, urls: List[str], work_dir: str, site_url: str, pool_size: int,
+                 compress=None, block_resources: bool = True) -> Dict:
+    """子プロセスで1つの方法を実行し、所要時間・CPU時間・最大RSSを返す"""
+    output_dir = os.path.join(work_dir, mode)
+    log_path = os.path.join(work_dir, f'{mode}.jsonl')
+    command = [sys.executable, '-m', 'twitch_dl_com.devtools.bench_selenium', '--child', mode,
+               '--site-url', site_url, '--output-dir', output_dir, '--timing-log', log_path,
+               '--pool', str(pool_size)]
+    if compress:
+        command += ['--compress', compress]
+    if not block_resources:
+        command.append('--no-block')
+    command += urls
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    # wait4 の使用量には、子プロセスが回収した chromedriver と Chrome の分も含まれる
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - started
+    # os.waitstatus_to_exitcode は Python 3.9 以降のため、returncode と同じ形（シグナル終了は負の値）に直す
+    exit_status = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+    events = list(timing.read_events([log_path])) if os.path.exists(log_path) else []
+    jobs = sorted(event['duration'] for event in events if event['stage'] == 'job')
+    succeeded = sum(1 for event in events if event['stage'] == 'job' and event['ok'])
+    cpu = usage.ru_utime + usage.ru_stime
+    return {
+        'mode': mode,
+        'vods': len(urls),
+        'succeeded': succeeded,
+        'exit_status': exit_status,
+        'wall': wall,
+        'vods_per_minute': succeeded / wall * 60 if wall else 0,
+        'job_p50': timing.percentile(jobs, 50),
+        'job_p95': timing.percentile(jobs, 95),
+        'job_max': jobs[-1] if jobs else 0,
+        'cpu': cpu,
+        'cpu_per_vod': cpu / len(urls) if urls else 0,
+        # Linux の ru_maxrss はKB単位で、配下で最も大きかったプロセスの値
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'stages': timing.summarize(events)
+    }
+
+
+def format_results(results: List[Dict]) -> str:
+    lines = [f"{'mode':<12}{'ok':>8}{'wall(s)':>10}{'VOD/min':>9}{'p50(s)':>9}{'p95(s)':>9}{'max(s)':>9}"
+             f"{'CPU(s)':>9}{'CPU/VOD':>9}{'RSS(MB)':>9}"]
+    for row in results:
+        lines.append(
+            f"{row['mode']:<12}{row['succeeded']:>4}/{row['vods']:<3}{row['wall']:>10.1f}"
+            f"{row['vods_per_minute']:>9.1f}{row['job_p50']:>9.2f}{row['job_p95']:>9.2f}{row['job_max']:>9.2f}"
+            f"{row['cpu']:>9.1f}{row['cpu_per_vod']:>9.2f}{row['peak_rss_mb']:>9.0f}"
+        )
+    for row in results:
+        if row['exit_status'] != 0:
+            lines.append(f"※ {row['mode']} は途中で終了しました（終了コード {row['exit_status']}）")
+    return '\n'.join(lines)
+
+
+def _child_main(args):
+    timing.configure(args.timing_log)
+    try:
+        run_mode(args.child, args.urls, args.output_dir, args.site_url, args.pool, args.compress,
+                 not args.no_block)
+    finally:
+        timing.configure(None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seleniumでのチャットダウンロードをオフラインで計測する')
+    parser.add_argument('--vods', type=int, default=6, help='ダウンロードするVODの数')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='計測する方法')
+    parser.add_argument('--pool', type=int, default=3, help='concurrent で使うChromeの数')
+    parser.add_argument('--comments', type=int, default=20000, help='1VODあたりのCSVの行数')
+    parser.add_argument('--prepare-seconds', type=float, default=1,
+                        help='サイトで「Export chat」が押せるようになるまでの秒数')
+    parser.add_argument('--page-latency', type=float, default=0, help='ページを返すまでの遅延（秒）')
+    parser.add_argument('--export-latency', type=float, default=0, help='CSVを返し始めるまでの遅延（秒）')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help='ダウンロード後に圧縮する形式')
+    parser.add_argument('--no-block', action='store_true', help='プールで画像・CSS・フォントの読み込みを止めない')
+    parser.add_argument('--stages', action='store_true', help='方法ごとに段階別の集計も表示する')
+    parser.add_argument('--json', help='結果をJSONで保存するファイル（変更前後の比較用）')
+    parser.add_argument('--work-dir', help='ダウンロード先と計測ログの置き場所（省略時は一時ディレクトリ）')
+    # 以下は子プロセス用
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--site-url', help=argparse.SUPPRESS)
+    parser.add_argument('--output-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--timing-log', help=argparse.SUPPRESS)
+    parser.add_argument('urls', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child_main(args)
+        return
+
+    server, site_url = start_fake_chat_site(args.comments, args.prepare_seconds, args.page_latency,
+                                            args.export_latency)
+    urls = [VIDEO_URL_FORMAT.format(FIRST_VIDEO_ID + index) for index in range(args.vods)]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_selenium-')
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"サイト: {site_url} / 作業ディレクトリ: {work_dir}")
+    results = []
+    try:
+        for mode in args.modes:
+            print(f"計測中: {mode} ({args.vods}件)")
+            results.append(measure_mode(mode, urls, work_dir, site_url, args.pool, args.compress,
+                                        not args.no_block))
+    finally:
+        server.shutdown()
+
+    print(format_results(results))
+    if args.stages:
+        for row in results:
+            print(f"\n[{row['mode']}]")
+            print(timing.format_summary(row['stages']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': {key: value for key, value in vars(args).items() if key != 'urls'},
+                       'results': results}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""twitchchatdownloader.com の操作の流れを模したローカルサイト
+
+Seleniumでのダウンロード（download_chat / BrowserPool）をネットワークに出ずに検証・計測するためのもの。
+URL入力欄 #video-url →「Download chat」ボタン → 進捗テキスト → 「Export chat」ボタンでCSVをダウンロード、
+という実サイトと同じ要素・文言を再現する。
+
+    python -m twitch_dl_com.devtools.fake_chat_site --port 8766 --comments 50000 --prepare-seconds 3
+    python twitch_chat_downloader.py -u 123456789 --backend selenium --site-url http://127.0.0.1:8766
+"""
+import argparse
+import csv
+import io
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from ..chat_http import CSV_HEADER, comment_to_row
+from .fake_gql_server import make_comment
+
+_EXPORT_PATH_PATTERN = re.compile(r'^/export/(\d+)\.csv$')
+
+# 進捗は実サイトと同じ 'Progress: N % | Remaining: N sec' 形式で更新する
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Twitch Chat Downloader (offline)</title></head>
+<body>
+<input id="video-url" type="text" placeholder="https://www.twitch.tv/videos/...">
+<button class="btn btn-secondary" title="Download chat" id="download-chat">Download chat</button>
+<div id="result"></div>
+<script>
+const PREPARE_SECONDS = __PREPARE_SECONDS__;
+document.getElementById('download-chat').addEventListener('click', () => {
+    const match = document.getElementById('video-url').value.trim().match(/(?:\\/videos\\/|^)(\\d+)/);
+    const result = document.getElementById('result');
+    if (!match) {
+        result.textContent = 'Invalid video URL';
+        return;
+    }
+    const videoId = match[1];
+    result.innerHTML = '<small class="d-block"></small>'
+        + '<button class="btn btn-primary disabled" title="Export chat" disabled>Export chat</button>';
+    const progress = result.querySelector('small');
+    const button = result.querySelector('button');
+    const started = performance.now();
+    const tick = () => {
+        const elapsed = (performance.now() - started) / 1000;
+        const ratio = PREPARE_SECONDS > 0 ? Math.min(elapsed / PREPARE_SECONDS, 1) : 1;
+        const remaining = ratio >= 1 ? 0 : Math.ceil(PREPARE_SECONDS - elapsed);
+        progress.textContent = `Progress: ${Math.floor(ratio * 100)} % | Remaining: ${remaining} sec`;
+        if (ratio >= 1) {
+            button.disabled = false;
+            button.classList.remove('disabled');
+        } else {
+            setTimeout(tick, 200);
+        }
+    };
+    tick();
+    button.addEventListener('click', () => {
+        const link = document.createElement('a');
+        link.href = `/export/${videoId}.csv`;
+        link.download = `${videoId}.csv`;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+    });
+});
+</script>
+</body>
+</html>
+"""
+
+
+class FakeChatSiteHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeTwitchChatDownloader/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/':
+            if self.server.page_latency:
+                time.sleep(self.server.page_latency)
+            data = PAGE_TEMPLATE.replace('__PREPARE_SECONDS__', repr(self.server.prepare_seconds)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        match = _EXPORT_PATH_PATTERN.match(path)
+        if match is None:
+            self.send_error(404)
+            return
+        if self.server.export_latency:
+            time.sleep(self.server.export_latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('Content-Disposition', f'attachment; filename="{match.group(1)}.csv"')
+        self.end_headers()
+        self._write_csv(match.group(1))
+
+    def _write_csv(self, video_id: str):
+        # Content-Length なしで書き出し、接続を閉じて終わりを伝える
+        self.close_connection = True
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        for index in range(self.server.total_comments):
+            node = make_comment(video_id, index, self.server.comments_per_second)['node']
+            writer.writerow(comment_to_row(node))
+            if buffer.tell() >= 64 * 1024:
+                self.wfile.write(buffer.getvalue().encode('utf-8'))
+                buffer.seek(0)
+                buffer.truncate()
+        self.wfile.write(buffer.getvalue().encode('utf-8'))
+
+
+def start_fake_chat_site(total_comments: int = 1000, prepare_seconds: float = 1, page_latency: float = 0,
+                         export_latency: float = 0, comments_per_second: int = 5, host: str = '127.0.0.1',
+                         port: int = 0, verbose: bool = False) -> Tuple[ThreadingHTTPServer, str]:
+    """別スレッドでサイトを起動し、(server, サイトのURL) を返す（停止は server.shutdown()）
+
+    prepare_seconds は「Download chat」から「Export chat」が押せるようになるまでの時間、
+    total_comments はエクスポートするCSVの行数（1行およそ80バイト）。
+    """
+    server = ThreadingHTTPServer((host, port), FakeChatSiteHandler)
+    server.daemon_threads = True
+    server.total_comments = total_comments
+    server.prepare_seconds = prepare_seconds
+    server.page_latency = page_latency
+    server.export_latency = export_latency
+    server.comments_per_second = comments_per_second
+    server.verbose = verbose
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='twitchchatdownloader.com の操作の流れを模したローカルサイト')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--comments', type=int, default=10000, help='エクスポートするCSVの行数')
+    parser.add_argument('--prepare-seconds', type=float, default=1,
+                        help='「Export chat」が押せるようになるまでの秒数')
+    parser.add_argument('--page-latency', type=float, default=0, help='ページを返すまでの遅延（秒）')
+    parser.add_argument('--export-latency', type=float, default=0, help='CSVを返し始めるまでの遅延（秒）')
+    args = parser.parse_args()
+
+    server, url = start_fake_chat_site(
+        args.comments, args.prepare_seconds, args.page_latency, args.export_latency,
+        host=args.host, port=args.port, verbose=True
+    )
+    print(f"起動しました: {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
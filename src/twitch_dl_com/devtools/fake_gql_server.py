@@ -0,0 +1,123 @@
+"""Twitch GQL のコメント取得APIを模したローカルサーバー
+
+HttpChatDownloader をネットワークに出ずに検証するためのもの。
+
+    python -m twitch_dl_com.devtools.fake_gql_server --port 8765 --comments 50000
+    python twitch_chat_downloader.py -u 123456789 --backend http --gql-url http://127.0.0.1:8765/gql
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+COLORS = ['#FF0000', '#0000FF', '#008000', '#B22222', '#FF7F50', '']
+
+
+def make_comment(video_id: str, index: int, comments_per_second: int) -> dict:
+    """動画IDと連番から決まったコメントを生成"""
+    user = index % 997
+    return {
+        'cursor': str(index + 1),
+        'node': {
+            'id': f'{video_id}-{index}',
+            'contentOffsetSeconds': index // comments_per_second,
+            'commenter': {'login': f'user{user}', 'displayName': f'ユーザー{user}'},
+            'message': {
+                'fragments': [{'text': f'コメント {index}, "引用" あり'}],
+                'userColor': COLORS[user % len(COLORS)]
+            }
+        }
+    }
+
+
+class FakeGqlHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeTwitchGQL/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_message:
+            self._send_json(200, {'errors': [{'message': self.server.error_message}]})
+            return
+
+        variables = request.get('variables') or {}
+        video_id = str(variables.get('videoID', ''))
+        if video_id in self.server.missing_videos:
+            self._send_json(200, {'data': {'video': None}})
+            return
+
+        start = int(variables.get('cursor') or 0)
+        end = min(start + self.server.page_size, self.server.total_comments)
+        edges = [
+            make_comment(video_id, index, self.server.comments_per_second)
+            for index in range(start, end)
+        ]
+        self._send_json(200, {'data': {'video': {
+            'id': video_id,
+            'comments': {
+                'edges': edges,
+                'pageInfo': {'hasNextPage': end < self.server.total_comments}
+            }
+        }}})
+
+
+def start_fake_gql_server(total_comments: int = 1000, page_size: int = 100, latency: float = 0,
+                          comments_per_second: int = 5, error_message: Optional[str] = None,
+                          missing_videos=(), host: str = '127.0.0.1', port: int = 0,
+                          verbose: bool = False) -> Tuple[ThreadingHTTPServer, str]:
+    """別スレッドでサーバーを起動し、(server, GQLのURL) を返す（停止は server.shutdown()）"""
+    server = ThreadingHTTPServer((host, port), FakeGqlHandler)
+    server.daemon_threads = True
+    server.total_comments = total_comments
+    server.page_size = page_size
+    server.latency = latency
+    server.comments_per_second = comments_per_second
+    server.error_message = error_message
+    server.missing_videos = {str(video_id) for video_id in missing_videos}
+    server.verbose = verbose
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}/gql'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Twitch GQLのコメント取得APIを模したローカルサーバー')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--comments', type=int, default=10000, help='1動画あたりのコメント数')
+    parser.add_argument('--page-size', type=int, default=100, help='1レスポンスあたりのコメント数')
+    parser.add_argument('--latency', type=float, default=0, help='1リクエストあたりの遅延（秒）')
+    parser.add_argument('--error', help='常にこのメッセージのGQLエラーを返す')
+    parser.add_argument('--missing', action='append', default=[], help='存在しない扱いにする動画ID')
+    args = parser.parse_args()
+
+    server, url = start_fake_gql_server(
+        args.comments, args.page_size, args.latency, error_message=args.error,
+        missing_videos=args.missing, host=args.host, port=args.port, verbose=True
+    )
+    print(f"起動しました: {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
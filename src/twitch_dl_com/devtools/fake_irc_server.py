@@ -0,0 +1,157 @@
+"""Twitch IRC（チャット）を模したローカルサーバー
+
+LiveCaptureService / IrcConnection をネットワークに出ずに検証するためのもの。
+CAP・NICK・JOIN・PART・PING に応答し、参加中のチャンネルごとに一定の間隔でタグ付きのPRIVMSGを送る。
+
+    python -m twitch_dl_com.devtools.fake_irc_server --port 6667 --rate 20
+    python -m twitch_dl_com live --irc-host 127.0.0.1 --irc-port 6667 --no-tls
+"""
+import argparse
+import socketserver
+import threading
+import time
+import uuid
+from typing import Tuple
+from .fake_gql_server import COLORS
+
+
+def make_privmsg(channel: str, index: int) -> str:
+    """チャンネル名と連番から決まったPRIVMSGの行を生成（50件に1件は /me のメッセージ）"""
+    user = index % 997
+    login = f'user{user}'
+    text = f'コメント {index}; "引用" あり'
+    if index % 50 == 49:
+        text = f'\x01ACTION {text}\x01'
+    tags = ';'.join([
+        f'color={COLORS[user % len(COLORS)]}',
+        f'display-name=ユーザー{user}',
+        f'id={uuid.uuid4()}',
+        f'tmi-sent-ts={int(time.time() * 1000)}',
+        f'user-id={100000 + user}'
+    ])
+    return f'@{tags} :{login}!{login}@{login}.tmi.twitch.tv PRIVMSG #{channel} :{text}'
+
+
+class FakeIrcHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.nick = '*'
+        self.channels = set()
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+
+    def send(self, line: str):
+        with self.lock:
+            self.wfile.write(line.encode('utf-8') + b'\r\n')
+
+    def handle(self):
+        self.server.add_client(self)
+        sender = threading.Thread(target=self._send_messages, daemon=True)
+        sender.start()
+        try:
+            for raw in self.rfile:
+                line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+                if self.server.verbose:
+                    print(f'> {line}')
+                command, _, rest = line.partition(' ')
+                if command == 'CAP':
+                    self.send(f':tmi.twitch.tv CAP * ACK :{rest.partition(":")[2]}')
+                elif command == 'NICK':
+                    self.nick = rest
+                    self.send(f':tmi.twitch.tv 001 {self.nick} :Welcome, GLHF!')
+                elif command == 'JOIN':
+                    for channel in rest.split(','):
+                        channel = channel.lstrip('#')
+                        self.send(f':{self.nick}!{self.nick}@{self.nick}.tmi.twitch.tv JOIN #{channel}')
+                        self.send(f'@room-id=0 :tmi.twitch.tv ROOMSTATE #{channel}')
+                        self.channels.add(channel)
+                elif command == 'PART':
+                    self.channels.discard(rest.lstrip('#'))
+                elif command == 'PING':
+                    self.send(f':tmi.twitch.tv PONG tmi.twitch.tv {rest}')
+        except OSError:
+            pass
+        finally:
+            self.closed.set()
+            self.server.remove_client(self)
+
+    def _send_messages(self):
+        """参加中のチャンネルごとに毎秒 rate 件のPRIVMSGを送る"""
+        interval = 1 / self.server.rate
+        while not self.closed.wait(interval):
+            try:
+                for channel in list(self.channels):
+                    self.send(make_privmsg(channel, self.server.next_index(channel)))
+            except OSError:
+                return
+
+
+class FakeIrcServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, rate: float, verbose: bool = False):
+        super().__init__(address, FakeIrcHandler)
+        self.rate = rate
+        self.verbose = verbose
+        # チャンネル → 送ったPRIVMSGの件数
+        self.sent = {}
+        self.clients = set()
+        self._lock = threading.Lock()
+
+    def next_index(self, channel: str) -> int:
+        with self._lock:
+            index = self.sent.get(channel, 0)
+            self.sent[channel] = index + 1
+            return index
+
+    def add_client(self, handler):
+        with self._lock:
+            self.clients.add(handler)
+
+    def remove_client(self, handler):
+        with self._lock:
+            self.clients.discard(handler)
+
+    def send_reconnect(self):
+        """接続中のすべてのクライアントに RECONNECT を送る（Twitchのサーバー再起動と同じ）"""
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.send(':tmi.twitch.tv RECONNECT')
+            except OSError:
+                pass
+
+
+def start_fake_irc_server(rate: float = 10, host: str = '127.0.0.1', port: int = 0,
+                          verbose: bool = False) -> Tuple[FakeIrcServer, Tuple[str, int]]:
+    """別スレッドでサーバーを起動し、(server, (host, port)) を返す（停止は server.shutdown()）
+
+    rate は参加中のチャンネルごとに1秒あたり送るPRIVMSGの件数。
+    """
+    server = FakeIrcServer((host, port), rate, verbose)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, (host, server.server_address[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Twitch IRC（チャット）を模したローカルサーバー')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6667)
+    parser.add_argument('--rate', type=float, default=10, help='チャンネルごとに1秒あたり送るメッセージ数')
+    parser.add_argument('--verbose', action='store_true', help='受信したコマンドを表示する')
+    args = parser.parse_args()
+
+    server, (host, port) = start_fake_irc_server(args.rate, args.host, args.port, args.verbose)
+    print(f"起動しました: {host}:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
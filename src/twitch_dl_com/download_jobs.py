@@ -0,0 +1,203 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from . import timing
+from .bulk_import import VIDEO_URL_FORMAT
+from .chat_http import extract_video_id
+from .download_paths import chat_filename, write_metadata_sidecar
+
+DEFAULT_MAX_ATTEMPTS = 3
+# 保管庫の索引に一緒に記録するジョブの動画情報
+ARCHIVE_METADATA_KEYS = ('url', 'streamer_id', 'channel', 'title', 'start_time', 'duration_seconds')
+# ジョブのリースの長さ（秒）。この間ハートビートが途絶えたワーカーのジョブは他のワーカーが引き継ぐ
+DEFAULT_LEASE_SECONDS = 60
+
+
+def parse_video_urls(urls: Iterable[str], archive=None) -> Tuple[Dict[str, str], int]:
+    """URLのリストから {動画ID: 正規化したURL} を作り、重複した行の数と一緒に返す（不正な行は表示して除く）
+
+    archive（ChatArchive）を渡すと、保管済みの動画も除く。
+    """
+    jobs = {}
+    duplicates = 0
+    archived = 0
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        try:
+            video_id = extract_video_id(url)
+        except ValueError as e:
+            print(e)
+            continue
+        if video_id in jobs:
+            duplicates += 1
+            continue
+        if archive is not None and video_id in archive:
+            archived += 1
+            continue
+        jobs[video_id] = VIDEO_URL_FORMAT.format(video_id)
+    if archived:
+        print(f"保管済みのため {archived} 件をスキップします")
+    return jobs, duplicates
+
+
+def enqueue_urls(db, urls: Iterable[str], archive=None) -> int:
+    """URLのリストをジョブキューへ追加し、新たに待ち状態になった件数を返す（保管済みの動画は追加しない）"""
+    jobs, _ = parse_video_urls(urls, archive)
+    return db.enqueue_download_jobs(jobs.items())
+
+
+def job_filename(job: Dict) -> str:
+    """ジョブの保存名（動画情報を取得済みなら配信者と開始時刻を含める）"""
+    return chat_filename(job['video_id'], job.get('channel'), job.get('start_time'))
+
+
+def write_job_metadata(path: str, job: Dict) -> Optional[str]:
+    """動画情報を取得済みのジョブなら、取り込み用のメタデータを保存したファイルの隣に書く"""
+    if not job.get('streamer_id'):
+        return None
+    return write_metadata_sidecar(path, {
+        'video_id': job['video_id'],
+        'url': job['url'],
+        'streamer_id': job['streamer_id'],
+        'start_time': job['start_time'],
+        'channel': job['channel'],
+        'title': job['title'],
+        'duration_seconds': job['duration_seconds']
+    })
+
+
+def archive_file(archive, path: str, job: Dict):
+    """保存したファイルを保管庫へ入れる（失敗してもダウンロード自体は成功として扱う）"""
+    metadata = {key: job[key] for key in ARCHIVE_METADATA_KEYS if job.get(key) is not None}
+    try:
+        with timing.stage('archive', bytes=os.path.getsize(path)):
+            archive.add(path, job['video_id'], **metadata)
+    except (OSError, ValueError) as e:
+        print(f"保管庫への追加に失敗しました: {path}: {e}")
+
+
+def _timed_download(download, job: Dict, archive=None):
+    """ワーカースレッドで、ジョブIDを付けて1件のダウンロード全体を計測する"""
+    with timing.job_context(f"{job['video_id']}#{job['attempts']}", job['video_id']):
+        with timing.stage('job') as record:
+            path = download(job)
+            record['ok'] = bool(path)
+            if path and archive is not None:
+                archive_file(archive, path, job)
+            return path
+
+
+def default_worker_id() -> str:
+    """リースの持ち主として記録するワーカー名（'<ホスト名>:<プロセスID>'）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_download_jobs(db, download: Callable[[Dict], Optional[str]], workers: int = 1,
+                      max_attempts: int = DEFAULT_MAX_ATTEMPTS, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                      worker_id: Optional[str] = None, archive=None) -> Dict:
+    """キューのジョブがなくなるまで download(job) を実行し、結果の件数を返す
+
+    job は claim_download_job の辞書（URLと、取得済みなら配信者・開始時刻などの動画情報）。
+    download は保存したファイルのパスを返す（失敗時は None か例外）。
+    DBへのアクセスは呼び出し元のスレッドだけで行い、ダウンロードは最大 workers 件を並行に実行する。
+    コメントが保存済み（圧縮アーカイブを含む）の動画はダウンロードせずに完了にする。
+    配信中に一部だけ取得したチャットしかない動画はダウンロードする（取り込むと置き換わる）。
+    archive（ChatArchive）を渡すと、保管済みの動画も同様に完了にし、保存したファイルを保管庫へ入れる。
+
+    同じDBファイルを使う複数のプロセス（別のホストを含む）で同時に実行できる。
+    ジョブは lease_seconds 秒のリースを取って処理し、実行中はその 1/4 の間隔で延長する。
+    止まったワーカーのジョブはリースが切れた時点で引き継ぐため、他のワーカーが処理中のジョブが残っている間は待機する。
+    結果はリースを持っている場合だけ記録され、引き継がれた後の報告は 'lost' として数えて破棄する。
+    """
+    stats = {'done': 0, 'skipped': 0, 'failed': 0, 'retried': 0, 'lost': 0}
+    worker_id = worker_id or default_worker_id()
+    workers = max(workers, 1)
+    heartbeat_interval = max(lease_seconds / 4, 0.1)
+
+    def next_job():
+        while True:
+            job = db.claim_download_job(worker_id, lease_seconds)
+            if job is None:
+                return None
+            if job['reclaimed_from']:
+                print(f"=== {job['url']} のリースが切れたため引き継ぎます（前のワーカー: {job['reclaimed_from']}） ===")
+            if job['attempts'] > max_attempts:
+                # 処理中のワーカーが止まることを繰り返したジョブ
+                db.fail_download_job(job['video_id'], job['lease_token'], 'リースの期限切れが上限回数に達しました', False)
+                stats['failed'] += 1
+                continue
+            entry = None
+            if archive is not None:
+                # 同じ保管庫を使う他のプロセスが追加した分を読み込んでから確認する
+                archive.refresh()
+                entry = archive.get(job['video_id'])
+            if entry is not None:
+                print(f"=== {job['url']} は保管済みのためスキップ: {entry['path']} ===")
+                db.complete_download_job(job['video_id'], job['lease_token'], entry['path'])
+                stats['skipped'] += 1
+                continue
+            if not db.has_complete_video_comments(job['url']):
+                return job
+            print(f"=== {job['url']} はアーカイブ済みのためスキップ ===")
+            db.complete_download_job(job['video_id'], job['lease_token'], None)
+            stats['skipped'] += 1
+
+    def finish(job, path, error):
+        if path:
+            if db.complete_download_job(job['video_id'], job['lease_token'], path):
+                stats['done'] += 1
+                print(f"=== {job['url']} の処理が完了: {path} ===")
+                return
+        else:
+            retry = job['attempts'] < max_attempts
+            if db.fail_download_job(job['video_id'], job['lease_token'], error or 'ダウンロードに失敗しました', retry):
+                stats['retried' if retry else 'failed'] += 1
+                print(f"=== {job['url']} の処理に失敗しました ({job['attempts']}/{max_attempts}回目): {error} ===")
+                return
+        stats['lost'] += 1
+        print(f"=== {job['url']} はリースが切れて他のワーカーに引き継がれたため、結果を記録しません ===")
+
+    def renew_leases():
+        for job in running.values():
+            if not job.get('lease_lost') and not db.renew_download_job_lease(
+                    job['video_id'], job['lease_token'], lease_seconds):
+                job['lease_lost'] = True
+                print(f"=== {job['url']} のリースを失いました ===")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        waiting = False
+        last_heartbeat = time.monotonic()
+        while True:
+            while len(running) < workers:
+                job = next_job()
+                if job is None:
+                    break
+                waiting = False
+                print(f"=== {job['url']} の処理を開始 ===")
+                running[executor.submit(_timed_download, download, job, archive)] = job
+            if not running:
+                if db.get_download_job_counts()['running'] == 0:
+                    break
+                # 他のワーカーの処理中のジョブは、完了するかリースが切れて引き継げるまで待つ
+                if not waiting:
+                    print("=== 他のワーカーが処理中のジョブの完了を待っています ===")
+                    waiting = True
+                time.sleep(heartbeat_interval)
+                continue
+            completed, _ = wait(running, timeout=heartbeat_interval, return_when=FIRST_COMPLETED)
+            for future in completed:
+                job = running.pop(future)
+                try:
+                    path, error = future.result(), None
+                except Exception as e:
+                    path, error = None, str(e)
+                finish(job, path, error)
+            if time.monotonic() - last_heartbeat >= heartbeat_interval:
+                renew_leases()
+                last_heartbeat = time.monotonic()
+    return stats
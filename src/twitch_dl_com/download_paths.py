@@ -0,0 +1,71 @@
+import errno
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from .compression import SUFFIXES, codec_from_path
+from .time_utils import format_local_datetime, parse_iso_datetime
+
+# ジョブごとの作業ディレクトリ（保存先と同じファイルシステムに作り、移動をリネームで済ませる）
+JOB_DIR_PREFIX = '.job-'
+
+
+def chat_output_path(output_dir: str, video_id: str, filename: Optional[str] = None) -> str:
+    """チャットの最終的な保存先（既定は '<output_dir>/<動画ID>.csv'）"""
+    return os.path.join(output_dir, filename or f"{video_id}.csv")
+
+
+def chat_filename(video_id: str, channel: Optional[str] = None, start_time: Optional[str] = None) -> str:
+    """動画情報から保存名を決める（'<配信者>-<YYYY-MM-DD>_<HH>_<MM>_<動画ID>.csv'、情報がなければ '<動画ID>.csv'）
+
+    bulk_import が配信者と開始時刻、または動画IDから取り込み先を推定できる形式にする。
+    """
+    if not channel or not start_time:
+        return f"{video_id}.csv"
+    started = format_local_datetime(parse_iso_datetime(start_time).timestamp())
+    return f"{channel}-{started.replace(' ', '_').replace(':', '_')}_{video_id}.csv"
+
+
+def write_metadata_sidecar(path: str, metadata: Dict) -> str:
+    """保存したファイルの隣に '<ファイル名>.json' を書き、取り込み時に動画・配信者・開始時刻を参照できるようにする"""
+    sidecar_path = path + '.json'
+    tmp_path = sidecar_path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, sidecar_path)
+    return sidecar_path
+
+
+@contextmanager
+def job_directory(output_dir: str, video_id: str) -> Iterator[str]:
+    """ジョブ専用の作業ディレクトリを作り、終了時に中身ごと削除する"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = tempfile.mkdtemp(prefix=f"{JOB_DIR_PREFIX}{video_id}-", dir=output_dir)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def finalize_output(src_path: str, final_path: str) -> str:
+    """作業ディレクトリで完成したファイルを保存先へアトミックに移し、そのパスを返す
+
+    圧縮済みのファイルは保存先にも圧縮形式の拡張子を付ける。既存のファイルは置き換える。
+    """
+    codec = codec_from_path(src_path)
+    if codec and codec_from_path(final_path) is None:
+        final_path += SUFFIXES[codec]
+    os.makedirs(os.path.dirname(final_path) or '.', exist_ok=True)
+    try:
+        os.replace(src_path, final_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 別のファイルシステムへは一時ファイルにコピーしてから置き換える
+        tmp_path = final_path + '.part'
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, final_path)
+        os.remove(src_path)
+    return final_path
@@ -0,0 +1,153 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import time
+from typing import Iterable, Optional
+
+# Chromeがダウンロード中に使う一時ファイルの拡張子
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp')
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+def is_download_complete(path: str) -> bool:
+    """一時ファイルではなく、中身があり、対応する .crdownload も残っていないか"""
+    if path.endswith(PARTIAL_SUFFIXES):
+        return False
+    if any(os.path.exists(path + suffix) for suffix in PARTIAL_SUFFIXES):
+        return False
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+class DownloadWatcher:
+    """ダウンロード先ディレクトリを監視し、書き込みが完了したファイルを検出する
+
+    Linuxでは inotify の IN_CLOSE_WRITE / IN_MOVED_TO（Chromeが .crdownload を
+    最終名へリネームした時点）で即座に検出する。inotifyが使えない環境では
+    短い間隔のポーリングにフォールバックする。
+    ダウンロードを開始する前に作成（with文で開始）しておくこと。
+    """
+
+    def __init__(self, directory: str, patterns: Iterable[str] = ('*.csv',), poll_interval: float = 0.2):
+        self.directory = directory
+        self.patterns = list(patterns)
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._known = set()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        self._known = set(self._matching_files())
+        libc = _load_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    @property
+    def uses_events(self) -> bool:
+        return self._fd is not None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _matches(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def _matching_files(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if self._matches(name)]
+
+    def _new_complete_file(self) -> Optional[str]:
+        for path in self._matching_files():
+            if path not in self._known and is_download_complete(path):
+                return path
+        return None
+
+    def wait(self, timeout: float) -> Optional[str]:
+        """監視開始後に完成したファイルのパスを返す（timeout秒で None）"""
+        deadline = time.monotonic() + timeout
+        # 監視開始からここまでの間に完成していた場合
+        path = self._new_complete_file()
+        if path:
+            return path
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if self._fd is None:
+                time.sleep(min(self.poll_interval, remaining))
+                path = self._new_complete_file()
+                if path:
+                    return path
+                continue
+
+            # イベントを取りこぼした場合に備え、1秒ごとにディレクトリも確認する
+            readable, _, _ = select.select([self._fd], [], [], min(remaining, 1.0))
+            if not readable:
+                path = self._new_complete_file()
+                if path:
+                    return path
+                continue
+            for name in self._read_event_names():
+                path = os.path.join(self.directory, name)
+                if path not in self._known and self._matches(name) and is_download_complete(path):
+                    return path
+
+    def _read_event_names(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
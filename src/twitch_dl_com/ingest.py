@@ -0,0 +1,89 @@
+import csv
+import io
+import os
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional
+from . import timing
+from .compression import codec_from_path, wrap_reader
+from .time_utils import parse_iso_datetime
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class OffsetClock:
+    """配信開始からの経過時間 'H:MM:SS' を絶対時刻(UTC ISO8601)へ変換する
+
+    チャットは同じ秒に多数のコメントが集中するため、
+    変換結果を経過時間の文字列ごとにキャッシュして datetime 演算を省く。
+    """
+
+    def __init__(self, start_time: str):
+        self.base = parse_iso_datetime(start_time).timestamp()
+        self._cache = {}
+
+    def __call__(self, offset: str) -> str:
+        comment_time = self._cache.get(offset)
+        if comment_time is None:
+            hours, minutes, seconds = offset.split(':')
+            elapsed = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+            comment_time = datetime.fromtimestamp(self.base + elapsed, timezone.utc).isoformat()
+            self._cache[offset] = comment_time
+        return comment_time
+
+
+def iter_comment_batches(f, video_id: str, streamer_id: str, start_time: str,
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """コメントCSV（time, user_name, user_color, message）を batch_size 行ずつ comments 形式に変換"""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {name: index for index, name in enumerate(header)}
+    time_col = columns['time']
+    name_col = columns['user_name']
+    color_col = columns['user_color']
+    message_col = columns['message']
+    to_comment_time = OffsetClock(start_time)
+
+    batch = []
+    for row in reader:
+        if not row:
+            continue
+        # ユーザーIDは "表示名(login)" の括弧内
+        user_id = row[name_col].rsplit('(', 1)[-1].rstrip(')')
+        batch.append((
+            video_id,
+            streamer_id,
+            user_id,
+            row[color_col],
+            to_comment_time(row[time_col]),
+            row[message_col]
+        ))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_comments_file(db, file_path: str, video_id: str, streamer_id: str, start_time: str,
+                         batch_size: int = DEFAULT_BATCH_SIZE,
+                         progress_callback: Optional[Callable[[int], None]] = None,
+                         is_cancelled: Optional[Callable[[], bool]] = None) -> int:
+    """コメントCSVを読みながらバッチ単位のトランザクションでDBへ保存し、保存件数を返す
+
+    .gz / .zst のファイルは展開しながら読む。進捗は元ファイルの読み込み位置から計算する。
+    """
+    total_bytes = os.path.getsize(file_path) or 1
+    saved = 0
+    with timing.stage('ingest', bytes=total_bytes) as record, open(file_path, 'rb') as raw:
+        f = io.TextIOWrapper(wrap_reader(raw, codec_from_path(file_path)), encoding='utf-8', newline='')
+        for batch in iter_comment_batches(f, video_id, streamer_id, start_time, batch_size):
+            if is_cancelled and is_cancelled():
+                break
+            db.save_comments(video_id, streamer_id, batch)
+            saved += len(batch)
+            if progress_callback:
+                progress_callback(min(int(raw.tell() / total_bytes * 100), 100))
+        record['rows'] = saved
+    return saved
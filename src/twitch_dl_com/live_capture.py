@@ -0,0 +1,533 @@
+import collections
+import queue
+import random
+import socket
+import sqlite3
+import ssl
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Set
+from .database.db_manager import DatabaseManager
+from .time_utils import parse_iso_datetime
+from .video_prefetch import MAX_IDS_PER_REQUEST, chunks
+
+IRC_HOST = 'irc.chat.twitch.tv'
+IRC_PORT = 6697
+# 認証なし（読み取り専用）で接続するときのニックネーム（後ろに数字を付ける）
+ANONYMOUS_NICK_PREFIX = 'justinfan'
+# 1つの接続で参加するチャンネル数の上限
+MAX_CHANNELS_PER_CONNECTION = 100
+# JOIN の回数制限（アカウント単位で10秒に20回）
+JOIN_RATE_LIMIT = (20, 10)
+CONNECT_TIMEOUT = 10
+# 受信待ちの間隔（この間隔でJOIN・PARTの指示を処理する）
+READ_TIMEOUT = 1
+# この秒数受信がなければPINGを送り、その倍の秒数受信がなければ切断とみなす
+KEEPALIVE_SECONDS = 300
+MAX_RECONNECT_WAIT = 60
+
+DEFAULT_POLL_INTERVAL = 60
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 10000
+# 配信開始からこの秒数以内に取得を始めていれば、チャット全体を取得できたとみなす
+DEFAULT_START_GRACE = 120
+WRITE_RETRIES = 10
+
+_TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+
+def _unescape_tag(value: str) -> str:
+    if '\\' not in value:
+        return value
+    chars = []
+    i = 0
+    while i < len(value):
+        if value[i] == '\\':
+            if i + 1 < len(value):
+                chars.append(_TAG_ESCAPES.get(value[i + 1], value[i + 1]))
+            i += 2
+        else:
+            chars.append(value[i])
+            i += 1
+    return ''.join(chars)
+
+
+def parse_irc_line(line: str) -> Dict:
+    """IRCの1行を {'tags', 'prefix', 'command', 'params'} に分解する（' :' 以降は params の最後の要素）"""
+    tags = {}
+    if line.startswith('@'):
+        raw_tags, line = line[1:].split(' ', 1)
+        for item in raw_tags.split(';'):
+            key, _, value = item.partition('=')
+            tags[key] = _unescape_tag(value)
+    prefix = ''
+    if line.startswith(':'):
+        prefix, line = line[1:].split(' ', 1)
+    if ' :' in line:
+        line, trailing = line.split(' :', 1)
+        params = line.split() + [trailing]
+    else:
+        params = line.split()
+    return {'tags': tags, 'prefix': prefix, 'command': params[0] if params else '', 'params': params[1:]}
+
+
+def privmsg_to_comment(message: Dict) -> tuple:
+    """PRIVMSG を comments の (user_id, user_color, comment_time, message) に変換する
+
+    user_id はダウンロードしたCSVと同じくログイン名。時刻はサーバーが受け付けた時刻 tmi-sent-ts をミリ秒まで使う。
+    """
+    tags = message['tags']
+    login = message['prefix'].split('!', 1)[0]
+    sent_ms = int(tags.get('tmi-sent-ts') or time.time() * 1000)
+    comment_time = datetime.fromtimestamp(sent_ms / 1000, timezone.utc).isoformat(timespec='milliseconds')
+    text = message['params'][-1]
+    # /me のメッセージは CTCP ACTION で届く
+    if text.startswith('\x01ACTION ') and text.endswith('\x01'):
+        text = text[8:-1]
+    return (login, tags.get('color', ''), comment_time, text)
+
+
+class RateLimiter:
+    """period 秒あたり rate 回までに抑える（複数の接続で共有する）"""
+
+    def __init__(self, rate: int, period: float):
+        self.rate = rate
+        self.period = period
+        self._sent = collections.deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.period:
+                self._sent.popleft()
+            if len(self._sent) >= self.rate:
+                return False
+            self._sent.append(now)
+            return True
+
+
+class IrcConnection(threading.Thread):
+    """Twitch IRCへの1本の接続（最大 MAX_CHANNELS_PER_CONNECTION チャンネル）
+
+    切断されたら待ち時間を延ばしながら再接続し、参加中のチャンネルに入り直す。
+    受信したPRIVMSGは on_message(チャンネル名, 解析結果)、切断で取りこぼしが出たチャンネルは on_disconnect(チャンネル名の集合) で通知する。
+    """
+
+    def __init__(self, host: str, port: int, use_tls: bool, join_limiter: RateLimiter,
+                 on_message: Callable[[str, Dict], None], on_disconnect: Callable[[Set[str]], None],
+                 nick: Optional[str] = None, token: Optional[str] = None):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.join_limiter = join_limiter
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+        self.nick = nick or f'{ANONYMOUS_NICK_PREFIX}{random.randint(10000, 99999)}'
+        self.token = token
+        # 参加したいチャンネル（変更は _channels_lock の中で行う）
+        self.channels = set()
+        self._channels_lock = threading.Lock()
+        self._commands = queue.Queue()
+        self._stopping = threading.Event()
+        self._send_lock = threading.Lock()
+        self._sock = None
+        self._welcomed = False
+
+    def join_channel(self, channel: str):
+        with self._channels_lock:
+            self.channels.add(channel)
+        self._commands.put(('join', channel))
+
+    def part_channel(self, channel: str):
+        with self._channels_lock:
+            self.channels.discard(channel)
+        self._commands.put(('part', channel))
+
+    def _wanted_channels(self) -> Set[str]:
+        with self._channels_lock:
+            return set(self.channels)
+
+    def stop(self):
+        self._stopping.set()
+
+    def _send(self, line: str):
+        with self._send_lock:
+            self._sock.sendall(line.encode('utf-8') + b'\r\n')
+
+    def run(self):
+        wait = 1
+        while not self._stopping.is_set():
+            joined = set()
+            try:
+                self._session(joined)
+            except (OSError, ConnectionError, ValueError) as e:
+                if not self._stopping.is_set():
+                    print(f"IRCの接続が切れました（{self.host}:{self.port}、{len(joined)}チャンネル）: {e}")
+            finally:
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            lost = joined & self._wanted_channels()
+            if lost and not self._stopping.is_set():
+                self.on_disconnect(lost)
+            # ログインまで進んだ接続の後は、すぐに再接続する
+            wait = 1 if self._welcomed else min(wait * 2, MAX_RECONNECT_WAIT)
+            if self._stopping.wait(wait):
+                break
+
+    def _session(self, joined: Set[str]):
+        """1回分の接続で受信を続ける。停止したら戻り、切断は例外で知らせる"""
+        self._welcomed = False
+        sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        if self.use_tls:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        sock.settimeout(READ_TIMEOUT)
+        self._sock = sock
+        self._send('CAP REQ :twitch.tv/tags twitch.tv/commands')
+        if self.token:
+            self._send(f'PASS oauth:{self.token}')
+        self._send(f'NICK {self.nick}')
+
+        # 接続前から参加したいチャンネルも、指示のキューに積まれたものと合わせてJOINする
+        to_join = collections.deque(sorted(self._wanted_channels()))
+        buffer = b''
+        last_received = time.monotonic()
+        while not self._stopping.is_set():
+            while True:
+                try:
+                    action, channel = self._commands.get_nowait()
+                except queue.Empty:
+                    break
+                if action == 'join':
+                    to_join.append(channel)
+                elif channel in joined:
+                    self._send(f'PART #{channel}')
+                    joined.discard(channel)
+            while self._welcomed and to_join:
+                channel = to_join[0]
+                if channel in joined or channel not in self.channels:
+                    to_join.popleft()
+                    continue
+                if not self.join_limiter.try_acquire():
+                    break
+                to_join.popleft()
+                self._send(f'JOIN #{channel}')
+                joined.add(channel)
+
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                idle = time.monotonic() - last_received
+                if idle > KEEPALIVE_SECONDS * 2:
+                    raise ConnectionError('サーバーからの応答がありません')
+                if idle > KEEPALIVE_SECONDS:
+                    self._send('PING :tmi.twitch.tv')
+                continue
+            if not data:
+                raise ConnectionError('サーバーが接続を閉じました')
+            last_received = time.monotonic()
+            *lines, buffer = (buffer + data).split(b'\r\n')
+            for raw in lines:
+                if not raw:
+                    continue
+                try:
+                    message = parse_irc_line(raw.decode('utf-8', errors='replace'))
+                except ValueError:
+                    print(f"解析できない行を無視しました: {raw[:200]!r}")
+                    continue
+                command = message['command']
+                if command == 'PRIVMSG':
+                    self.on_message(message['params'][0].lstrip('#'), message)
+                elif command == 'PING':
+                    self._send(f"PONG :{message['params'][-1] if message['params'] else 'tmi.twitch.tv'}")
+                elif command == '001':
+                    self._welcomed = True
+                elif command == 'RECONNECT':
+                    raise ConnectionError('サーバーから再接続を求められました')
+                elif command == 'NOTICE' and 'authentication failed' in message['params'][-1]:
+                    raise ConnectionError(message['params'][-1])
+
+
+class LiveCommentWriter(threading.Thread):
+    """受信したコメントをまとめてDBへ書き込むスレッド（チャット取得のDBへの書き込みはすべてここで行う）
+
+    キューの長さを max_pending 件で制限し、書き込みが追いつかないときは受信側を待たせてメモリ使用量を抑える。
+    batch_size 件たまるか、最初のコメントから flush_interval 秒たつと、1つのトランザクションで保存する。
+    配信の開始・VODの確定・終了もキューに入れて順番に処理するため、それより前に受信したコメントが先に保存される。
+    """
+
+    def __init__(self, db_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_pending)
+        self.saved = 0
+        self.dropped = 0
+        # 配信ID → コメントの video_id（VODが確定するまでは 'live:<配信ID>'）
+        self._video_ids = {}
+        self._rows = []
+        self._counts = {}
+
+    def add_comment(self, stream_id: str, streamer_id: str, comment: tuple):
+        self.queue.put(('comment', stream_id, streamer_id, comment))
+
+    def _call(self, handler, *args) -> Future:
+        future = Future()
+        self.queue.put(('call', handler, args, future))
+        return future
+
+    def start_capture(self, stream_id: str, streamer_id: str, channel: str, stream_started_at: int) -> Future:
+        return self._call(self._start_capture, stream_id, streamer_id, channel, stream_started_at)
+
+    def resolve_capture(self, stream_id: str, streamer_id: str, video: Dict) -> Future:
+        return self._call(self._resolve_capture, stream_id, streamer_id, video)
+
+    def finish_capture(self, stream_id: str, gaps: int, start_grace_seconds: int) -> Future:
+        return self._call(self._finish_capture, stream_id, gaps, start_grace_seconds)
+
+    def stop(self):
+        self.queue.put(('stop',))
+
+    def _start_capture(self, db, stream_id, streamer_id, channel, stream_started_at):
+        capture = db.start_live_capture(stream_id, streamer_id, channel, stream_started_at)
+        if capture['video_id']:
+            self._video_ids[stream_id] = capture['video_id']
+        return capture
+
+    def _resolve_capture(self, db, stream_id, streamer_id, video):
+        db.upsert_videos(streamer_id, [video], mark_missing_unavailable=False)
+        db.resolve_live_capture(stream_id, video['url'])
+        self._video_ids[stream_id] = video['url']
+
+    def _finish_capture(self, db, stream_id, gaps, start_grace_seconds):
+        self._video_ids.pop(stream_id, None)
+        return db.finish_live_capture(stream_id, gaps, start_grace_seconds)
+
+    def _flush(self, db):
+        if not self._rows:
+            return
+        for attempt in range(WRITE_RETRIES):
+            try:
+                db.save_live_comments(self._rows, self._counts)
+                self.saved += len(self._rows)
+                break
+            except sqlite3.OperationalError as e:
+                # 他のプロセスがDBをロックしている間は待って再試行する
+                print(f"コメントの保存に失敗しました（{attempt + 1}回目）: {e}")
+                time.sleep(1)
+        else:
+            print(f"{len(self._rows)}件のコメントを保存できませんでした")
+            self.dropped += len(self._rows)
+        self._rows = []
+        self._counts = {}
+
+    def run(self):
+        db = DatabaseManager(self.db_path)
+        deadline = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if self._rows else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(db)
+                continue
+            kind = item[0]
+            if kind == 'comment':
+                _, stream_id, streamer_id, comment = item
+                if not self._rows:
+                    deadline = time.monotonic() + self.flush_interval
+                self._rows.append((self._video_ids.get(stream_id, f'live:{stream_id}'), streamer_id) + comment)
+                self._counts[stream_id] = self._counts.get(stream_id, 0) + 1
+                if len(self._rows) >= self.batch_size:
+                    self._flush(db)
+            elif kind == 'call':
+                _, handler, args, future = item
+                self._flush(db)
+                try:
+                    future.set_result(handler(db, *args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                self._flush(db)
+                break
+
+
+class LiveCaptureService:
+    """登録済みの配信者の配信中チャットをIRCで取得し、comments テーブルへ保存する
+
+    poll_interval 秒ごとに /streams（100人ずつ）で配信状態を調べ、配信が始まったチャンネルに参加し、終わったら退出する。
+    チャンネルは channels_per_connection 個ずつ1本の接続にまとめ、JOIN の回数制限は全接続で共有する。
+    コメントは VOD が確定するまで 'live:<配信ID>' の video_id で保存し、確定したら VOD の URL に付け替える。
+    配信が終わった時点でチャット全体がDBにあるため、配信後のダウンロードは不要になる
+    （取得の開始が遅れた・途中で切断された配信は live_captures.complete = 0 として記録する）。
+    """
+
+    def __init__(self, db_path: str = 'twitch_users.db', api=None, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 irc_host: str = IRC_HOST, irc_port: int = IRC_PORT, use_tls: bool = True,
+                 channels_per_connection: int = MAX_CHANNELS_PER_CONNECTION, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING,
+                 start_grace: int = DEFAULT_START_GRACE):
+        self.db_path = db_path
+        self.db = None
+        self.api = api
+        self.poll_interval = poll_interval
+        self.irc_host = irc_host
+        self.irc_port = irc_port
+        self.use_tls = use_tls
+        self.channels_per_connection = channels_per_connection
+        self.start_grace = start_grace
+        self.writer = LiveCommentWriter(db_path, batch_size, flush_interval, max_pending)
+        self.join_limiter = RateLimiter(*JOIN_RATE_LIMIT)
+        self.connections = []
+        # チャンネル名（ログイン名） → 取得中の配信
+        self.sessions = {}
+        # 配信ID → 前回の実行で閉じなかった取得の記録（最初に配信状態を取得できた回に照合する）
+        self.stale_captures = {}
+        self._gaps_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def run(self):
+        """stop() が呼ばれるまで配信状態の確認を繰り返す"""
+        # SQLiteの接続は作成したスレッドでしか使えないため、ここで開く
+        self.db = DatabaseManager(self.db_path)
+        self.stale_captures = {capture['stream_id']: capture for capture in self.db.get_open_live_captures()}
+        if self.api is None:
+            from .tw_api import TwitchAPI
+            self.api = TwitchAPI()
+        self.writer.start()
+        try:
+            while not self._stopping.is_set():
+                self.poll()
+                self._stopping.wait(self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._stopping.set()
+
+    def poll(self):
+        """配信状態を調べ、チャットへの参加・退出とVODの確定を行う"""
+        users = {user['id']: user for user in self.db.get_all_users()}
+        user_ids = sorted(users.keys() | {session['streamer_id'] for session in self.sessions.values()}
+                          | {capture['streamer_id'] for capture in self.stale_captures.values()})
+        try:
+            live = {}
+            for chunk in chunks(user_ids, MAX_IDS_PER_REQUEST):
+                live.update((stream['user_id'], stream) for stream in self.api.get_streams(chunk))
+        except Exception as e:
+            # 取得できなかった回は配信が終わったとみなさない
+            print(f"配信状態の取得に失敗しました: {e}")
+            return
+
+        for login, session in list(self.sessions.items()):
+            stream = live.get(session['streamer_id'])
+            if stream is None or stream['id'] != session['stream_id']:
+                self._end(session)
+        for capture in list(self.stale_captures.values()):
+            stream = live.get(capture['streamer_id'])
+            if stream is None or stream['id'] != capture['stream_id']:
+                self._close_stale(capture)
+        # まだ配信中のものは下の _begin で続きから取得する（start_live_capture が gaps に数える）
+        self.stale_captures = {}
+        for user_id, stream in live.items():
+            login = (users.get(user_id) or {}).get('login') or stream['user_login']
+            if login not in self.sessions:
+                self._begin(login, stream)
+        for session in self.sessions.values():
+            if session['video_id'] is None:
+                self._resolve(session)
+
+    def _connection_for_new_channel(self) -> IrcConnection:
+        for connection in self.connections:
+            if len(connection.channels) < self.channels_per_connection:
+                return connection
+        connection = IrcConnection(self.irc_host, self.irc_port, self.use_tls, self.join_limiter,
+                                   self._on_message, self._on_disconnect)
+        connection.start()
+        self.connections.append(connection)
+        return connection
+
+    def _begin(self, login: str, stream: Dict):
+        started_at = int(parse_iso_datetime(stream['started_at']).timestamp())
+        capture = self.writer.start_capture(stream['id'], stream['user_id'], login, started_at).result()
+        session = {
+            'stream_id': stream['id'],
+            'streamer_id': stream['user_id'],
+            'login': login,
+            'video_id': capture['video_id'],
+            'gaps': 0,
+            'connection': self._connection_for_new_channel()
+        }
+        self.sessions[login] = session
+        session['connection'].join_channel(login)
+        print(f"配信中のチャットの取得を開始しました: {login}（配信ID {stream['id']}）")
+
+    def _resolve(self, session: Dict):
+        """配信のアーカイブ（stream_id が一致するVOD）を探し、見つかればコメントを付け替える"""
+        try:
+            videos = self.api.get_videos(session['streamer_id'], first=1)
+        except Exception as e:
+            print(f"アーカイブの取得に失敗しました（{session['login']}）: {e}")
+            return
+        video = next((video for video in videos if video.get('stream_id') == session['stream_id']), None)
+        if video is not None:
+            self.writer.resolve_capture(session['stream_id'], session['streamer_id'], video).result()
+            session['video_id'] = video['url']
+
+    def _end(self, session: Dict):
+        del self.sessions[session['login']]
+        session['connection'].part_channel(session['login'])
+        if session['video_id'] is None:
+            self._resolve(session)
+        capture = self.writer.finish_capture(session['stream_id'], session['gaps'], self.start_grace).result()
+        if capture['complete']:
+            state = "全体を取得"
+        else:
+            state = f"一部のみ（開始の遅れ・切断 {capture['gaps']}回）"
+        print(f"配信が終了しました: {session['login']} {capture['comment_count']:,}件、{state}")
+        if capture['video_id'] is None:
+            print(f"  アーカイブが見つからないため live:{session['stream_id']} として保存しています")
+
+    def _close_stale(self, capture: Dict):
+        """停止中に配信が終わった記録を閉じる（停止から配信終了までの区間は取得できていないため gaps に数える）"""
+        session = {
+            'stream_id': capture['stream_id'],
+            'streamer_id': capture['streamer_id'],
+            'login': capture['channel'],
+            'video_id': capture['video_id']
+        }
+        if session['video_id'] is None:
+            self._resolve(session)
+        capture = self.writer.finish_capture(capture['stream_id'], 1, self.start_grace).result()
+        print(f"停止中に配信が終了していました: {capture['channel']} {capture['comment_count']:,}件、"
+              f"一部のみ（開始の遅れ・切断 {capture['gaps']}回）")
+
+    def _on_message(self, channel: str, message: Dict):
+        session = self.sessions.get(channel)
+        if session is not None:
+            self.writer.add_comment(session['stream_id'], session['streamer_id'], privmsg_to_comment(message))
+
+    def _on_disconnect(self, channels: Iterable[str]):
+        with self._gaps_lock:
+            for channel in channels:
+                session = self.sessions.get(channel)
+                if session is not None:
+                    session['gaps'] += 1
+
+    def _shutdown(self):
+        # 取得中の配信は記録を閉じずに残し、次回の起動時に続きから取得する（gaps に数える）
+        for connection in self.connections:
+            connection.stop()
+        for connection in self.connections:
+            connection.join()
+        self.writer.stop()
+        self.writer.join()
+        print(f"保存したコメント: {self.writer.saved:,}件"
+              + (f"（保存できなかったもの {self.writer.dropped:,}件）" if self.writer.dropped else ""))
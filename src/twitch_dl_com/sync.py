@@ -0,0 +1,143 @@
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from . import timing
+from .compression import SUFFIXES
+
+# 既定の同期先（WSLから見たWindowsのダウンロードフォルダ）
+DEFAULT_SYNC_DESTINATIONS = ['/mnt/c/Users/futur/Downloads/TwitchComment']
+# 同期対象とするチャットファイルの拡張子（非圧縮と圧縮済み）
+CHAT_FILE_PATTERNS = ['*.csv'] + [f'*.csv{suffix}' for suffix in SUFFIXES.values()]
+# 同期先ごとに、同期済みファイルのサイズ・更新時刻・ハッシュを記録するファイル
+MANIFEST_NAME = '.sync_manifest.json'
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+class SyncError(Exception):
+    """コピー後のチェックサムが一致しなかった"""
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(destination: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(destination, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(destination: str, manifest: Dict[str, Dict]):
+    path = os.path.join(destination, MANIFEST_NAME)
+    tmp_path = path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def copy_verified(src_path: str, dst_path: str, verify: bool = True) -> str:
+    """ハッシュを計算しながらコピーし、書き込んだファイルを読み直して照合する
+
+    一時ファイルに書いてから置き換えるので、途中で失敗しても同期先に壊れたファイルは残らない。
+    戻り値はSHA-256のハッシュ。
+    """
+    digest = hashlib.sha256()
+    tmp_path = dst_path + '.part'
+    try:
+        with open(src_path, 'rb') as src, open(tmp_path, 'wb', buffering=COPY_BUFFER_SIZE) as dst:
+            for chunk in iter(lambda: src.read(COPY_BUFFER_SIZE), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+        checksum = digest.hexdigest()
+        if verify and _file_sha256(tmp_path) != checksum:
+            raise SyncError(f"チェックサムが一致しません: {dst_path}")
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return checksum
+
+
+def _needs_copy(src_stat, entry: Optional[Dict], dst_path: str) -> bool:
+    """マニフェストの記録と元ファイル・同期先ファイルを比較し、転送が必要か判定"""
+    if entry is None or entry['size'] != src_stat.st_size or entry['mtime_ns'] != src_stat.st_mtime_ns:
+        return True
+    try:
+        return os.path.getsize(dst_path) != src_stat.st_size
+    except OSError:
+        return True
+
+
+def sync_files(paths: Iterable[str], destinations: Optional[List[str]] = None,
+               workers: int = 4, verify: bool = True) -> Dict:
+    """ファイルを各同期先へ、新規または変更されたものだけコピーする
+
+    変更の判定は元ファイルのサイズと更新時刻をマニフェストと比べて行い、内容の読み込みはコピーするファイルだけ。
+    """
+    started = time.perf_counter()
+    destinations = DEFAULT_SYNC_DESTINATIONS if destinations is None else destinations
+    stats = {'files': 0, 'copied': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+    sources = [(path, os.stat(path)) for path in dict.fromkeys(paths) if os.path.isfile(path)]
+
+    for destination in destinations:
+        try:
+            os.makedirs(destination, exist_ok=True)
+        except OSError as e:
+            print(f"同期先を作成できません: {destination}: {e}")
+            stats['failed'] += len(sources)
+            continue
+        manifest = load_manifest(destination)
+
+        pending = []
+        for path, src_stat in sources:
+            stats['files'] += 1
+            name = os.path.basename(path)
+            if _needs_copy(src_stat, manifest.get(name), os.path.join(destination, name)):
+                pending.append((path, src_stat, name))
+            else:
+                stats['skipped'] += 1
+
+        def copy(job):
+            path, src_stat, name = job
+            with timing.stage('sync_copy', bytes=src_stat.st_size, destination=destination):
+                return copy_verified(path, os.path.join(destination, name), verify)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending) or 1))) as executor:
+            futures = [(job, executor.submit(copy, job)) for job in pending]
+            for (path, src_stat, name), future in futures:
+                try:
+                    checksum = future.result()
+                except (OSError, SyncError) as e:
+                    print(f"同期に失敗しました: {path} → {destination}: {e}")
+                    stats['failed'] += 1
+                    continue
+                manifest[name] = {'size': src_stat.st_size, 'mtime_ns': src_stat.st_mtime_ns, 'sha256': checksum}
+                stats['copied'] += 1
+                stats['bytes'] += src_stat.st_size
+                print(f"ファイルをコピーしました: {os.path.join(destination, name)}")
+
+        if pending:
+            save_manifest(destination, manifest)
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def sync_directory(src_dir: str, destinations: Optional[List[str]] = None,
+                   workers: int = 4, verify: bool = True) -> Dict:
+    """フォルダ内のチャットファイルを同期する"""
+    paths = sorted(
+        path for pattern in CHAT_FILE_PATTERNS for path in glob.glob(os.path.join(src_dir, pattern))
+    )
+    return sync_files(paths, destinations, workers, verify)
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+import re
+
+_DURATION_PATTERN = re.compile(r'(\d+)([hms])')
+
+
+def parse_duration_seconds(duration: str) -> int:
+    """'3h42m47s' 形式の文字列を秒数に変換"""
+    units = {'h': 3600, 'm': 60, 's': 1}
+    return sum(int(value) * units[unit] for value, unit in _DURATION_PATTERN.findall(duration or ''))
+
+
+def parse_iso_datetime(dt_str: str) -> datetime:
+    """Twitch APIのISO8601文字列（末尾Z）をタイムゾーン付きdatetimeに変換"""
+    dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def format_hms(seconds: int) -> str:
+    """秒数を '03:42:47' 形式に変換"""
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def format_local_datetime(timestamp: float) -> str:
+    """UNIX時刻をローカルタイムの '%Y-%m-%d %H:%M' 形式に変換"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).astimezone().strftime('%Y-%m-%d %H:%M')
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# 処理段階ごとの計測イベントをJSON Lines形式で記録する
+#   {"job_id": ..., "video_id": ..., "stage": "export", "start": 1718000000.123,
+#    "duration": 2.345, "bytes": 123456, "rows": null, "ok": true}
+
+# GUIで計測するときの出力先を指定する環境変数
+TIMING_LOG_ENV = 'TWITCH_DL_TIMING_LOG'
+
+_log = None
+_local = threading.local()
+
+
+class TimingLog:
+    """計測イベントをファイルへ追記する（複数スレッドから書き込める）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def configure(path: Optional[str]) -> Optional[TimingLog]:
+    """計測イベントの出力先を設定する（None で計測を止める）"""
+    global _log
+    if _log is not None:
+        _log.close()
+    _log = TimingLog(path) if path else None
+    return _log
+
+
+def configure_from_env() -> Optional[TimingLog]:
+    """環境変数 TWITCH_DL_TIMING_LOG が設定されていれば、そのファイルへ計測イベントを出力する"""
+    path = os.environ.get(TIMING_LOG_ENV)
+    return configure(path) if path else None
+
+
+def enabled() -> bool:
+    return _log is not None
+
+
+def log_path() -> Optional[str]:
+    """現在の出力先（計測が無効なら None）。子プロセスで同じファイルへ出力するときに使う"""
+    return _log.path if _log is not None else None
+
+
+@contextmanager
+def job_context(job_id: str, video_id: Optional[str] = None) -> Iterator[None]:
+    """このスレッドで記録するイベントにジョブIDと動画IDを付ける"""
+    previous = getattr(_local, 'job', None)
+    _local.job = (job_id, video_id)
+    try:
+        yield
+    finally:
+        _local.job = previous
+
+
+@contextmanager
+def stage(name: str, **fields) -> Iterator[Dict]:
+    """with ブロックの所要時間を1件のイベントとして記録する
+
+    ブロック内で返り値の辞書に 'bytes' や 'rows' を設定すると一緒に記録される。
+    計測が無効な場合も同じように使えて、何も書き出さない。
+    """
+    record = dict(fields)
+    if _log is None:
+        yield record
+        return
+    job_id, video_id = getattr(_local, 'job', None) or (None, None)
+    start = time.time()
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield record
+        ok = True
+    finally:
+        event = {
+            'job_id': job_id,
+            'video_id': record.pop('video_id', video_id),
+            'stage': name,
+            'start': round(start, 6),
+            'duration': round(time.perf_counter() - started, 6),
+            'bytes': record.pop('bytes', None),
+            'rows': record.pop('rows', None),
+            'ok': ok
+        }
+        event.update(record)
+        _log.write(event)
+
+
+def read_events(paths: Iterable[str]) -> Iterator[Dict]:
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """線形補間のパーセンタイル（q は 0〜100）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(events: Iterable[Dict]) -> List[Dict]:
+    """段階ごとの件数・p50/p95・合計時間などを、合計時間の長い順に返す"""
+    stages = {}
+    for event in events:
+        summary = stages.setdefault(event['stage'], {'durations': [], 'bytes': 0, 'rows': 0, 'failed': 0})
+        summary['durations'].append(event['duration'])
+        summary['bytes'] += event.get('bytes') or 0
+        summary['rows'] += event.get('rows') or 0
+        if not event.get('ok', True):
+            summary['failed'] += 1
+
+    result = []
+    for name, summary in stages.items():
+        durations = sorted(summary['durations'])
+        result.append({
+            'stage': name,
+            'count': len(durations),
+            'failed': summary['failed'],
+            'p50': percentile(durations, 50),
+            'p95': percentile(durations, 95),
+            'max': durations[-1],
+            'total': sum(durations),
+            'bytes': summary['bytes'],
+            'rows': summary['rows']
+        })
+    result.sort(key=lambda row: row['total'], reverse=True)
+    return result
+
+
+def format_summary(rows: List[Dict]) -> str:
+    """summarize の結果を表形式の文字列にする"""
+    lines = [f"{'stage':<16}{'count':>7}{'failed':>7}{'p50(s)':>10}{'p95(s)':>10}{'max(s)':>10}"
+             f"{'total(s)':>11}{'bytes':>15}{'rows':>12}"]
+    for row in rows:
+        lines.append(
+            f"{row['stage']:<16}{row['count']:>7}{row['failed']:>7}{row['p50']:>10.3f}{row['p95']:>10.3f}"
+            f"{row['max']:>10.3f}{row['total']:>11.2f}{row['bytes']:>15,}{row['rows']:>12,}"
+        )
+    return '\n'.join(lines)
@@ -95,8 +95,9 @@ class TwitchAPI:
         return []  # エラー時は空リストを返す
 
     def get_streams(self, user_ids: List[str]) -> List[Dict]:
-        """配信状態を取得"""
-        params = {'user_id': user_ids}
+        """配信状態を取得（1回100人まで。配信中の人だけが結果に含まれる）"""
+        # first を省略すると20件までしか返らない
+        params = {'user_id': user_ids, 'first': 100}
         response = requests.get(
             f"{self.base_url}/streams",
             headers=self._get_headers(),
@@ -143,6 +144,22 @@ class TwitchAPI:
             return videos
         raise Exception(f"Failed to get videos: {response.status_code}")
 
+    def get_videos_by_ids(self, video_ids: List[str]) -> List[Dict]:
+        """動画IDを指定して動画情報を取得（1回100件まで。削除・期限切れの動画は結果に含まれない）"""
+        if not video_ids:
+            return []
+        response = requests.get(
+            f"{self.base_url}/videos",
+            headers=self._get_headers(),
+            params={'id': video_ids}
+        )
+        if response.status_code == 200:
+            return response.json()['data']
+        if response.status_code == 404:
+            # 指定したIDがすべて存在しない場合
+            return []
+        raise Exception(f"Failed to get videos: {response.status_code}")
+
     def search_channels(self, query: str) -> list:
         url = 'https://api.twitch.tv/helix/search/channels'
         params = {'query': query, 'first': 10}
@@ -0,0 +1,143 @@
+from PyQt6 import sip
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QApplication
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+from typing import Callable, Optional
+import requests
+
+# アイコン画像のキャッシュ（URLごとに取得した画像をそのまま保存する）
+DEFAULT_AVATAR_DIR = os.path.join(os.path.expanduser('~'), '.twitch_dl_com', 'avatars')
+AVATAR_SIZE = 50
+
+
+class AvatarLoader(QObject):
+    """アプリ全体で共有するアイコン画像の読み込み
+
+    取得・デコード・縮小は少数のワーカースレッドで行い、GUIスレッドでは縮小済みの画像を QPixmap にするだけにする。
+    取得した画像はURLごとにディスクへ保存し（Twitchのアイコンは内容が変わるとURLも変わる）、
+    縮小済みの QPixmap は memory_items 件までメモリに残す。同じURLの読み込みが重なった場合は1回だけ取得する。
+    """
+    # ワーカーからGUIスレッドへの受け渡し用（URL, 縮小済みの画像。失敗時は空の画像）
+    _image_ready = pyqtSignal(str, QImage)
+    # 読み込みに失敗したURL（コールバックは呼ばれない）
+    failed = pyqtSignal(str)
+
+    _instance = None
+
+    @classmethod
+    def instance(cls, **kwargs) -> 'AvatarLoader':
+        """共有のインスタンスを返す（初回のみ kwargs で作成し、アプリ終了時に停止する）"""
+        if cls._instance is None:
+            cls._instance = cls(**kwargs)
+            app = QApplication.instance()
+            if app is not None:
+                app.aboutToQuit.connect(cls._instance.shutdown)
+        return cls._instance
+
+    def __init__(self, cache_dir: str = DEFAULT_AVATAR_DIR, size: int = AVATAR_SIZE, max_workers: int = 4,
+                 memory_items: int = 1000, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.size = size
+        self.memory_items = memory_items
+        self._pixmaps = OrderedDict()
+        # URL → 読み込み完了を待っているコールバック
+        self._waiting = {}
+        # 未完了の取得（終了時に未着手のものを取り消す）
+        self._futures = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='avatar')
+        self._image_ready.connect(self._on_image_ready)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, url: str, callback: Callable[[QPixmap], None]) -> Optional[QPixmap]:
+        """アイコンを読み込み、GUIスレッドで callback(縮小済みの QPixmap) を呼ぶ
+
+        メモリにあればその場で callback を呼び、その QPixmap を返す。
+        callback がウィジェットのメソッドで、完了前にウィジェットが削除された場合は呼ばない。
+        """
+        if not url:
+            return None
+        pixmap = self._pixmaps.get(url)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(url)
+            callback(pixmap)
+            return pixmap
+        if url in self._waiting:
+            self._waiting[url].append(callback)
+        else:
+            self._waiting[url] = [callback]
+            future = self._executor.submit(self._fetch, url)
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+        return None
+
+    def cached(self, url: str) -> Optional[QPixmap]:
+        """メモリにある縮小済みの QPixmap を返す（無ければ None。読み込みは始めない）"""
+        pixmap = self._pixmaps.get(url)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(url)
+        return pixmap
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _fetch(self, url: str):
+        """（ワーカースレッド）ディスクのキャッシュまたはURLから画像を読み、縮小して渡す
+
+        キャッシュのファイルが壊れていれば（書き込み途中の中断など）削除してURLから取得し直す。
+        URLから取得した画像は、デコードできた場合だけキャッシュに保存する。
+        """
+        image = QImage()
+        try:
+            path = self._cache_path(url)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if not image.loadFromData(data):
+                    print(f"Error decoding cached image, fetching again: {url}")
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            if image.isNull():
+                response = requests.get(url, timeout=10)
+                response.raise_for_status()
+                data = response.content
+                if image.loadFromData(data):
+                    tmp_path = f'{path}.{os.getpid()}.part'
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                else:
+                    print(f"Error decoding image: {url}")
+            if not image.isNull():
+                image = image.scaled(self.size, self.size, Qt.AspectRatioMode.KeepAspectRatio,
+                                     Qt.TransformationMode.SmoothTransformation)
+        except Exception as e:
+            print(f"Error loading image: {e}")
+        self._image_ready.emit(url, image)
+
+    def _on_image_ready(self, url: str, image: QImage):
+        callbacks = self._waiting.pop(url, [])
+        if image.isNull():
+            self.failed.emit(url)
+            return
+        pixmap = QPixmap.fromImage(image)
+        self._pixmaps[url] = pixmap
+        while len(self._pixmaps) > self.memory_items:
+            self._pixmaps.popitem(last=False)
+        for callback in callbacks:
+            owner = getattr(callback, '__self__', None)
+            if isinstance(owner, sip.simplewrapper) and sip.isdeleted(owner):
+                continue
+            callback(pixmap)
+
+    def shutdown(self):
+        # shutdown(cancel_futures=True) は Python 3.9 以降のため、未着手の取得を個別に取り消す
+        for future in list(self._futures):
+            future.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,452 @@
+from PyQt6.QtWidgets import QApplication, QListView, QStyle, QStyledItemDelegate, QStyleOptionButton
+from PyQt6.QtCore import (QAbstractListModel, QEvent, QMimeData, QModelIndex, QPoint, QRect, QSize,
+                          QSortFilterProxyModel, Qt, pyqtSignal)
+from PyQt6.QtGui import QBrush, QColor, QDrag, QFont, QFontMetrics, QLinearGradient, QPainter, QPalette, QPen
+import time
+from typing import Dict, List, Optional, Set
+from .avatar_loader import AvatarLoader
+
+# 配信者の情報（MainWindow._merge_user_data の dict）を返すロール
+USER_DATA_ROLE = Qt.ItemDataRole.UserRole + 1
+
+# 1行の大きさと配置（以前のパネルと同じ見た目になるようにしている）
+ROW_HEIGHT = 66
+MARGIN = 5
+ICON_SIZE = 40
+BADGE_HEIGHT = 14
+BUTTON_WIDTH = 70
+BUTTON_HEIGHT = 20
+SPACING = 10
+# 省略表示した文字列をいくつまで覚えておくか
+ELIDE_CACHE_SIZE = 5000
+# 読み込みに失敗したアイコンを、再描画のたびに取得し直さないようにする間隔（秒）
+AVATAR_RETRY_SECONDS = 60
+
+# 表示順（MainWindow のコンボボックスの項目）
+SORT_CUSTOM = "カスタム表示順"
+SORT_REGISTERED = "登録順"
+SORT_LATEST = "最新配信順"
+SORT_NAME = "名前順"
+
+
+class ChannelListModel(QAbstractListModel):
+    """配信者ごとの表示内容を1行ずつ持つモデル
+
+    アイコンは表示される行の分だけ、描画のときに共有のローダーへ読み込みを頼む。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._channels = []
+        # ユーザーID → 行
+        self._rows = {}
+        # 読み込みを頼んで、まだ届いていないアイコンのURL → そのアイコンを待っているユーザーID
+        # （既定のアイコンなど、同じURLを複数の配信者が使うことがある）
+        self._avatar_waiters = {}
+        # 読み込みに失敗したURL → 失敗した時刻
+        self._failed_avatars = {}
+        AvatarLoader.instance().failed.connect(self._on_avatar_failed)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._channels)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        channel = self._channels[index.row()]
+        if role == USER_DATA_ROLE:
+            return channel
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{channel['display_name']} ({channel['login']})"
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._avatar(channel)
+        return None
+
+    def _avatar(self, channel: Dict):
+        url = channel['profile_image_url']
+        loader = AvatarLoader.instance()
+        pixmap = loader.cached(url)
+        if pixmap is not None or not url:
+            return pixmap
+        if url in self._avatar_waiters:
+            self._avatar_waiters[url].add(channel['id'])
+        elif time.monotonic() - self._failed_avatars.get(url, float('-inf')) >= AVATAR_RETRY_SECONDS:
+            self._avatar_waiters[url] = {channel['id']}
+            loader.load(url, lambda _pixmap: self._on_avatar_loaded(url))
+        return None
+
+    def _on_avatar_loaded(self, url: str):
+        self._failed_avatars.pop(url, None)
+        for user_id in self._avatar_waiters.pop(url, ()):
+            row = self._rows.get(user_id)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def _on_avatar_failed(self, url: str):
+        if self._avatar_waiters.pop(url, None) is not None:
+            self._failed_avatars[url] = time.monotonic()
+
+    def set_channels(self, channels: List[Dict]):
+        """一覧を入れ替える（登録順のリスト）"""
+        self.beginResetModel()
+        self._channels = list(channels)
+        self._rows = {channel['id']: row for row, channel in enumerate(self._channels)}
+        self.endResetModel()
+
+    def update_channel(self, channel: Dict):
+        """1人分の表示内容を差し替え、その行だけを再描画させる"""
+        row = self._rows.get(channel['id'])
+        if row is None:
+            return
+        self._channels[row] = channel
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def channel(self, user_id: str) -> Optional[Dict]:
+        row = self._rows.get(user_id)
+        return None if row is None else self._channels[row]
+
+    def channels(self) -> List[Dict]:
+        return list(self._channels)
+
+
+class ChannelFilterProxyModel(QSortFilterProxyModel):
+    """表示順の並べ替えと、非表示ユーザー・名前での絞り込み
+
+    並べ替えは表示順を変えたときと sort_now() を呼んだときだけ行う（配信状態の更新で行が動かないようにする）。
+    順位は並べ替えの最初にまとめて計算し、lessThan では元の行の順位を比べるだけにする
+    （比較のたびに行の内容を取り出すと、数千件で並べ替えに数秒かかる）。
+    """
+
+    def __init__(self, hidden_users: Set[str], parent=None):
+        super().__init__(parent)
+        self.setDynamicSortFilter(False)
+        self.sort_mode = SORT_REGISTERED
+        # 非表示ユーザーのID（MainWindow.hidden_users をそのまま参照する）
+        self.hidden_users = hidden_users
+        self.filter_text = ''
+        # ユーザーID → カスタム表示順の位置
+        self._custom_order = {}
+        # 元のモデルの行 → 表示順での順位（None なら次の並べ替えで計算し直す）
+        self._ranks = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        # 一覧が入れ替わると、プロキシは新しい内容ですぐに並べ替えるため、それまでに順位を捨てておく
+        model.modelAboutToBeReset.connect(self._clear_ranks)
+
+    def _clear_ranks(self):
+        self._ranks = None
+
+    def set_sort_mode(self, mode: str):
+        self.sort_mode = mode
+        self.sort_now()
+
+    def set_custom_order(self, user_order: List[str]):
+        self._custom_order = {user_id: i for i, user_id in enumerate(user_order)}
+        if self.sort_mode == SORT_CUSTOM:
+            self.sort_now()
+
+    def set_filter_text(self, text: str):
+        self.filter_text = text.strip().lower()
+        self.invalidateFilter()
+
+    def refresh_filter(self):
+        """hidden_users を変えたあとに呼ぶ"""
+        self.invalidateFilter()
+
+    def sort_now(self):
+        self._ranks = None
+        self.invalidate()
+        if self.sort_mode == SORT_REGISTERED:
+            # 登録順は元のモデルの順のまま（並べ替えを解除する）
+            self.sort(-1)
+        else:
+            self.sort(0, Qt.SortOrder.AscendingOrder)
+
+    def _update_ranks(self):
+        channels = self.sourceModel().channels()
+        # 最新配信順は以前の sorted(key=(not is_live, last_stream), reverse=True) と同じ順
+        order = sorted(range(len(channels)), key=lambda row: self._sort_key(channels[row]),
+                       reverse=self.sort_mode == SORT_LATEST)
+        self._ranks = [0] * len(channels)
+        for rank, row in enumerate(order):
+            self._ranks[row] = rank
+
+    def _sort_key(self, channel: Dict):
+        if self.sort_mode == SORT_CUSTOM:
+            return self._custom_order.get(channel['id'], len(self._custom_order))
+        if self.sort_mode == SORT_LATEST:
+            return (not channel['is_live'], channel.get('last_stream', '0'))
+        return channel['display_name'].lower()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        channel = self.sourceModel().index(source_row, 0, source_parent).data(USER_DATA_ROLE)
+        if channel['id'] in self.hidden_users:
+            return False
+        if self.filter_text:
+            return (self.filter_text in channel['display_name'].lower()
+                    or self.filter_text in channel['login'].lower())
+        return True
+
+    def lessThan(self, left, right):
+        if self._ranks is None:
+            self._update_ranks()
+        return self._ranks[left.row()] < self._ranks[right.row()]
+
+
+class ChannelDelegate(QStyledItemDelegate):
+    """1行分（アイコン・LIVE表示・名前・タイトル・カテゴリ・ボタン）を描画し、ボタンのクリックを通知する"""
+    videos_clicked = pyqtSignal(str)  # ユーザーID
+    delete_clicked = pyqtSignal(str)  # ユーザーID
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ordering = False
+        # ドラッグ中に重なっている行のユーザーID
+        self.drop_target = None
+        # 押されているボタン（ユーザーID, 'videos' または 'delete'）
+        self._pressed = None
+        # (フォント, 幅, 文字列) → 省略表示した文字列（文字幅の計算は長いタイトルだと1回0.1ミリ秒以上かかる）
+        self._elided = {}
+
+        self.name_font = QFont()
+        self.name_font.setPixelSize(11)
+        self.name_font.setBold(True)
+        self.text_font = QFont()
+        self.text_font.setPixelSize(10)
+        self.badge_font = QFont(self.text_font)
+        self.badge_font.setBold(True)
+        self.name_metrics = QFontMetrics(self.name_font)
+        self.text_metrics = QFontMetrics(self.text_font)
+
+    def sizeHint(self, option, index):
+        return QSize(BUTTON_WIDTH + ICON_SIZE + SPACING * 2 + MARGIN * 2, ROW_HEIGHT)
+
+    def button_rects(self, rect: QRect) -> Dict[str, QRect]:
+        """行の矩形に対するボタンの位置（右端に縦に2つ並べる）"""
+        left = rect.right() - MARGIN - BUTTON_WIDTH
+        top = rect.top() + (rect.height() - BUTTON_HEIGHT * 2 - 2) // 2
+        return {
+            'videos': QRect(left, top, BUTTON_WIDTH, BUTTON_HEIGHT),
+            'delete': QRect(left, top + BUTTON_HEIGHT + 2, BUTTON_WIDTH, BUTTON_HEIGHT)
+        }
+
+    def button_at(self, rect: QRect, pos: QPoint) -> Optional[str]:
+        for name, button_rect in self.button_rects(rect).items():
+            if button_rect.contains(pos):
+                return name
+        return None
+
+    def paint(self, painter, option, index):
+        channel = index.data(USER_DATA_ROLE)
+        if channel is None:
+            return
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        rect = option.rect.adjusted(1, 1, -1, -1)
+        self._paint_background(painter, option, rect, channel['id'])
+
+        # アイコンとLIVE表示
+        icon_rect = QRect(rect.left() + MARGIN, rect.top() + MARGIN, ICON_SIZE, ICON_SIZE)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap is not None:
+            painter.drawPixmap(icon_rect, pixmap)
+        if channel['is_live']:
+            badge_rect = QRect(icon_rect.left(), icon_rect.bottom() + 3, ICON_SIZE, BADGE_HEIGHT)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor('#ff0000'))
+            painter.drawRoundedRect(badge_rect, 2, 2)
+            painter.setPen(QColor('white'))
+            painter.setFont(self.badge_font)
+            painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, "LIVE")
+
+        # 配信者名・タイトル・カテゴリ（幅に収まらない分は省略する）
+        buttons = self.button_rects(rect)
+        text_left = icon_rect.right() + 1 + SPACING
+        text_width = buttons['videos'].left() - SPACING - text_left
+        text_color = option.palette.color(QPalette.ColorRole.Text)
+        lines = [
+            (self.name_font, self.name_metrics, text_color, f"{channel['display_name']} ({channel['login']})"),
+            (self.text_font, self.text_metrics, text_color,
+             channel['stream_title'] if channel['is_live'] else channel['last_title']),
+            (self.text_font, self.text_metrics, QColor('#666666'), channel['game_name'])
+        ]
+        top = rect.top() + MARGIN
+        for font, metrics, color, text in lines:
+            painter.setFont(font)
+            painter.setPen(color)
+            line_rect = QRect(text_left, top, max(text_width, 0), max(metrics.height(), 15))
+            painter.drawText(line_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                             self._elide(metrics, text, line_rect.width()))
+            top += line_rect.height() + 2
+
+        # ボタン
+        style = QApplication.style()
+        painter.setFont(self.text_font)
+        for name, text in (('videos', "動画一覧"), ('delete', "ユーザ削除")):
+            button = QStyleOptionButton()
+            button.rect = buttons[name]
+            button.text = text
+            button.fontMetrics = self.text_metrics
+            button.palette = QPalette(option.palette)
+            if name == 'delete':
+                button.palette.setColor(QPalette.ColorRole.Button, QColor('#ffcccc'))
+            button.state = QStyle.StateFlag.State_Enabled
+            if self._pressed == (channel['id'], name):
+                button.state |= QStyle.StateFlag.State_Sunken
+            else:
+                button.state |= QStyle.StateFlag.State_Raised
+            style.drawControl(QStyle.ControlElement.CE_PushButton, button, painter)
+        painter.restore()
+
+    def _elide(self, metrics: QFontMetrics, text: str, width: int) -> str:
+        key = (metrics is self.name_metrics, width, text)
+        elided = self._elided.get(key)
+        if elided is None:
+            if len(self._elided) >= ELIDE_CACHE_SIZE:
+                self._elided.clear()
+            elided = self._elided[key] = metrics.elidedText(text, Qt.TextElideMode.ElideRight, width)
+        return elided
+
+    def _paint_background(self, painter, option, rect: QRect, user_id: str):
+        if user_id == self.drop_target:
+            painter.setPen(QPen(QColor('#4a90e2'), 2))
+            painter.setBrush(QColor('#e8f2fd'))
+        elif self.ordering:
+            hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+            gradient = QLinearGradient(0, rect.top(), 0, rect.bottom())
+            gradient.setColorAt(0, QColor('#e7e7e7' if hovered else '#f0f0f0'))
+            gradient.setColorAt(1, QColor('#d7d7d7' if hovered else '#e3e3e3'))
+            painter.setPen(QPen(QColor('#aaaaaa'), 2) if hovered else QPen(QColor('#cccccc'), 1))
+            painter.setBrush(QBrush(gradient))
+        else:
+            painter.setPen(option.palette.color(QPalette.ColorRole.Mid))
+            painter.setBrush(option.palette.color(QPalette.ColorRole.Window))
+        painter.drawRoundedRect(rect, 3, 3)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.Type.MouseButtonPress, QEvent.Type.MouseButtonRelease,
+                                QEvent.Type.MouseButtonDblClick):
+            return False
+        if event.button() != Qt.MouseButton.LeftButton:
+            return False
+        channel = index.data(USER_DATA_ROLE)
+        name = self.button_at(option.rect.adjusted(1, 1, -1, -1), event.position().toPoint())
+        if event.type() == QEvent.Type.MouseButtonRelease:
+            pressed, self._pressed = self._pressed, None
+            self._repaint(option)
+            if pressed is None or pressed != (channel['id'], name):
+                return pressed is not None
+            if name == 'videos':
+                self.videos_clicked.emit(channel['id'])
+            else:
+                self.delete_clicked.emit(channel['id'])
+            return True
+        if name is None:
+            return False
+        self._pressed = (channel['id'], name)
+        self._repaint(option)
+        return True
+
+    def _repaint(self, option):
+        # 押した行と離した行が違うこともあるため、表示中の範囲をまとめて再描画する
+        if isinstance(option.widget, QListView):
+            option.widget.viewport().update()
+
+
+class ChannelListView(QListView):
+    """配信者の一覧
+
+    行は ChannelDelegate が描画し、表示されている行の分しか描画しない。
+    並び替えモードでは行をドラッグして別の行に重ねると swap_requested を通知する。
+    """
+    swap_requested = pyqtSignal(str, str)  # ドラッグした行のユーザーID, 重ねた行のユーザーID
+
+    def __init__(self, delegate: ChannelDelegate, parent=None):
+        super().__init__(parent)
+        self.delegate = delegate
+        self.setItemDelegate(delegate)
+        self.setUniformItemSizes(True)
+        self.setSpacing(2)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WidgetAttribute.WA_Hover)
+        self.setAcceptDrops(True)
+
+    def set_ordering(self, ordering: bool):
+        self.delegate.ordering = ordering
+        self.viewport().update()
+
+    def _user_id_at(self, pos: QPoint) -> Optional[str]:
+        index = self.indexAt(pos)
+        return index.data(USER_DATA_ROLE)['id'] if index.isValid() else None
+
+    def mousePressEvent(self, event):
+        index = self.indexAt(event.position().toPoint())
+        if (self.delegate.ordering and event.button() == Qt.MouseButton.LeftButton and index.isValid()
+                and self.delegate.button_at(self.visualRect(index).adjusted(1, 1, -1, -1),
+                                            event.position().toPoint()) is None):
+            self._start_drag(index)
+            return
+        super().mousePressEvent(event)
+
+    def _start_drag(self, index):
+        drag = QDrag(self)
+        mime = QMimeData()
+        mime.setText(index.data(USER_DATA_ROLE)['id'])
+
+        # ドラッグ時のプレビュー画像を生成
+        rect = self.visualRect(index)
+        pixmap = self.viewport().grab(rect)
+        pixmap = pixmap.scaled(int(rect.width() * 0.95), int(rect.height() * 0.95),
+                               Qt.AspectRatioMode.KeepAspectRatio,
+                               Qt.TransformationMode.SmoothTransformation)
+        drag.setPixmap(pixmap)
+        drag.setHotSpot(QPoint(pixmap.width() // 2, 10))
+
+        drag.setMimeData(mime)
+        drag.exec(Qt.DropAction.MoveAction)
+        self._set_drop_target(None)
+
+    def _set_drop_target(self, user_id: Optional[str]):
+        if self.delegate.drop_target != user_id:
+            self.delegate.drop_target = user_id
+            self.viewport().update()
+
+    def dragEnterEvent(self, event):
+        if self.delegate.ordering and event.mimeData().hasText():
+            event.acceptProposedAction()
+        else:
+            event.ignore()
+
+    def dragMoveEvent(self, event):
+        if not (self.delegate.ordering and event.mimeData().hasText()):
+            event.ignore()
+            return
+        pos = event.position().toPoint()
+        # 端に近づいたらスクロールする（一覧が長いときに画面外の行へ移せるように）
+        if pos.y() < ROW_HEIGHT // 2:
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - ROW_HEIGHT // 3)
+        elif pos.y() > self.viewport().height() - ROW_HEIGHT // 2:
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() + ROW_HEIGHT // 3)
+        self._set_drop_target(self._user_id_at(pos))
+        event.acceptProposedAction()
+
+    def dragLeaveEvent(self, event):
+        self._set_drop_target(None)
+
+    def dropEvent(self, event):
+        if not (self.delegate.ordering and event.mimeData().hasText()):
+            event.ignore()
+            return
+        target_id = self._user_id_at(event.position().toPoint())
+        self._set_drop_target(None)
+        event.acceptProposedAction()
+        if target_id is not None:
+            self.swap_requested.emit(event.mimeData().text(), target_id)
@@ -0,0 +1,226 @@
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from PyQt6.QtWidgets import QApplication
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+from ..chat_archive import DEFAULT_ARCHIVE_DIR, ChatArchive
+from ..chat_downloader import BrowserPool, DownloadCancelled, fetch_chat_file
+from .. import timing
+from ..database.db_manager import DatabaseManager
+from ..ingest import ingest_comments_file
+
+# コメントファイルの保存先ディレクトリ
+DEFAULT_COMMENTS_DIR = os.path.join(os.path.expanduser('~'), '.twitch_dl_com', 'comments')
+
+# 実行中とみなすジョブの状態
+ACTIVE_STATES = ('queued', 'downloading', 'ingesting')
+
+
+class DownloadWorker(QThread):
+    """キューからジョブを取り出して、ダウンロードと取り込みを順に実行する"""
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+
+    def run(self):
+        # SQLiteの接続はスレッドをまたげないため、ワーカーごとに開く
+        db = DatabaseManager(self.manager.db_path)
+        try:
+            while True:
+                job = self.manager._queue.get()
+                if job is None:
+                    break
+                if job['cancelled']:
+                    continue
+                with timing.job_context(f"gui-{job['id']}-{int(job['queued_at'])}", job['id']):
+                    with timing.stage('job'):
+                        self.manager._run_job(db, job)
+        finally:
+            db.conn.close()
+
+
+class DownloadManager(QObject):
+    """アプリ全体で共有するコメントダウンロードのキューとワーカープール
+
+    ジョブは動画IDで識別し、同じ動画の重複登録は無視する。
+    保管庫（ChatArchive）にある動画はダウンロードせずに保管済みのファイルから取り込み、ダウンロードしたファイルは保管庫へ入れる。
+    シグナルはワーカースレッドから送出されるが、GUIスレッドのスロットにはキュー経由で届く。
+    """
+    job_added = pyqtSignal(str)
+    job_progress = pyqtSignal(str, str, int)  # 動画ID, 状態, 進捗(%)
+    job_finished = pyqtSignal(str, bool, str)  # 動画ID, 成功したか, メッセージ
+
+    _instance = None
+
+    @classmethod
+    def instance(cls, **kwargs) -> 'DownloadManager':
+        """共有のインスタンスを返す（初回のみ kwargs で作成し、アプリ終了時に停止する）"""
+        if cls._instance is None:
+            cls._instance = cls(**kwargs)
+            app = QApplication.instance()
+            if app is not None:
+                app.aboutToQuit.connect(cls._instance.shutdown)
+        return cls._instance
+
+    def __init__(self, db_path: str = 'twitch_users.db', output_dir: str = DEFAULT_COMMENTS_DIR,
+                 max_workers: int = 2, backend: str = 'auto', archive_dir: str = DEFAULT_ARCHIVE_DIR, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.backend = backend
+        self.archive = ChatArchive(archive_dir)
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._workers = [DownloadWorker(self) for _ in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, video: Dict, streamer_id: str) -> bool:
+        """動画のコメント取得をキューに追加（同じ動画が処理中なら False）"""
+        with self._lock:
+            job = self._jobs.get(video['id'])
+            if job is not None and job['status'] in ACTIVE_STATES:
+                return False
+            job = {
+                'id': video['id'],
+                'url': video['url'],
+                'title': video['title'],
+                'streamer_id': streamer_id,
+                'start_time': video['created_at'],
+                'duration_seconds': video['duration_seconds'],
+                'status': 'queued',
+                'progress': 0,
+                'message': '',
+                'cancelled': False,
+                'queued_at': time.time()
+            }
+            self._jobs[video['id']] = job
+        self._queue.put(job)
+        self.job_added.emit(video['id'])
+        return True
+
+    def cancel(self, video_id: str):
+        """ジョブをキャンセルする（待機中なら即座に、実行中なら次の確認時点で中断）"""
+        with self._lock:
+            job = self._jobs.get(video_id)
+            if job is None or job['status'] not in ACTIVE_STATES:
+                return
+            job['cancelled'] = True
+            queued = job['status'] == 'queued'
+        if queued:
+            self._finish(job, False, 'キャンセルしました', 'cancelled')
+
+    def get_job(self, video_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(video_id)
+            return dict(job) if job else None
+
+    def jobs(self) -> List[Dict]:
+        """全ジョブの状態（登録順）"""
+        with self._lock:
+            return sorted((dict(job) for job in self._jobs.values()), key=lambda job: job['queued_at'])
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in ACTIVE_STATES)
+
+    def _get_pool(self):
+        # HTTPで取得できない動画があった時だけブラウザを起動し、以降は使い回す
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = BrowserPool(self.max_workers, self.output_dir)
+            return self._pool
+
+    def _set_status(self, job: Dict, status: str, progress: int):
+        with self._lock:
+            # キャンセル済みのジョブを実行中に戻さない
+            if job['status'] not in ACTIVE_STATES:
+                return
+            job['status'] = status
+            job['progress'] = progress
+        self.job_progress.emit(job['id'], status, progress)
+
+    def _finish(self, job: Dict, success: bool, message: str, status: Optional[str] = None):
+        with self._lock:
+            if job['status'] not in ACTIVE_STATES:
+                return
+            job['status'] = status or ('done' if success else 'failed')
+            job['message'] = message
+        self.job_finished.emit(job['id'], success, message)
+
+    def _run_job(self, db: DatabaseManager, job: Dict):
+        """ワーカースレッドで1件のジョブを実行する"""
+        is_cancelled = lambda: job['cancelled']
+        if db.has_complete_video_comments(job['url']):
+            self._finish(job, True, 'コメントは保存済みです')
+            return
+        ingesting = False
+
+        duration = max(job['duration_seconds'] or 0, 1)
+
+        def on_download(count, offset_seconds):
+            self._set_status(job, 'downloading', min(int(offset_seconds / duration * 100), 100))
+
+        try:
+            entry = self.archive.get(job['id'])
+            if entry is not None:
+                path = entry['path']
+            else:
+                self._set_status(job, 'downloading', 0)
+                path = fetch_chat_file(job['url'], self.output_dir, backend=self.backend, get_pool=self._get_pool,
+                                       progress_callback=on_download, is_cancelled=is_cancelled)
+                if path is None:
+                    self._finish(job, False, 'コメントのダウンロードに失敗しました')
+                    return
+                try:
+                    self.archive.add(path, job['id'], url=job['url'], streamer_id=job['streamer_id'],
+                                     title=job['title'], start_time=job['start_time'],
+                                     duration_seconds=job['duration_seconds'])
+                except (OSError, ValueError) as e:
+                    print(f"保管庫への追加に失敗しました: {path}: {e}")
+
+            self._set_status(job, 'ingesting', 0)
+            # 配信中に一部だけ取得したチャットがあれば、重複しないよう先に削除する
+            ingesting = True
+            db.discard_partial_live_comments(job['url'])
+            started = time.perf_counter()
+            count = ingest_comments_file(
+                db, path, job['url'], job['streamer_id'], job['start_time'],
+                progress_callback=lambda value: self._set_status(job, 'ingesting', value),
+                is_cancelled=is_cancelled
+            )
+            if is_cancelled():
+                raise DownloadCancelled()
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            self._finish(job, True, f"{count}件のコメントを保存しました（{count / elapsed:,.0f}件/秒）")
+        except DownloadCancelled:
+            # 途中まで取り込んだ行を残すと保存済みと判定されるため削除する
+            # （取り込み前なら、配信中に取得した一部のチャットは残す）
+            if ingesting:
+                db.delete_video_comments(job['url'])
+            self._finish(job, False, 'キャンセルしました', 'cancelled')
+        except Exception as e:
+            if ingesting:
+                db.delete_video_comments(job['url'])
+            self._finish(job, False, f"コメント処理エラー: {str(e)}")
+
+    def shutdown(self):
+        """待機中・実行中のジョブをキャンセルし、ワーカーとブラウザを停止する"""
+        for job in self.jobs():
+            self.cancel(job['id'])
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.wait()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
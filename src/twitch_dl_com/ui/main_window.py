@@ -1,220 +1,110 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                           QPushButton, QScrollArea, QLabel, QFrame, QMessageBox,
-                           QComboBox)
-from PyQt6.QtCore import Qt, QTimer, QMimeData, QPoint, QThread, pyqtSignal
-from PyQt6.QtGui import QPixmap, QDrag
+                           QPushButton, QLabel, QMessageBox, QComboBox, QProgressBar, QLineEdit)
+from PyQt6.QtCore import QTimer, QThread, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import os
-from typing import Dict
+from typing import Dict, List
 from ..tw_api import TwitchAPI
 from ..database.db_manager import DatabaseManager
+from ..video_prefetch import MAX_IDS_PER_REQUEST, chunks
 from .video_list_dialog import VideoListDialog
 from .user_register_dialog import UserRegisterDialog
-import urllib.request
+from .channel_list import (SORT_LATEST, USER_DATA_ROLE, ChannelDelegate, ChannelFilterProxyModel,
+                           ChannelListModel, ChannelListView)
 
-class ImageLoader(QThread):
-    loaded = pyqtSignal(QPixmap)
-    
-    def __init__(self, url):
+class UserDetailsLoader(QThread):
+    """配信者の詳細（配信状態・最新の動画）をバックグラウンドで取得し、バッチごとに通知する"""
+    batch_loaded = pyqtSignal(dict)  # ユーザーID → 詳細（取得できなければ None）
+    progress = pyqtSignal(int, int)  # 取得済みの人数, 全体の人数
+
+    def __init__(self, api, user_ids: List[str], batch_size: int = 10, max_workers: int = 4):
         super().__init__()
-        self.url = url
-    
+        self.api = api
+        self.user_ids = user_ids
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
     def run(self):
+        batches = [self.user_ids[i:i + self.batch_size] for i in range(0, len(self.user_ids), self.batch_size)]
+        done = 0
         try:
-            data = urllib.request.urlopen(self.url).read()
-            pixmap = QPixmap()
-            pixmap.loadFromData(data)
-            self.loaded.emit(pixmap)
+            # トークンの取得が並行して重ならないよう、先に1回だけ取得しておく
+            self.api.auth.get_oauth_token()
         except Exception as e:
-            print(f"Error loading image: {e}")
-
-class UserPanel(QFrame):
-    def __init__(self, user_data, parent=None):
-        super().__init__(parent)
-        self.user_data = user_data
-        self.icon_label = QLabel()  # icon_labelを先に初期化
-        self.setAcceptDrops(True)
-        
-        # 画像を非同期で読み込む
-        self.image_loader = ImageLoader(self.user_data['profile_image_url'])
-        self.image_loader.loaded.connect(self.update_icon)
-        self.image_loader.start()
-        
-        self.setProperty("draggable", False)  # ドラッグ可能状態を追跡
-        self.setup_ui()  # UIのセットアップは最後に行う
+            print(f"Error getting token: {e}")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.api.get_users_details, batch) for batch in batches]
+            try:
+                for future in as_completed(futures):
+                    if self.cancelled:
+                        break
+                    try:
+                        details = future.result()
+                    except Exception as e:
+                        print(f"Error loading users batch: {str(e)}")
+                        continue
+                    done += len(details)
+                    self.batch_loaded.emit(details)
+                    self.progress.emit(done, len(self.user_ids))
+            finally:
+                # キャンセル時は未着手のバッチを取り消す（実行中のリクエストは完了を待つ）
+                for future in futures:
+                    future.cancel()
 
-    def update_icon(self, pixmap):
-        self.icon_label.setPixmap(pixmap.scaled(50, 50, Qt.AspectRatioMode.KeepAspectRatio))
+class StatusRefresher(QThread):
+    """配信状態をバックグラウンドでまとめて確認し、変わった配信者の分だけ通知する
 
-    def setup_ui(self):
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)  # 余白を縮小
-        layout.setSpacing(10)  # 要素間の間隔を縮小
-        
-        # ユーザアイコンとLIVEラベルを含むレイアウト
-        icon_layout = QVBoxLayout()
-        icon_layout.setSpacing(2)  # アイコンとLIVEラベルの間隔を縮小
-        
-        # ユーザアイコン
-        self.icon_label.setFixedSize(40, 40)  # アイコンサイズを縮小
-        icon_layout.addWidget(self.icon_label)
-        
-        # LIVE表示
-        if self.user_data['is_live']:
-            live_label = QLabel("LIVE")
-            live_label.setStyleSheet("""
-                QLabel {
-                    background-color: #ff0000;
-                    color: white;
-                    padding: 1px 3px;
-                    border-radius: 2px;
-                    font-weight: bold;
-                    font-size: 10px;
-                }
-            """)
-            live_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            icon_layout.addWidget(live_label)
-        
-        layout.addLayout(icon_layout)
-        
-        # ユーザ情報
-        info_layout = QVBoxLayout()
-        info_layout.setSpacing(2)  # ラベル間の間隔を縮小
-        
-        # 配信者名を最初に表示
-        name_label = QLabel(f"{self.user_data['display_name']} ({self.user_data['login']})")
-        title_label = QLabel(self.user_data['stream_title'] if self.user_data['is_live'] else self.user_data['last_title'])
-        category_label = QLabel(self.user_data['game_name'])
-        
-        # 各ラベルのスタイル設定
-        for label in [name_label, title_label, category_label]:
-            label.setWordWrap(True)
-            label.setMinimumHeight(15)  # 最小の高さを縮小
-        
-        # フォントサイズを調整
-        name_label.setStyleSheet("font-weight: bold; font-size: 11px;")
-        title_label.setStyleSheet("font-size: 10px;")
-        category_label.setStyleSheet("font-size: 10px; color: #666;")
-        
-        info_layout.addWidget(name_label)
-        info_layout.addWidget(title_label)
-        info_layout.addWidget(category_label)
-        layout.addLayout(info_layout, stretch=1)
-        
-        # ボタンレイアウト
-        button_layout = QVBoxLayout()
-        button_layout.setSpacing(2)  # ボタン間の間隔を縮小
-        
-        # 動画一覧ボタン
-        videos_button = QPushButton("動画一覧")
-        videos_button.setFixedWidth(70)  # ボタン幅を縮小
-        videos_button.setFixedHeight(20)  # ボタン高さを縮小
-        videos_button.setStyleSheet("font-size: 10px;")
-        videos_button.clicked.connect(lambda: self.show_videos())
-        button_layout.addWidget(videos_button)
-        
-        # 削除ボタン
-        delete_button = QPushButton("ユーザ削除")
-        delete_button.setFixedWidth(70)  # ボタン幅を縮小
-        delete_button.setFixedHeight(20)  # ボタン高さを縮小
-        delete_button.setStyleSheet("background-color: #ffcccc; font-size: 10px;")
-        delete_button.clicked.connect(self.confirm_delete)
-        button_layout.addWidget(delete_button)
-        
-        layout.addLayout(button_layout)
-        
-        self.setFrameStyle(QFrame.Shape.StyledPanel | QFrame.Shadow.Raised)
-        # パネル全体のスタイル設定
-        self.setStyleSheet("""
-            QFrame[draggable="true"] {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                                          stop:0 #f0f0f0, stop:1 #e3e3e3);
-                border: 1px solid #cccccc;
-                border-radius: 3px;
-            }
-            QFrame[draggable="true"]:hover {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                                          stop:0 #e7e7e7, stop:1 #d7d7d7);
-                border: 2px solid #aaaaaa;
-            }
-        """)
+    /streams は100人ずつ1回で問い合わせ、最新の動画は配信が終わった配信者の分だけ取得する。
+    通知する詳細は変わった項目だけを含む（{'stream': ...} と、配信終了時は {'latest_video': ...}）。
+    """
+    changed = pyqtSignal(dict)  # ユーザーID → 変わった項目
 
-    def confirm_delete(self):
-        reply = QMessageBox.question(
-            self,
-            '削除確認',
-            f'ユーザー {self.user_data["display_name"]} を非表示にしますか？',
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
-            # メインウィンドウの非表示ユーザーリストに追加
-            main_window = self.window()
-            main_window.hidden_users.add(self.user_data['id'])
-            main_window.save_hidden_users()  # 非表示設定を保存
-            
-            self.hide()
-            layout = self.parent().layout()
-            layout.removeWidget(self)
-            self.deleteLater()
+    def __init__(self, api, statuses: List[Dict]):
+        super().__init__()
+        self.api = api
+        # {'id', 'is_live', 'stream_title', 'game_name'} のリスト（開始時点の表示内容）
+        self.statuses = statuses
+        self.cancelled = False
 
-    def show_videos(self):
-        user_details = {
-            'user': {
-                'id': self.user_data['id'],
-                'login': self.user_data['login'],
-                'display_name': self.user_data['display_name']
-            },
-            'stream': None,  # 必要に応じて設定
-            'latest_video': None  # 必要に応じて設定
-        }
-        dialog = VideoListDialog(user_details, self)
-        dialog.exec()
+    def cancel(self):
+        self.cancelled = True
 
-    def mousePressEvent(self, event):
-        if self.window().is_ordering_mode and event.button() == Qt.MouseButton.LeftButton:
-            drag = QDrag(self)
-            mime = QMimeData()
-            mime.setText(self.user_data['id'])
-            
-            # ドラッグ時のプレビュー画像を生成
-            pixmap = self.grab()
-            # 浮動小数点数を整数に変換
-            scaled_width = int(self.width() * 0.95)
-            scaled_height = int(self.height() * 0.95)
-            pixmap = pixmap.scaled(scaled_width, scaled_height,
-                                 Qt.AspectRatioMode.KeepAspectRatio,
-                                 Qt.TransformationMode.SmoothTransformation)
-            drag.setPixmap(pixmap)
-            drag.setHotSpot(QPoint(pixmap.width()//2, 10))
-            
-            drag.setMimeData(mime)
-            drag.exec(Qt.DropAction.MoveAction)
-
-    def dragEnterEvent(self, event):
-        if self.window().is_ordering_mode and event.mimeData().hasText():
-            event.acceptProposedAction()
-            # フレーム全体のスタイルのみを変更
-            self.setStyleSheet("""
-                QFrame {
-                    border: 2px solid #4a90e2;
-                    background: #e8f2fd;
-                    border-radius: 3px;
-                }
-            """)
-
-    def dragLeaveEvent(self, event):
-        if self.window().is_ordering_mode:
-            # 元のスタイルに戻す
-            self.setup_ui()
-
-    def dropEvent(self, event):
-        if self.window().is_ordering_mode and event.mimeData().hasText():
-            source_id = event.mimeData().text()
-            target_id = self.user_data['id']
-            self.window().swap_user_order(source_id, target_id)
-            event.acceptProposedAction()
+    def run(self):
+        streams = {}
+        try:
+            for chunk in chunks([status['id'] for status in self.statuses], MAX_IDS_PER_REQUEST):
+                if self.cancelled:
+                    return
+                streams.update((stream['user_id'], stream) for stream in self.api.get_streams(chunk))
+        except Exception as e:
+            print(f"Error refreshing streams: {str(e)}")
+            return
+
+        changed = {}
+        for status in self.statuses:
+            if self.cancelled:
+                return
+            stream = streams.get(status['id'])
+            if stream is not None:
+                if (not status['is_live'] or status['stream_title'] != stream['title']
+                        or status['game_name'] != stream['game_name']):
+                    changed[status['id']] = {'stream': stream}
+            elif status['is_live']:
+                # 配信が終わったら、そのアーカイブを最新の動画として取得する
+                details = {'stream': None}
+                try:
+                    videos = self.api.get_videos(status['id'], first=1)
+                    details['latest_video'] = videos[0] if videos else None
+                except Exception as e:
+                    print(f"Error updating user {status['id']}: {str(e)}")
+                changed[status['id']] = details
+        if changed and not self.cancelled:
+            self.changed.emit(changed)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -235,6 +125,13 @@ class MainWindow(QMainWindow):
         self.hidden_users = self.load_hidden_users()
         self.user_order = self.load_user_order()
         self.load_settings()
+
+        # 取得済みの詳細（並べ替えなどで再表示するときはAPIを呼ばずに使う）
+        self.user_details = {}
+        self.details_loader = None
+        self.status_refresher = None
+        # キャンセル後、実行中のリクエストの完了を待っている取得スレッド
+        self.stale_loaders = set()
         
         self.setup_ui()
         self.update_timer = QTimer()
@@ -256,6 +153,13 @@ class MainWindow(QMainWindow):
         add_button = QPushButton("ユーザ追加")
         add_button.clicked.connect(self.show_user_register)
         control_layout.addWidget(add_button)
+
+        # 名前での絞り込み
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("名前で絞り込み")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.setMaximumWidth(200)
+        control_layout.addWidget(self.filter_edit)
         
         # ソート順選択（コンボボックスに変更）
         control_layout.addStretch()
@@ -275,80 +179,88 @@ class MainWindow(QMainWindow):
         control_layout.addWidget(self.order_mode_button)
         
         layout.addLayout(control_layout)
-        
-        # ユーザリストのスクロールエリア
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        self.user_list_widget = QWidget()
-        self.user_list_layout = QVBoxLayout(self.user_list_widget)
-        scroll.setWidget(self.user_list_widget)
-        layout.addWidget(scroll)
+
+        # 詳細の取得状況
+        self.load_progress = QProgressBar()
+        self.load_progress.setFormat("配信状態を取得中 %v/%m")
+        self.load_progress.setMaximumHeight(14)
+        self.load_progress.hide()
+        layout.addWidget(self.load_progress)
+        
+        # ユーザリスト（行はデリゲートが描画し、表示されている行の分しか描画しない）
+        self.channel_model = ChannelListModel(self)
+        self.channel_proxy = ChannelFilterProxyModel(self.hidden_users, self)
+        self.channel_proxy.setSourceModel(self.channel_model)
+        self.channel_proxy.set_custom_order(self.user_order)
+        self.channel_proxy.set_sort_mode(self.default_sort_order)
+        self.channel_delegate = ChannelDelegate(self)
+        self.channel_delegate.videos_clicked.connect(self.show_videos)
+        self.channel_delegate.delete_clicked.connect(self.confirm_delete)
+        self.channel_view = ChannelListView(self.channel_delegate)
+        self.channel_view.setModel(self.channel_proxy)
+        self.channel_view.swap_requested.connect(self.swap_user_order)
+        self.filter_edit.textChanged.connect(self.channel_proxy.set_filter_text)
+        layout.addWidget(self.channel_view)
         
         self.load_users()
 
     def load_users(self):
-        # パフォーマンス改善のため、一時的にレイアウトを無効化
-        self.user_list_widget.setUpdatesEnabled(False)
-        
-        # 既存のパネルをクリア
-        while self.user_list_layout.count():
-            item = self.user_list_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-
-        registered_users = self.db.get_all_users()
-        
-        # バッチ処理でユーザー詳細を取得
-        user_details = {}
-        batch_size = 10
-        for i in range(0, len(registered_users), batch_size):
-            batch = registered_users[i:i + batch_size]
-            user_ids = [user['id'] for user in batch]
-            try:
-                details = self.api.get_users_details(user_ids)
-                user_details.update(details)
-            except Exception as e:
-                print(f"Error loading users batch: {str(e)}")
-
-        user_panels = []
-        for user in registered_users:
-            if user['id'] in self.hidden_users:
-                continue
-                
-            try:
-                details = user_details.get(user['id'])
-                panel = UserPanel(self._merge_user_data(user, details), self)
-                user_panels.append(panel)
-            except Exception as e:
-                print(f"Error creating panel for user {user['id']}: {str(e)}")
-                continue
-
-        # ソートとパネル追加
-        sorted_panels = self.sort_panels(user_panels)
-        for panel in sorted_panels:
-            self.user_list_layout.addWidget(panel)
-        
-        # レイアウトの更新を再開
-        self.user_list_widget.setUpdatesEnabled(True)
-
-    def sort_panels(self, panels):
-        sort_type = self.sort_combo.currentText()
-        if self.is_ordering_mode or sort_type == "カスタム表示順":
-            return sorted(panels, 
-                key=lambda p: self.user_order.index(p.user_data['id']) 
-                if p.user_data['id'] in self.user_order 
-                else len(self.user_order))
-        elif sort_type == "最新配信順":
-            return sorted(panels, 
-                key=lambda p: (not p.user_data['is_live'],
-                             p.user_data.get('last_stream', '0')),
-                reverse=True)
-        elif sort_type == "名前順":
-            return sorted(panels, 
-                key=lambda p: p.user_data['display_name'].lower())
-        else:  # 登録順
-            return panels
+        """DBの登録情報ですぐに一覧を表示し、まだ取得していない詳細はバックグラウンドで取得する"""
+        self._cancel_details_loader()
+
+        # 非表示のユーザーもモデルには入れ、表示するかどうかはプロキシで決める
+        users = self.db.get_all_users()
+        self.channel_model.set_channels(
+            [self._merge_user_data(user, self.user_details.get(user['id'])) for user in users])
+
+        missing = [user['id'] for user in users
+                   if user['id'] not in self.hidden_users and user['id'] not in self.user_details]
+        if missing:
+            self.load_progress.setRange(0, len(missing))
+            self.load_progress.setValue(0)
+            self.load_progress.show()
+            self.details_loader = UserDetailsLoader(self.api, missing)
+            self.details_loader.batch_loaded.connect(self._on_details_loaded)
+            self.details_loader.progress.connect(self._on_details_progress)
+            self.details_loader.finished.connect(self._on_details_finished)
+            self.details_loader.start()
+
+    def _cancel_details_loader(self):
+        if self.details_loader is None:
+            return
+        self.details_loader.cancel()
+        self.details_loader.batch_loaded.disconnect(self._on_details_loaded)
+        self.details_loader.progress.disconnect(self._on_details_progress)
+        self.details_loader.finished.disconnect(self._on_details_finished)
+        # 実行中のリクエストが終わるまでスレッドの参照を残す（参照を失うと実行中に破棄される）
+        loader = self.details_loader
+        self.stale_loaders.add(loader)
+        loader.finished.connect(lambda: self.stale_loaders.discard(loader))
+        self.details_loader = None
+        self.load_progress.hide()
+
+    def _on_details_loaded(self, details: Dict):
+        """取得できた分の詳細を一覧に反映する"""
+        for user_id, user_details in details.items():
+            if user_details is not None:
+                self._apply_details(user_id, user_details)
+
+    def _apply_details(self, user_id: str, details: Dict):
+        """詳細を保存し、その配信者の行だけを更新する"""
+        self.user_details[user_id] = details
+        channel = self.channel_model.channel(user_id)
+        if channel is not None:
+            self.channel_model.update_channel(self._merge_user_data(channel, details))
+
+    def _on_details_progress(self, done: int, total: int):
+        self.load_progress.setValue(done)
+
+    def _on_details_finished(self):
+        self.details_loader = None
+        self.load_progress.hide()
+        # 配信状態で並べる表示順は、詳細がすべて揃ってから並べ直す
+        if self.channel_proxy.sort_mode == SORT_LATEST:
+            self.channel_proxy.sort_now()
 
     def change_sort_order(self, order):
         if order == self.default_sort_order:
@@ -357,16 +269,7 @@ class MainWindow(QMainWindow):
         self.default_sort_order = order
         self.save_settings()
         
-        # パネルの再ソートのみを実行（完全な再読み込みを避ける）
-        panels = []
-        for i in range(self.user_list_layout.count()):
-            panel = self.user_list_layout.takeAt(0).widget()
-            if panel:
-                panels.append(panel)
-        
-        sorted_panels = self.sort_panels(panels)
-        for panel in sorted_panels:
-            self.user_list_layout.addWidget(panel)
+        self.channel_proxy.set_sort_mode(order)
 
     def _merge_user_data(self, user: Dict, details: Dict) -> Dict:
         # ユーザーの基本情報
@@ -405,27 +308,67 @@ class MainWindow(QMainWindow):
             self.load_users()  # ユーザリストを更新
 
     def update_status(self):
-        # 更新が必要なユーザーのみを更新
-        for i in range(self.user_list_layout.count()):
-            panel = self.user_list_layout.itemAt(i).widget()
-            if panel:
-                try:
-                    details = self.api.get_user_details(panel.user_data['id'])
-                    if self._has_status_changed(panel.user_data, details):
-                        new_data = self._merge_user_data(panel.user_data, details)
-                        panel.user_data = new_data
-                        panel.setup_ui()
-                except Exception as e:
-                    print(f"Error updating user {panel.user_data['id']}: {str(e)}")
-
-    def _has_status_changed(self, old_data, new_details):
-        if new_details is None:
-            return False
-        if new_details.get('stream'):
-            return (not old_data['is_live'] or 
-                   old_data['stream_title'] != new_details['stream']['title'])
-        else:
-            return old_data['is_live']
+        """配信状態の確認をバックグラウンドで始める（前回の確認や初回の取得が終わっていなければ見送る）"""
+        if self.status_refresher is not None or self.details_loader is not None:
+            return
+        user_data = [data for data in self.channel_model.channels() if data['id'] not in self.hidden_users]
+        statuses = [{key: data[key] for key in ('id', 'is_live', 'stream_title', 'game_name')}
+                    for data in user_data]
+        if not statuses:
+            return
+        self.status_refresher = StatusRefresher(self.api, statuses)
+        self.status_refresher.changed.connect(self._on_status_changed)
+        self.status_refresher.finished.connect(self._on_status_refresh_finished)
+        self.status_refresher.start()
+
+    def _on_status_changed(self, changes: Dict):
+        """変わった項目だけを保存済みの詳細に重ねて反映する"""
+        for user_id, changed in changes.items():
+            self._apply_details(user_id, dict(self.user_details.get(user_id) or {}, **changed))
+
+    def _on_status_refresh_finished(self):
+        self.status_refresher = None
+
+    def closeEvent(self, event):
+        """閉じるときは詳細の取得を止め、実行中のリクエストを少しだけ待つ"""
+        self.update_timer.stop()
+        self._cancel_details_loader()
+        if self.status_refresher is not None:
+            self.status_refresher.cancel()
+            self.stale_loaders.add(self.status_refresher)
+        for loader in list(self.stale_loaders):
+            loader.wait(3000)
+        event.accept()
+
+    def confirm_delete(self, user_id: str):
+        user_data = self.channel_model.channel(user_id)
+        reply = QMessageBox.question(
+            self,
+            '削除確認',
+            f'ユーザー {user_data["display_name"]} を非表示にしますか？',
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        
+        if reply == QMessageBox.StandardButton.Yes:
+            # 非表示ユーザーリストに追加（一覧からはプロキシの絞り込みで外れる）
+            self.hidden_users.add(user_id)
+            self.save_hidden_users()  # 非表示設定を保存
+            self.channel_proxy.refresh_filter()
+
+    def show_videos(self, user_id: str):
+        user_data = self.channel_model.channel(user_id)
+        user_details = {
+            'user': {
+                'id': user_data['id'],
+                'login': user_data['login'],
+                'display_name': user_data['display_name']
+            },
+            'stream': None,  # 必要に応じて設定
+            'latest_video': None  # 必要に応じて設定
+        }
+        dialog = VideoListDialog(user_details, self)
+        dialog.exec()
 
     def delete_user(self, user_id: str):
         if self.db.remove_user(user_id):
@@ -434,13 +377,8 @@ class MainWindow(QMainWindow):
     def toggle_ordering_mode(self):
         self.is_ordering_mode = self.order_mode_button.isChecked()
         
-        # パネルのドラッグ可能状態を更新
-        for i in range(self.user_list_layout.count()):
-            panel = self.user_list_layout.itemAt(i).widget()
-            if panel:
-                panel.setProperty("draggable", self.is_ordering_mode)
-                panel.style().unpolish(panel)
-                panel.style().polish(panel)
+        # 行のドラッグ可能状態を更新
+        self.channel_view.set_ordering(self.is_ordering_mode)
         
         if self.is_ordering_mode:
             self.sort_combo.setEnabled(False)
@@ -455,12 +393,20 @@ class MainWindow(QMainWindow):
     def swap_user_order(self, source_id, target_id):
         if source_id == target_id:
             return
+
+        # まだ表示順を保存していない配信者は、いま表示している順で末尾に加えてから入れ替える
+        known = set(self.user_order)
+        for row in range(self.channel_proxy.rowCount()):
+            user_id = self.channel_proxy.index(row, 0).data(USER_DATA_ROLE)['id']
+            if user_id not in known:
+                self.user_order.append(user_id)
+                known.add(user_id)
             
         source_idx = self.user_order.index(source_id)
         target_idx = self.user_order.index(target_id)
         self.user_order[source_idx], self.user_order[target_idx] = \
             self.user_order[target_idx], self.user_order[source_idx]
-        self.load_users()
+        self.channel_proxy.set_custom_order(self.user_order)
 
     def load_hidden_users(self):
         try:
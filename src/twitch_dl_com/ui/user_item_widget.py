@@ -1,10 +1,9 @@
 from PyQt6.QtWidgets import (QWidget, QHBoxLayout, QVBoxLayout, QLabel, 
                            QPushButton, QFrame)
 from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QPixmap
-import requests
 from datetime import datetime
 from .video_list_widget import VideoListDialog
+from .avatar_loader import AvatarLoader
 
 class UserItemWidget(QFrame):
     user_deleted = pyqtSignal(str)  # ユーザー削除時のシグナル
@@ -21,9 +20,8 @@ class UserItemWidget(QFrame):
         
         # ユーザーアイコン
         icon_label = QLabel()
-        pixmap = self._load_image(user_details['user']['profile_image_url'])
-        icon_label.setPixmap(pixmap)
         icon_label.setFixedSize(40, 40)
+        AvatarLoader.instance().load(user_details['user']['profile_image_url'], icon_label.setPixmap)
         layout.addWidget(icon_label)
         
         # ユーザー名
@@ -56,12 +54,6 @@ class UserItemWidget(QFrame):
         
         layout.addLayout(button_layout)
         
-    def _load_image(self, url):
-        response = requests.get(url)
-        pixmap = QPixmap()
-        pixmap.loadFromData(response.content)
-        return pixmap.scaled(50, 50, Qt.AspectRatioMode.KeepAspectRatio)
-        
     def _add_live_info(self, layout):
         stream = self.user_details['stream']
         status_label = QLabel("🔴 LIVE")
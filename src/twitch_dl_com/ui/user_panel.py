@@ -1,9 +1,7 @@
 from PyQt6.QtWidgets import QFrame, QHBoxLayout, QVBoxLayout, QLabel, QPushButton
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap
 from datetime import datetime
-import urllib.request
 from .video_list_dialog import VideoListDialog
+from .avatar_loader import AvatarLoader
 
 class UserPanel(QFrame):
     def __init__(self, user_data, parent=None):
@@ -16,9 +14,7 @@ class UserPanel(QFrame):
         
         # ユーザアイコン
         icon_label = QLabel()
-        pixmap = QPixmap()
-        pixmap.loadFromData(urllib.request.urlopen(self.user_data['profile_image_url']).read())
-        icon_label.setPixmap(pixmap.scaled(50, 50, Qt.AspectRatioMode.KeepAspectRatio))
+        AvatarLoader.instance().load(self.user_data['profile_image_url'], icon_label.setPixmap)
         layout.addWidget(icon_label)
         
         # ユーザ情報
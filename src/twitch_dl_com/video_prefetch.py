@@ -0,0 +1,86 @@
+from typing import Dict, Iterable, Iterator, List
+from . import timing
+from .bulk_import import VIDEO_URL_FORMAT
+from .download_jobs import parse_video_urls
+from .tw_api import TwitchAPI
+
+# Helix の /videos?id= と /streams?user_id= は1回のリクエストで100件まで指定できる
+MAX_IDS_PER_REQUEST = 100
+
+
+def chunks(items: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def prefetch_videos(api, db, video_ids: List[str]) -> Dict:
+    """動画IDをまとめて問い合わせ、ダウンロードすべき動画の情報を返す
+
+    /videos?id= で100件ずつ取得し、取得できなかった動画（削除・期限切れ・非公開）と配信中のアーカイブを除く。
+    配信中かどうかは、配信者の /streams（こちらも100人ずつ）の配信IDと動画の stream_id を照合して判定する。
+    コメントが保存済みの動画は問い合わせ前に除く（配信中に一部だけ取得した動画は除かない）。取得した動画情報は videos テーブルにも保存する。
+    戻り値: {'videos': [...], 'archived': [...], 'unavailable': [...], 'live': [...]}（各リストは入力順）
+    """
+    result = {'videos': [], 'archived': [], 'unavailable': [], 'live': []}
+    pending = []
+    for video_id in video_ids:
+        if db.has_complete_video_comments(VIDEO_URL_FORMAT.format(video_id)):
+            result['archived'].append(video_id)
+        else:
+            pending.append(video_id)
+
+    with timing.stage('prefetch') as record:
+        found = {}
+        for chunk in chunks(pending, MAX_IDS_PER_REQUEST):
+            for video in api.get_videos_by_ids(chunk):
+                found[video['id']] = video
+
+        # アーカイブのうち、元の配信がまだ続いているもの
+        user_ids = sorted({video['user_id'] for video in found.values() if video.get('stream_id')})
+        live_stream_ids = set()
+        for chunk in chunks(user_ids, MAX_IDS_PER_REQUEST):
+            live_stream_ids.update(stream['id'] for stream in api.get_streams(chunk))
+        record['rows'] = len(found)
+
+    by_user = {}
+    for video_id in pending:
+        video = found.get(video_id)
+        if video is None:
+            result['unavailable'].append(video_id)
+        elif video.get('stream_id') and video['stream_id'] in live_stream_ids:
+            result['live'].append(video_id)
+        else:
+            result['videos'].append(video)
+        if video is not None:
+            by_user.setdefault(video['user_id'], []).append(video)
+
+    for user_id, videos in by_user.items():
+        db.upsert_videos(user_id, videos, mark_missing_unavailable=False)
+    return result
+
+
+def enqueue_prefetched(db, urls: Iterable[str], api=None, archive=None) -> int:
+    """URLのリストを動画情報付きでジョブキューへ追加し、新たに待ち状態になった件数を返す
+
+    重複したURL・取得できない動画・配信中の動画・コメント保存済みの動画はキューに入れない。
+    archive（ChatArchive）に保管済みの動画は、APIに問い合わせる前に除く。
+    APIを使えない場合（認証情報の未設定など）は動画情報なしですべて追加する。
+    """
+    jobs, duplicates = parse_video_urls(urls, archive)
+    try:
+        result = prefetch_videos(api or TwitchAPI(), db, list(jobs))
+    except Exception as e:
+        print(f"動画情報を取得できないため、すべてのURLをそのまま追加します: {e}")
+        return db.enqueue_download_jobs(jobs.items())
+
+    for video_id in result['unavailable']:
+        print(f"動画が見つかりません（削除・期限切れ・非公開）: {jobs[video_id]}")
+    for video_id in result['live']:
+        print(f"配信中のためスキップします: {jobs[video_id]}")
+    print(f"動画情報: 取得 {len(result['videos'])}件 / 重複 {duplicates}件 / 保存済み {len(result['archived'])}件 / "
+          f"取得不可 {len(result['unavailable'])}件 / 配信中 {len(result['live'])}件")
+
+    videos = result['videos']
+    added = db.enqueue_download_jobs((video['id'], jobs[video['id']]) for video in videos)
+    db.set_download_job_metadata(videos)
+    return added
@@ -1,47 +1,18 @@
 import argparse
 import os
 import time
-import glob
 import subprocess
-import re
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, StaleElementReferenceException
-
-def is_button_truly_clickable(button_element):
-    """ボタンが本当にクリック可能かどうかをさらに厳密に確認する関数"""
-    try:
-        # disabledかどうかチェック
-        if button_element.get_attribute("disabled"):
-            return False
-            
-        # aria-disabledの確認
-        if button_element.get_attribute("aria-disabled") == "true":
-            return False
-            
-        # classにdisabledが含まれているか確認
-        class_value = button_element.get_attribute("class") or ""
-        if "disabled" in class_value:
-            return False
-            
-        # スタイルで無効化されているか確認
-        style = button_element.get_attribute("style") or ""
-        if "pointer-events: none" in style or "opacity: 0.5" in style:
-            return False
-            
-        # 表示されているか確認
-        if not button_element.is_displayed():
-            return False
-            
-        return True
-    except StaleElementReferenceException:
-        # 要素が更新された場合
-        return False
+import threading
+from twitch_dl_com import timing
+from twitch_dl_com.chat_archive import DEFAULT_ARCHIVE_DIR, ChatArchive
+from twitch_dl_com.chat_downloader import (DEFAULT_DOWNLOAD_PATH, GQL_URL, SITE_URL, BrowserPool,
+                                           ChatDownloadError, extract_video_id, fetch_chat_file)
+from twitch_dl_com.compression import SUFFIXES
+from twitch_dl_com.database.db_manager import DatabaseManager
+from twitch_dl_com.download_jobs import (DEFAULT_LEASE_SECONDS, archive_file, enqueue_urls, job_filename,
+                                         run_download_jobs, write_job_metadata)
+from twitch_dl_com.sync import sync_files
+from twitch_dl_com.video_prefetch import enqueue_prefetched
 
 def open_folder(path):
     """ダウンロードフォルダを開く関数"""
@@ -74,248 +45,133 @@ def open_folder(path):
         return False
     return True
 
-def copy_to_windows(src_path):
-    """Linuxの仮想環境からWindowsのローカル環境にファイルをコピーする関数"""
+def sync_outputs(paths, destinations=None):
+    """保存したファイルを同期先（既定はWindowsのダウンロードフォルダ）へ差分コピーする"""
+    if destinations == []:
+        return
     try:
-        # Windowsのダウンロードフォルダのパス
-        windows_path = f"/mnt/c/Users/futur/Downloads/TwitchComment"
-        
-        # Windowsのフォルダを作成
-        os.makedirs(windows_path, exist_ok=True)
-        
-        # ファイルをコピー
-        for file in glob.glob(os.path.join(src_path, "*.csv")):
-            filename = os.path.basename(file)
-            # ファイル名をサニタイズ
-            safe_filename = sanitize_filename(filename)
-            dst_file = os.path.join(windows_path, safe_filename)
-            subprocess.run(['cp', file, dst_file], check=True)
-            print(f"ファイルをコピーしました: {dst_file}")
-        
-        return windows_path
+        stats = sync_files(paths, destinations)
+        print(f"同期: {stats['copied']}件をコピー（変更なし {stats['skipped']}件、失敗 {stats['failed']}件）")
     except Exception as e:
-        print(f"Windowsへのコピーに失敗しました: {e}")
-        return None
+        print(f"同期に失敗しました: {e}")
 
-def sanitize_filename(filename):
-    """ファイル名から不正な文字を除去"""
-    # Windowsで使用できない文字を置換
-    filename = re.sub(r'[<>"/\\|?*:]', '_', filename)  # コロンも含めて置換
-    # 文字数制限（255文字以内）
-    if len(filename) > 255:
-        base, ext = os.path.splitext(filename)
-        filename = base[:255-len(ext)] + ext
-    return filename
+def main(video_url, output_filename=None, compress=None, backend='auto', gql_url=GQL_URL,
+         output_dir=DEFAULT_DOWNLOAD_PATH, sync_destinations=None, archive=None, site_url=SITE_URL):
+    # 保管庫にあればダウンロードしない
+    video_id = extract_video_id(video_url)
+    entry = archive.get(video_id) if archive is not None else None
+    if entry is not None:
+        print(f"保管済みです: {entry['path']} ({entry['rows']}件)")
+        return entry['path']
 
-def rename_chat_file(download_path, new_filename):
-    """ダウンロードしたCSVファイルの名前を変更"""
-    try:
-        # 最新のCSVファイルを検索
-        csv_files = glob.glob(os.path.join(download_path, "*.csv"))
-        if not csv_files:
-            print("CSVファイルが見つかりません")
-            return None
-
-        newest_file = max(csv_files, key=os.path.getctime)
-        # TODO: ファイル名変換がおかしい。sanitize_filename
-        new_filepath = os.path.join(download_path, sanitize_filename(new_filename))
-        
-        # ファイルが既に存在する場合は、連番を付与
-        counter = 1
-        base, ext = os.path.splitext(new_filepath)
-        while os.path.exists(new_filepath):
-            new_filepath = f"{base}_{counter}{ext}"
-            counter += 1
+    # 出力ファイル名にフォルダが含まれていればそこへ保存する
+    if output_filename:
+        directory, output_filename = os.path.split(os.path.expanduser(output_filename))
+        output_dir = directory or output_dir
+    print(f"ダウンロード先: {output_dir}")
 
-        os.rename(newest_file, new_filepath)
-        print(f"ファイル名を変更しました: {new_filepath}")
-        return new_filepath
-    except Exception as e:
-        print(f"ファイル名の変更に失敗しました: {e}")
+    try:
+        path = fetch_chat_file(video_url, output_dir, output_filename, compress, backend, gql_url,
+                               site_url=site_url)
+    except ChatDownloadError as e:
+        print(f"エラーが発生しました: {e}")
         return None
+    if path:
+        print(f"保存しました: {path}")
+        if archive is not None:
+            archive_file(archive, path, {'video_id': video_id, 'url': video_url})
+        if output_filename:
+            sync_outputs([path], sync_destinations)
+    return path
 
-def main(video_url, output_filename=None):
-    # ダウンロードパスの設定
-    download_path = os.path.join(os.path.expanduser('~'), 'Downloads', 'TwitchComment')
-    os.makedirs(download_path, exist_ok=True)
-    print(f"ダウンロード先: {download_path}")
+def process_urls_pooled(db, pool_size, compress=None, block_resources=True, backend='auto', gql_url=GQL_URL,
+                        output_dir=DEFAULT_DOWNLOAD_PATH, sync_destinations=None,
+                        lease_seconds=DEFAULT_LEASE_SECONDS, worker_id=None, archive=None, site_url=SITE_URL):
+    """キューのジョブを並行に処理し、結果の件数を返す
 
-    # 既存のCSVファイルをクリア
-    existing_files = glob.glob(os.path.join(download_path, "*.*"))
-    for file in existing_files:
-        try:
-            os.remove(file)
-            print(f"既存のファイルを削除しました: {file}")
-        except Exception as e:
-            print(f"ファイルの削除に失敗しました: {e}")
+    auto / http ではまずHTTPで取得し、auto の場合はHTTPで取得できなかったURLだけをブラウザプールで処理する。
+    ブラウザプールは最初に必要になった時点で起動する。
+    """
+    counts = db.get_download_job_counts()
+    pending = counts['queued'] + counts['running']
+    pool = None
+    pool_lock = threading.Lock()
+    saved_paths = []
 
-    # ブラウザオプションの設定
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')  # ヘッドレスモードを有効化
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_experimental_option('prefs', {
-        'download.default_directory': download_path,
-        'download.prompt_for_download': False,
-        'download.directory_upgrade': True,
-        'safebrowsing.enabled': True,
-        'download.default_directory.conflict_policy': 'overwrite'
-    })
+    def get_pool():
+        nonlocal pool
+        with pool_lock:
+            if pool is None:
+                pool = BrowserPool(max(min(pool_size, pending), 1), output_dir, block_resources, site_url)
+            return pool
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-    driver.get("https://www.twitchchatdownloader.com")
+    def download(job):
+        path = fetch_chat_file(job['url'], output_dir, job_filename(job), compress, backend, gql_url, get_pool)
+        if path:
+            saved_paths.append(path)
+            sidecar_path = write_job_metadata(path, job)
+            if sidecar_path:
+                saved_paths.append(sidecar_path)
+        return path
 
     try:
-        url_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "video-url"))
-        )
-        url_input.clear()  # 既存の入力をクリア
-        url_input.send_keys(video_url)
-        print(f"URL: {video_url}")
-
-        # 1. 最初のボタンをクリック
-        first_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//*[contains(@title, 'Download chat')]"))
-        )
-        first_button.click()
-        print("ダウンロード")
-        
-        # 2. 次のボタンが表示されるのを待つ
-        next_button_locator = (By.XPATH, "//button[contains(@class, 'btn-primary') and @title='Export chat']")
-        
-        next_button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(next_button_locator)
-        )        
-        
-        # Progressが100%になるまで待機
-        progress_locator = (By.XPATH, "//small[contains(@class, 'd-block') and contains(text(), 'Progress:')]")
-        max_wait_time = 30  # 最大待機時間（秒）
-        wait_interval = 0.5  # 確認間隔（秒）
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_time:
-            try:
-                progress_element = driver.find_element(*progress_locator)
-                progress_text = progress_element.text.strip()
-                if 'Progress: 100 % | Remaining: 0 sec' in progress_text:
-                    print("ダウンロード処理が完了しました")
-                    break
-                print(f"ダウンロード進捗: {progress_text}")
-                time.sleep(wait_interval)
-            except Exception as e:
-                print(f"進捗の確認中にエラー: {e}")
-                time.sleep(wait_interval)
-        else:
-            print("進捗の確認がタイムアウトしました")
-            
-        # 3. カスタム待機: ボタンが本当にクリック可能になるまで待機
-        max_wait_time = 5  # 最大待機時間（秒）
-        wait_interval = 0.5  # 確認間隔（秒）
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_time:
-            try:
-                # 要素を再取得
-                next_button = driver.find_element(*next_button_locator)
-                print("next_button")
-
-                # ボタンの状態をより詳細にチェック
-                if (next_button.is_displayed() and 
-                    next_button.is_enabled() and 
-                    "disabled" not in next_button.get_attribute("class") and 
-                    not next_button.get_attribute("disabled")):
+        stats = run_download_jobs(db, download, pool_size, lease_seconds=lease_seconds, worker_id=worker_id,
+                                  archive=archive)
+    finally:
+        if pool is not None:
+            pool.close()
 
-                    # 少し待機を入れて安定させる
-                    time.sleep(2)
-                    break
-                    
-            except StaleElementReferenceException:
-                print("要素が更新されました。再取得を試みます...")
-                continue
-                
-            # 待機
-            time.sleep(wait_interval)
-        else:
-            # whileループが正常終了しなかった場合（タイムアウト）
-            raise TimeoutException("対象ビデオのダウンロード操作がタイムアウトになりました")
-        
-        # 4. 安全なクリック試行
-        try:
-            print("エクスポート")
-            next_button.click()
-            # ダウンロードの完了を待機
-            timeout = 60  # タイムアウト時間（秒）
-            start_time = time.time()
+    # 保存したファイルをまとめて同期先へコピー
+    sync_outputs(saved_paths, sync_destinations)
+    return stats
 
-            print(f"DL開始日時: {start_time}")
-            while time.time() - start_time < timeout:
-                print(f"経過: {time.time()}")  # パスを確認するために追加
+def process_urls(urls, compress=None, pool_size=0, block_resources=True, backend='auto', gql_url=GQL_URL,
+                 db_path='twitch_users.db', output_dir=DEFAULT_DOWNLOAD_PATH, sync_destinations=None,
+                 prefetch=True, lease_seconds=DEFAULT_LEASE_SECONDS, worker_id=None,
+                 archive_dir=DEFAULT_ARCHIVE_DIR, site_url=SITE_URL):
+    """URLのリストをジョブキューに登録して処理する関数（pool_size > 0 なら並行処理）
 
-                # 新しいCSVファイルを検索
-                csv_files = glob.glob(os.path.join(download_path, "*.csv"))
-                newest_file = max(csv_files, key=os.path.getctime) if csv_files else None
-                
-                if newest_file and os.path.getsize(newest_file) > 0:
-                    print(f"ダウンロード完了: {newest_file}")
-                    
-                    # ダウンロードされたファイルの名前をサニタイズ
-                    safe_basename = sanitize_filename(os.path.basename(newest_file))
-                    safe_path = os.path.join(os.path.dirname(newest_file), safe_basename)
-                    
-                    if safe_path != newest_file:
-                        os.rename(newest_file, safe_path)
-                        newest_file = safe_path
-                        print(f"ファイル名をサニタイズしました: {safe_path}")
-                    
-                    if output_filename:
-                        renamed_file = rename_chat_file(download_path, output_filename)
-                        if renamed_file:
-                            try:
-                                windows_path = copy_to_windows(download_path)
-                                if windows_path:
-                                    print(f"ファイルコピー: {windows_path}")
-                            except Exception as e:
-                                print(f"Windowsへのコピーに失敗しました: {e}")
-                    break
-                time.sleep(1)
-            else:
-                print("ダウンロードがタイムアウトしました")            
-        except ElementClickInterceptedException:
-            print("通常のクリックが失敗しました。JavaScriptでクリックを試みます...")
-            driver.execute_script("arguments[0].click();", next_button)
-            print("次のボタンをJavaScriptで押下しました")
-    except TimeoutException as e:
-        print(f"タイムアウトエラー: {e}")
-        driver.save_screenshot("timeout_error.png")
-    except Exception as e:
-        print(f"エラーが発生しました: {e}")
-        driver.save_screenshot("error.png")
-        
-    finally:
-        # ブラウザを閉じる
-        driver.quit()
+    ジョブの状態はDBに保存されるため、中断後に同じリストで再実行すると残りのジョブだけを処理する。
+    prefetch なら登録前にAPIで動画情報をまとめて取得し、取得できない動画や配信中の動画を除く。
+    urls が None なら登録せず、キューに残っているジョブを処理する（同じDBを使う他のワーカーと分担する）。
+    archive_dir の保管庫にある動画は登録・ダウンロードせず、保存したファイルは保管庫へ入れる（None なら使わない）。
+    """
+    db = DatabaseManager(db_path)
+    archive = ChatArchive(archive_dir) if archive_dir else None
+    if urls is None:
+        added = 0
+    else:
+        added = enqueue_prefetched(db, urls, archive=archive) if prefetch else enqueue_urls(db, urls, archive)
+    counts = db.get_download_job_counts()
+    print(f"=== {added} 件をキューに追加しました "
+          f"(待機 {counts['queued'] + counts['running']} / 完了 {counts['done']} / 失敗 {counts['failed']}) ===")
 
-def process_urls(urls):
-    """URLのリストを順番に処理する関数"""
-    success_count = 0
-    total_count = len([url for url in urls if url.strip()])  # 空行を除いた総数
+    if pool_size > 0:
+        stats = process_urls_pooled(db, pool_size, compress, block_resources, backend, gql_url, output_dir,
+                                    sync_destinations, lease_seconds, worker_id, archive, site_url)
+    else:
+        saved_paths = []
 
-    for url in urls:
-        url = url.strip()  # 空白と改行を削除
-        if url:  # 空行でない場合のみ処理
-            print(f"\n=== {url} の処理を開始 ({success_count + 1}/{total_count}) ===")
-            try:
-                main(url)
-                success_count += 1
-                print(f"=== {url} の処理が完了 ===\n")
-            except Exception as e:
-                print(f"=== {url} の処理中にエラーが発生: {e} ===\n")
+        def download(job):
+            path = main(job['url'], job_filename(job), compress, backend, gql_url, output_dir, [],
+                        site_url=site_url)
+            if path:
+                saved_paths.append(path)
+                sidecar_path = write_job_metadata(path, job)
+                if sidecar_path:
+                    saved_paths.append(sidecar_path)
             # 連続実行時の負荷軽減のため少し待機
             time.sleep(5)
+            return path
+
+        stats = run_download_jobs(db, download, lease_seconds=lease_seconds, worker_id=worker_id, archive=archive)
+        sync_outputs(saved_paths, sync_destinations)
 
     # すべての処理が完了した後にフォルダを開く
-    if success_count > 0:
-        print(f"\n=== 全 {total_count} 件中 {success_count} 件の処理が完了しました ===")
+    if stats['done'] > 0:
+        counts = db.get_download_job_counts()
+        print(f"\n=== {stats['done']} 件の処理が完了しました "
+              f"(スキップ {stats['skipped']} / 失敗 {stats['failed']} / 未完了 {counts['queued']}) ===")
         try:
             windows_dl_path = "C:\\Users\\futur\\Downloads\\TwitchComment"
             subprocess.run(['explorer.exe', windows_dl_path])
@@ -333,19 +189,69 @@ if __name__ == "__main__":
                       help='TwitchのビデオURL（例：https://www.twitch.tv/videos/123456789）')
     group.add_argument('-f', '--file',
                       help='URLリストが記載されたファイルのパス（1行1URL）')
-    parser.add_argument('-o', '--output', help='出力ファイル名')
+    group.add_argument('-w', '--worker', action='store_true',
+                      help='URLを追加せず、--db のキューに残っているジョブを処理する（同じDBを使う他のワーカーと分担）')
+    parser.add_argument('-o', '--output', help='出力ファイル名（既定は <動画ID>.csv）')
+    parser.add_argument('-d', '--output-dir', default=DEFAULT_DOWNLOAD_PATH, help='保存先フォルダ')
+    parser.add_argument('-c', '--compress', choices=sorted(SUFFIXES),
+                        help='ダウンロード完了後にCSVを圧縮する形式（gzip / zstd）')
+    parser.add_argument('-p', '--pool', type=int, default=0,
+                        help='URLリストを並行処理するブラウザ数（0なら1件ずつ順番に処理）')
+    parser.add_argument('--no-block', action='store_true',
+                        help='ブラウザプールで画像・CSS・フォントの読み込みを止めない')
+    parser.add_argument('-b', '--backend', choices=['auto', 'http', 'selenium'], default='auto',
+                        help='取得方法（auto: HTTPで取得し、失敗時のみブラウザを使う）')
+    parser.add_argument('-s', '--sync-dest', action='append',
+                        help='保存したファイルのコピー先（複数指定可。既定はWindowsのダウンロードフォルダ）')
+    parser.add_argument('--no-sync', action='store_true', help='保存したファイルをコピーしない')
+    parser.add_argument('--no-prefetch', action='store_true',
+                        help='URLリストの動画情報をAPIで事前に取得しない（取得できない・配信中の動画も処理する）')
+    parser.add_argument('--db', default='twitch_users.db',
+                        help='ダウンロードジョブとコメントを保存するデータベースファイルのパス')
+    parser.add_argument('--gql-url', default=GQL_URL,
+                        help='HTTP取得で使うGQLエンドポイント（動作確認用の代替サーバーを指定できる）')
+    parser.add_argument('--archive-dir', default=DEFAULT_ARCHIVE_DIR,
+                        help='VOD IDと内容のハッシュで管理する保管庫（保管済みの動画はダウンロードしない）')
+    parser.add_argument('--no-archive', action='store_true', help='保管庫を確認せず、保存したファイルも入れない')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help='ジョブのリースの秒数（この間応答のないワーカーのジョブは他のワーカーが引き継ぐ）')
+    parser.add_argument('--worker-id', help='リースの持ち主として記録する名前（既定は <ホスト名>:<プロセスID>）')
+    parser.add_argument('--site-url', default=SITE_URL,
+                        help='ブラウザで操作するサイト（動作確認用の代替サイトを指定できる）')
+    parser.add_argument('--timing-log',
+                        help='処理段階ごとの所要時間をJSON Lines形式で追記するファイル')
     args = parser.parse_args()
+    sync_destinations = [] if args.no_sync else args.sync_dest
+    archive_dir = None if args.no_archive else args.archive_dir
+    if args.timing_log:
+        timing.configure(args.timing_log)
+    run_started = time.time()
     
     if args.url:
         # 単一URLの処理
-        main(args.url, args.output)
+        with timing.job_context(extract_video_id(args.url)):
+            main(args.url, args.output, args.compress, args.backend, args.gql_url, args.output_dir,
+                 sync_destinations, ChatArchive(archive_dir) if archive_dir else None, args.site_url)
+    elif args.worker:
+        # キューのジョブだけを処理するワーカー
+        process_urls(None, args.compress, args.pool, not args.no_block, args.backend, args.gql_url,
+                     args.db, args.output_dir, sync_destinations, lease_seconds=args.lease,
+                     worker_id=args.worker_id, archive_dir=archive_dir, site_url=args.site_url)
     else:
         # ファイルからURLを読み込んで処理
         try:
             with open(args.file, 'r', encoding='utf-8') as f:
                 urls = f.readlines()
-                process_urls(urls)
+                process_urls(urls, args.compress, args.pool, not args.no_block, args.backend, args.gql_url,
+                             args.db, args.output_dir, sync_destinations, not args.no_prefetch, args.lease,
+                             args.worker_id, archive_dir, args.site_url)
         except FileNotFoundError:
             print(f"ファイルが見つかりません: {args.file}")
         except Exception as e:
-            print(f"ファイルの読み込み中にエラーが発生: {e}")
\ No newline at end of file
+            print(f"ファイルの読み込み中にエラーが発生: {e}")
+
+    if args.timing_log:
+        # 今回の実行分だけを集計して表示
+        timing.configure(None)
+        events = [event for event in timing.read_events([args.timing_log]) if event['start'] >= run_started]
+        print(timing.format_summary(timing.summarize(events)))